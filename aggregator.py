@@ -0,0 +1,383 @@
+import logging
+import threading
+import time
+from typing import *
+
+import numpy as np
+
+from models import Candle, Contract
+from candle_store import CandleBuffer, CANDLE_RETENTION
+from indicators import IndicatorCache
+from candle_cache import CandleCache
+
+
+logger = logging.getLogger()
+
+# TF_EQUIV is used in add_trade() to compare the last candle timestamp to the new trade timestamp
+TF_EQUIV = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
+
+BACKFILL_TIMEOUT = 30  # Seconds before giving up on a backfill request and filling the gap with flat candles
+
+# Cached candles older than this number of candles are downloaded again instead of being backfilled. The backfill is
+# paginated by the connectors (see HistoryDownloader), so a gap of a resampled timeframe is complete even if it needs
+# several pages of the source timeframe (e.g 2000 1h candles for 500 4h candles on Bitmex).
+MAX_CACHE_GAP = 500
+
+
+class BarSeries:
+    def __init__(self, label: str, timeframe: str, capacity: int = CANDLE_RETENTION,
+                 backfill_loader: Optional[Callable[[int, int], List[Candle]]] = None):
+
+        """
+        Candles of one symbol and timeframe, built from the trades.
+        :param label: Exchange and symbol, only used in the logs
+        :param timeframe: 1m, 5m, 15m, 30m, 1h, 4h
+        :param capacity: Number of candles kept in memory
+        :param backfill_loader: Called with the open times of the first and last missing candles when trades are
+        missing (e.g after a websocket disconnection), in a separate thread. Without it, or if it fails, the missing
+        candles are filled with flat candles at the last close price.
+        """
+
+        self.label = label
+        self.tf = timeframe
+        self.tf_equiv = TF_EQUIV[timeframe] * 1000
+        self.candles = CandleBuffer(capacity)
+        self.indicators = IndicatorCache(self.candles)  # Shared by the strategies reading these candles
+
+        self._backfill_loader = backfill_loader
+
+        # State of the running backfill: trades received meanwhile are buffered and added once the missing
+        # candles are merged, always from the thread calling add_trade() (the websocket thread)
+        self._backfill_id = 0
+        self._backfill_started: Optional[float] = None
+        self._backfill_result: Optional[Tuple[int, List[Candle]]] = None
+        self._gap_end: Optional[int] = None
+        self._buffered_trades: List[Tuple[float, float, int]] = []
+
+    def add_trade(self, price: float, size: float, timestamp: int) -> str:
+
+        """
+        Update the candles with a new trade based on its timestamp.
+        :param price: The trade price
+        :param size: The trade size
+        :param timestamp: Unix timestamp in milliseconds
+        :return: same_candle or new_candle, backfill while the trade is buffered during a backfill
+        """
+
+        if self._backfill_started is None:
+            last_ts = self.candles.last_timestamp
+
+            if self._backfill_loader is None or timestamp < last_ts + 2 * self.tf_equiv:
+                return self._add_trade(price, size, timestamp)
+
+            self._start_backfill(timestamp)
+
+        self._buffered_trades.append((price, size, timestamp))
+
+        result = self._backfill_result
+
+        if result is not None and result[0] == self._backfill_id:
+            return self._merge_backfill(result[1])
+
+        if time.time() - self._backfill_started > BACKFILL_TIMEOUT:
+            logger.warning("%s backfill of the %s candles timed out, using flat candles", self.label, self.tf)
+            return self._merge_backfill([])
+
+        return "backfill"
+
+    def _add_trade(self, price: float, size: float, timestamp: int) -> str:
+        candles = self.candles
+        last_ts = candles.last_timestamp
+
+        # Same Candle
+
+        if timestamp < last_ts + self.tf_equiv:
+
+            candles.update_last(price, size)
+
+            return "same_candle"
+
+        # Missing Candle(s)
+
+        elif timestamp >= last_ts + 2 * self.tf_equiv:
+
+            missing_candles = int((timestamp - last_ts) / self.tf_equiv) - 1
+
+            logger.info("%s missing %s candles for %s (%s %s)", self.label, missing_candles, self.tf, timestamp,
+                        last_ts)
+
+            self._fill_flat(last_ts + missing_candles * self.tf_equiv)
+
+            candles.append(candles.last_timestamp + self.tf_equiv, price, price, price, price, size)
+
+            return "new_candle"
+
+        # New Candle
+
+        else:
+            candles.append(last_ts + self.tf_equiv, price, price, price, price, size)
+
+            logger.info("%s New candle for %s", self.label, self.tf)
+
+            return "new_candle"
+
+    def _fill_flat(self, until: int):
+
+        """
+        Add flat candles (last close price, no volume) up to the open time 'until' included.
+        """
+
+        candles = self.candles
+        last_ts = candles.last_timestamp
+        last_close = candles.last_close
+
+        while last_ts + self.tf_equiv <= until:
+            last_ts += self.tf_equiv
+            candles.append(last_ts, last_close, last_close, last_close, last_close, 0)
+
+    def _start_backfill(self, timestamp: int):
+        last_ts = self.candles.last_timestamp
+
+        # Open time of the candle of the trade, the missing candles are the ones between last_ts and it
+        self._gap_end = last_ts + int((timestamp - last_ts) / self.tf_equiv) * self.tf_equiv
+        missing_candles = int((self._gap_end - last_ts) / self.tf_equiv) - 1
+
+        logger.info("%s missing %s candles for %s (%s %s), backfilling from the REST API", self.label,
+                    missing_candles, self.tf, timestamp, last_ts)
+
+        self._backfill_id += 1
+        self._backfill_started = time.time()
+        self._backfill_result = None
+
+        t = threading.Thread(target=self._run_backfill,
+                             args=(self._backfill_id, last_ts + self.tf_equiv, self._gap_end - self.tf_equiv),
+                             daemon=True)
+        t.start()
+
+    def _run_backfill(self, backfill_id: int, start_time: int, end_time: int):
+        try:
+            candles = self._backfill_loader(start_time, end_time)
+        except Exception as e:
+            logger.error("%s error while backfilling the %s candles: %s", self.label, self.tf, e)
+            candles = []
+
+        self._backfill_result = (backfill_id, candles)  # Merged by the next add_trade() call
+
+    def _merge_backfill(self, backfilled: List[Candle]) -> str:
+
+        """
+        Add the backfilled candles (flat candles for those the API didn't return), then the buffered trades.
+        :param backfilled:
+        :return: new_candle
+        """
+
+        merged = 0
+
+        for c in sorted(backfilled, key=lambda c: c.timestamp):
+            if self.candles.last_timestamp < c.timestamp < self._gap_end:
+                self._fill_flat(c.timestamp - self.tf_equiv)
+                self.candles.append(c.timestamp, c.open, c.high, c.low, c.close, c.volume)
+                merged += 1
+
+        logger.info("%s %s backfilled %s candles, %s buffered trades", self.label, self.tf, merged,
+                    len(self._buffered_trades))
+
+        self._fill_flat(self._gap_end - self.tf_equiv)
+
+        trades = self._buffered_trades
+        self._buffered_trades = []
+        self._backfill_started = None
+
+        for price, size, timestamp in trades:
+            self._add_trade(price, size, timestamp)
+
+        return "new_candle"
+
+
+def resample(candles: List[Candle], timeframe: str) -> List[Candle]:
+
+    """
+    Build candles of a higher timeframe from lower timeframe candles (e.g 15m candles from 1m or 5m candles).
+    The candles are aligned on multiples of the timeframe since the Unix epoch, like on the exchanges. A first bucket
+    that doesn't start with its first lower timeframe candle is left out: its open, high, low and volume would only
+    cover part of the period (and be recorded as is in the candle cache).
+    :param candles: Candles sorted by timestamp
+    :param timeframe: The target timeframe
+    :return:
+    """
+
+    if len(candles) == 0:
+        return []
+
+    tf_equiv = TF_EQUIV[timeframe] * 1000
+
+    timestamps = np.array([c.timestamp for c in candles], dtype=np.int64)
+    opens = np.array([c.open for c in candles], dtype=np.float64)
+    highs = np.array([c.high for c in candles], dtype=np.float64)
+    lows = np.array([c.low for c in candles], dtype=np.float64)
+    closes = np.array([c.close for c in candles], dtype=np.float64)
+    volumes = np.array([c.volume for c in candles], dtype=np.float64)
+
+    buckets = timestamps - timestamps % tf_equiv
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])  # First candle of each bucket
+
+    if timestamps[0] != buckets[0]:  # Partial first bucket
+        starts = starts[1:]
+        if len(starts) == 0:
+            return []
+
+    ends = np.r_[starts[1:], len(candles)] - 1
+
+    highs = np.maximum.reduceat(highs, starts)
+    lows = np.minimum.reduceat(lows, starts)
+    volumes = np.add.reduceat(volumes, starts)
+
+    return [Candle(int(buckets[s]), float(opens[s]), float(h), float(l), float(closes[e]), float(v))
+            for s, e, h, l, v in zip(starts, ends, highs, lows, volumes)]
+
+
+class SymbolAggregator:
+    def __init__(self, label: str, contract: Contract,
+                 history_loader: Callable[[Contract, str, Optional[int], Optional[int]], List[Candle]],
+                 native_timeframes: List[str],
+                 capacity: int = CANDLE_RETENTION, cache: Optional[CandleCache] = None):
+
+        """
+        Shared candles of one symbol: each trade updates the candles of every subscribed timeframe at once, and
+        strategies running on the same symbol and timeframe read the same CandleBuffer (read-only).
+        :param label: Exchange and symbol, only used in the logs
+        :param contract:
+        :param history_loader: The connector get_historical_candles() method, also used to backfill the candles
+        missed during a disconnection
+        :param native_timeframes: Timeframes available from the exchange API, the others are built locally
+        from the largest available timeframe that divides them (e.g 15m from 5m and 4h from 1h on Bitmex)
+        :param capacity: Number of candles kept for each timeframe
+        :param cache: Local candle cache. A new subscription starts from the cached candles without any request,
+        the candles since the last cached one are then backfilled when the first trade arrives.
+        """
+
+        self.label = label
+        self.contract = contract
+        self._cache = cache
+
+        self._history_loader = history_loader
+        self._native_timeframes = native_timeframes
+        self._capacity = capacity
+
+        # Replaced (never modified in place) so that the websocket thread can iterate it while a strategy subscribes
+        self._series: Dict[str, BarSeries] = dict()
+        self._subscribers: Dict[str, int] = dict()
+
+        self.check_latency = True
+
+    def _load_history(self, timeframe: str, start_time: Optional[int] = None,
+                      end_time: Optional[int] = None) -> List[Candle]:
+
+        """
+        :param timeframe:
+        :param start_time: Open time of the first candle (the most recent candles are loaded if None)
+        :param end_time: Open time of the last candle
+        :return:
+        """
+
+        if timeframe in self._native_timeframes:
+            return self._history_loader(self.contract, timeframe, start_time, end_time)
+
+        tf_equiv = TF_EQUIV[timeframe]
+        sources = [tf for tf in self._native_timeframes if tf in TF_EQUIV and tf_equiv % TF_EQUIV[tf] == 0]
+
+        if len(sources) == 0:
+            return []
+
+        source = max(sources, key=lambda tf: TF_EQUIV[tf])
+
+        logger.info("%s building %s candles from %s candles", self.label, timeframe, source)
+
+        if end_time is not None:  # The last source candle of the last candle
+            end_time += (tf_equiv - TF_EQUIV[source]) * 1000
+
+        return resample(self._history_loader(self.contract, source, start_time, end_time), timeframe)
+
+    def _download(self, timeframe: str, start_time: Optional[int] = None,
+                  end_time: Optional[int] = None) -> List[Candle]:
+
+        """
+        _load_history(), the candles downloaded are also recorded in the cache.
+        """
+
+        candles = self._load_history(timeframe, start_time, end_time)
+
+        if self._cache is not None and len(candles) > 0:
+            self._cache.save(self.contract.exchange, self.contract.symbol, timeframe, candles,
+                             TF_EQUIV[timeframe] * 1000)
+
+        return candles
+
+    def _initial_candles(self, timeframe: str) -> List[Candle]:
+        if self._cache is not None:
+            cached = self._cache.load(self.contract.exchange, self.contract.symbol, timeframe)
+
+            if len(cached) > 0:
+                missing = (time.time() * 1000 - cached[-1].timestamp) / (TF_EQUIV[timeframe] * 1000)
+
+                if missing < MAX_CACHE_GAP:
+                    logger.info("%s %s candles loaded from the cache", self.label, timeframe)
+                    return cached
+
+        return self._download(timeframe)
+
+    def subscribe(self, timeframe: str) -> CandleBuffer:
+
+        """
+        Get the shared candles of a timeframe, the history is only loaded for the first subscriber.
+        :param timeframe:
+        :return: The CandleBuffer, empty if no historical data could be retrieved
+        """
+
+        if timeframe in self._series:
+            self._subscribers[timeframe] += 1
+            return self._series[timeframe].candles
+
+        series = BarSeries(self.label, timeframe, self._capacity,
+                           lambda start_time, end_time: self._download(timeframe, start_time, end_time))
+        series.candles.extend(self._initial_candles(timeframe))
+
+        if len(series.candles) > 0:
+            self._subscribers[timeframe] = 1
+            self._series = {**self._series, timeframe: series}
+
+        return series.candles
+
+    def indicators(self, timeframe: str) -> IndicatorCache:
+
+        """
+        :param timeframe: A subscribed timeframe
+        :return: The indicator cache shared by the strategies running on this symbol and timeframe
+        """
+
+        return self._series[timeframe].indicators
+
+    def unsubscribe(self, timeframe: str):
+        if timeframe not in self._subscribers:
+            return
+
+        self._subscribers[timeframe] -= 1
+
+        if self._subscribers[timeframe] == 0:
+            del self._subscribers[timeframe]
+            self._series = {tf: s for tf, s in self._series.items() if tf != timeframe}
+
+    def on_trade(self, price: float, size: float, timestamp: int) -> Dict[str, str]:
+
+        """
+        Update the candles of all the subscribed timeframes with a new trade.
+        :return: timeframe -> same_candle or new_candle
+        """
+
+        if self.check_latency:
+            timestamp_diff = int(time.time() * 1000) - timestamp
+            if timestamp_diff >= 2000:
+                logger.warning("%s: %s milliseconds of difference between the current time and the trade time",
+                               self.label, timestamp_diff)
+
+        return {tf: series.add_trade(price, size, timestamp) for tf, series in self._series.items()}
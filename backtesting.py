@@ -0,0 +1,281 @@
+import logging
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from models import Candle
+from candle_store import CandleBuffer, FIELDS
+from indicators.batch import rsi, macd
+
+
+logger = logging.getLogger()
+
+
+# Candle based backtests of the strategies defined in strategies.py.
+# The signals are computed on the whole history at once (NumPy/pandas), then the positions are simulated trade by
+# trade (not candle by candle) with the same Take Profit / Stop Loss percentages as Strategy._check_tp_sl().
+# Intrabar behaviour is approximated with the candle high/low: if both the TP and the SL are reached within the
+# same candle, the SL is assumed to be hit first.
+
+
+class BacktestResult:
+    def __init__(self, trades: pd.DataFrame, equity: pd.Series):
+
+        """
+        :param trades: One row per trade: entry_time, exit_time, side, entry_price, exit_price, pnl_pct, exit_reason
+        :param equity: Account equity (starting at 1) for every candle, open positions are marked to market
+        """
+
+        self.trades = trades
+        self.equity = equity
+
+    @property
+    def pnl(self) -> float:
+
+        """
+        :return: Total PnL in % of the initial balance
+        """
+
+        if len(self.equity) == 0:
+            return 0.0
+        return (self.equity.iloc[-1] - 1) * 100
+
+    @property
+    def max_drawdown(self) -> float:
+
+        """
+        :return: Maximum drawdown in % (positive number)
+        """
+
+        if len(self.equity) == 0:
+            return 0.0
+        return float(-(self.equity / self.equity.cummax() - 1).min() * 100)
+
+
+def candles_to_arrays(candles: Union[CandleBuffer, List[Candle], pd.DataFrame, Dict[str, np.ndarray]]) \
+        -> Dict[str, np.ndarray]:
+
+    """
+    Normalize the different candle containers of the project to a dictionary of NumPy arrays.
+    :param candles: A CandleBuffer, the list returned by get_historical_candles(), a DataFrame or a dict of arrays
+    :return: {"timestamp": ..., "open": ..., "high": ..., "low": ..., "close": ..., "volume": ...}
+    """
+
+    if isinstance(candles, CandleBuffer):
+        return {field: getattr(candles, field) for field in FIELDS}
+
+    if isinstance(candles, list):
+        arrays = {field: np.array([getattr(c, field) for c in candles], dtype=np.float64) for field in FIELDS[1:]}
+        arrays["timestamp"] = np.array([c.timestamp for c in candles], dtype=np.int64)
+        return arrays
+
+    return {field: np.asarray(candles[field]) for field in FIELDS}
+
+
+def technical_signals(arrays: Dict[str, np.ndarray], ema_fast: int, ema_slow: int, ema_signal: int,
+                      rsi_length: int) -> np.ndarray:
+
+    """
+    TechnicalStrategy._check_signal() for every candle.
+    :return: 1 (Long), -1 (Short) or 0 for each closed candle. The live strategy acts on it when the next candle opens.
+    """
+
+    closes = arrays["close"]
+
+    rsi_values = rsi(closes, rsi_length)
+    macd_line, macd_signal = macd(closes, ema_fast, ema_slow, ema_signal)
+
+    signals = np.zeros(len(closes), dtype=np.int8)
+    signals[(rsi_values < 30) & (macd_line > macd_signal)] = 1
+    signals[(rsi_values > 70) & (macd_line < macd_signal)] = -1
+
+    return signals
+
+
+def breakout_signals(arrays: Dict[str, np.ndarray], min_volume: float) -> np.ndarray:
+
+    """
+    BreakoutStrategy._check_signal() for every candle, evaluated on the candle close (the live strategy checks it
+    on every trade, so it can enter earlier within the candle).
+    :return: 1 (Long), -1 (Short) or 0 for each candle
+    """
+
+    close = arrays["close"]
+
+    signals = np.zeros(len(close), dtype=np.int8)
+
+    if len(close) < 2:
+        return signals
+
+    volume_ok = arrays["volume"][1:] > min_volume
+
+    signals[1:][(close[1:] > arrays["high"][:-1]) & volume_ok] = 1
+    signals[1:][(close[1:] < arrays["low"][:-1]) & volume_ok] = -1
+
+    return signals
+
+
+def _find_exit(arrays: Dict[str, np.ndarray], start: int, side: int, entry_price: float,
+               take_profit: Optional[float], stop_loss: Optional[float]) -> Tuple[int, float, str]:
+
+    """
+    Find the first candle from 'start' where the TP or the SL is reached.
+    The history is scanned in windows of growing size so that a trade only costs O(its duration).
+    :return: The exit candle index, the exit price and the exit reason (tp, sl or end)
+    """
+
+    high, low, open_ = arrays["high"], arrays["low"], arrays["open"]
+    n = len(high)
+
+    # Same thresholds as Strategy._check_tp_sl()
+    if side == 1:
+        sl_price = entry_price * (1 - stop_loss / 100) if stop_loss is not None else -np.inf
+        tp_price = entry_price * (1 + take_profit / 100) if take_profit is not None else np.inf
+    else:
+        sl_price = entry_price * (1 + stop_loss / 100) if stop_loss is not None else np.inf
+        tp_price = entry_price * (1 - take_profit / 100) if take_profit is not None else -np.inf
+
+    window = 256
+    i = start
+
+    while i < n:
+        end = min(i + window, n)
+
+        if side == 1:
+            sl_hit = low[i:end] <= sl_price
+            tp_hit = high[i:end] >= tp_price
+        else:
+            sl_hit = high[i:end] >= sl_price
+            tp_hit = low[i:end] <= tp_price
+
+        hit = sl_hit | tp_hit
+
+        if hit.any():
+            k = int(hit.argmax())
+            idx = i + k
+
+            # If the candle opened beyond the threshold, the exit happens at the open price
+            if sl_hit[k]:
+                price = min(sl_price, open_[idx]) if side == 1 else max(sl_price, open_[idx])
+                return idx, price, "sl"
+            else:
+                price = max(tp_price, open_[idx]) if side == 1 else min(tp_price, open_[idx])
+                return idx, price, "tp"
+
+        i = end
+        window *= 4
+
+    return n - 1, arrays["close"][n - 1], "end"
+
+
+def simulate(arrays: Dict[str, np.ndarray], signals: np.ndarray, take_profit: Optional[float],
+             stop_loss: Optional[float], balance_pct: float = 100, entry_on_next_open: bool = True,
+             allow_short: bool = True, fee_pct: float = 0) -> BacktestResult:
+
+    """
+    Open a position on each signal when no position is open and close it at the TP/SL.
+    :param arrays: OHLCV arrays, see candles_to_arrays()
+    :param signals: 1, -1 or 0 for each candle
+    :param take_profit: In %, like the TP % column of the strategy component (None to disable)
+    :param stop_loss: In %, like the SL % column of the strategy component (None to disable)
+    :param balance_pct: Percentage of the equity invested in each trade
+    :param entry_on_next_open: True to enter at the open of the next candle (TechnicalStrategy),
+    False to enter at the close of the signal candle (BreakoutStrategy)
+    :param allow_short: False for Spot platforms, where short signals are ignored
+    :param fee_pct: Fee paid on the entry and on the exit, in %
+    :return:
+    """
+
+    close = arrays["close"]
+    timestamps = arrays["timestamp"]
+    n = len(close)
+
+    if not allow_short:
+        signals = np.where(signals == 1, signals, 0)
+
+    signal_indexes = np.flatnonzero(signals)
+
+    equity = np.ones(n)
+    current_equity = 1.0
+    last_filled = 0
+
+    records = []
+
+    search_from = 0
+
+    while True:
+        pos = int(np.searchsorted(signal_indexes, search_from))
+        if pos >= len(signal_indexes):
+            break
+
+        signal_idx = int(signal_indexes[pos])
+        side = int(signals[signal_idx])
+
+        if entry_on_next_open:
+            entry_idx = signal_idx + 1
+            if entry_idx >= n:
+                break
+            entry_price = arrays["open"][entry_idx]
+            exit_search = entry_idx
+        else:
+            entry_idx = signal_idx
+            entry_price = close[entry_idx]
+            exit_search = entry_idx + 1
+
+        exit_idx, exit_price, reason = _find_exit(arrays, exit_search, side, entry_price, take_profit, stop_loss)
+
+        invested = balance_pct / 100
+
+        # Equity before the trade, then marked to market while the position is open
+        equity[last_filled:entry_idx] = current_equity
+        returns = side * (close[entry_idx:exit_idx] / entry_price - 1)
+        equity[entry_idx:exit_idx] = current_equity * (1 + invested * returns)
+
+        pnl_pct = side * (exit_price / entry_price - 1) * 100 - 2 * fee_pct
+        current_equity *= 1 + invested * pnl_pct / 100
+
+        equity[exit_idx] = current_equity
+        last_filled = exit_idx + 1
+
+        records.append((timestamps[entry_idx], timestamps[exit_idx], "long" if side == 1 else "short", entry_price,
+                        exit_price, pnl_pct, reason))
+
+        # The strategy can only open a new position once the previous one is closed
+        search_from = exit_idx if entry_on_next_open else exit_idx + 1
+
+    equity[last_filled:] = current_equity
+
+    trades = pd.DataFrame(records, columns=["entry_time", "exit_time", "side", "entry_price", "exit_price", "pnl_pct",
+                                            "exit_reason"])
+
+    return BacktestResult(trades, pd.Series(equity, index=timestamps))
+
+
+def backtest(strategy_type: str, candles, take_profit: Optional[float], stop_loss: Optional[float],
+             other_params: Dict, balance_pct: float = 100, allow_short: bool = True, fee_pct: float = 0) \
+        -> BacktestResult:
+
+    """
+    Backtest a strategy with the same parameters as in the strategy component.
+    :param strategy_type: Technical or Breakout
+    :param candles: See candles_to_arrays(), e.g the list returned by get_historical_candles()
+    :param take_profit: In %
+    :param stop_loss: In %
+    :param other_params: The extra parameters of the strategy (ema_fast, ema_slow, ema_signal, rsi_length or min_volume)
+    :return:
+    """
+
+    arrays = candles_to_arrays(candles)
+
+    if strategy_type == "Technical":
+        signals = technical_signals(arrays, other_params['ema_fast'], other_params['ema_slow'],
+                                    other_params['ema_signal'], other_params['rsi_length'])
+        return simulate(arrays, signals, take_profit, stop_loss, balance_pct, True, allow_short, fee_pct)
+
+    elif strategy_type == "Breakout":
+        signals = breakout_signals(arrays, other_params['min_volume'])
+        return simulate(arrays, signals, take_profit, stop_loss, balance_pct, False, allow_short, fee_pct)
+
+    else:
+        raise ValueError(f"Unknown strategy type: {strategy_type}")
@@ -0,0 +1,147 @@
+"""
+Decoding cost of the websocket messages: previous code of the _on_message() handlers (json.loads() on every message,
+dateutil for the Bitmex timestamps) against connectors.decoding (orjson if installed, cached ISO 8601 parser, messages
+of unused symbols dropped before decoding).
+Run from the project root: python -m benchmarks.bench_decoding [number of messages]
+The payloads have the format of the Binance Futures and Bitmex websocket messages. Every comparison is asserted.
+"""
+
+import json
+import random
+import sys
+import time
+
+import dateutil.parser
+
+from connectors import decoding
+
+
+N = 200_000
+
+
+def binance_agg_trades(n: int, symbols: list) -> list:
+    messages = []
+    ts = 1637576130120
+
+    for i in range(n):
+        ts += random.randint(0, 50)
+        messages.append(f'{{"e":"aggTrade","E":{ts + 3},"a":{1230000000 + i},"s":"{random.choice(symbols)}",'
+                        f'"p":"{57000 + random.random() * 500:.2f}","q":"{random.random():.3f}",'
+                        f'"f":{2000000000 + i},"l":{2000000000 + i},"T":{ts},"m":{random.choice(["true", "false"])}}}')
+
+    return messages
+
+
+def bitmex_trades(n: int, symbols: list) -> list:
+    messages = []
+    ts = 1637576130120
+
+    for i in range(n):
+        ts += random.randint(0, 50_000)  # Crosses a few days
+        iso = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts // 1000)) + f".{ts % 1000:03d}Z"
+        messages.append(f'{{"table":"trade","action":"insert","data":[{{"timestamp":"{iso}",'
+                        f'"symbol":"{random.choice(symbols)}","side":"Buy","size":{random.randint(1, 5000)},'
+                        f'"price":{57000 + random.randint(0, 1000) / 2},"tickDirection":"PlusTick",'
+                        f'"trdMatchID":"{random.getrandbits(128):032x}","grossValue":174455,'
+                        f'"homeNotional":0.00174455,"foreignNotional":100}}]}}')
+
+    return messages
+
+
+def measure(name: str, func, messages: list) -> float:
+    start = time.perf_counter()
+    func(messages)
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<42} {elapsed / len(messages) * 1e6:>7.2f} us/message")
+
+    return elapsed
+
+
+# Previous _on_message() code, kept here only for comparison
+
+def legacy_binance(messages: list, routed: set) -> list:
+    trades = []
+    for msg in messages:
+        data = json.loads(msg)
+        if data['s'] not in routed:
+            continue
+        trades.append((data['s'], float(data['p']), float(data['q']), data['T']))
+    return trades
+
+
+def legacy_bitmex(messages: list, routed: set) -> list:
+    trades = []
+    for msg in messages:
+        data = json.loads(msg)
+        for d in data['data']:
+            if d['symbol'] not in routed:
+                continue
+            ts = int(dateutil.parser.isoparse(d['timestamp']).timestamp() * 1000)
+            trades.append((d['symbol'], float(d['price']), float(d['size']), ts))
+    return trades
+
+
+def new_binance(messages: list, routed: set) -> list:
+    trades = []
+    for msg in messages:
+        if decoding.peek(msg, "s") not in routed:
+            continue
+        data = decoding.loads(msg)
+        trades.append((data['s'], float(data['p']), float(data['q']), data['T']))
+    return trades
+
+
+def new_bitmex(messages: list, routed: set) -> list:
+    routed_symbols = tuple(routed)
+    trades = []
+    for msg in messages:
+        if not decoding.mentions(msg, "symbol", routed_symbols):
+            continue
+        data = decoding.loads(msg)
+        for d in data['data']:
+            if d['symbol'] not in routed:
+                continue
+            trades.append((d['symbol'], float(d['price']), float(d['size']), decoding.iso_to_ms(d['timestamp'])))
+    return trades
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    random.seed(1)
+
+    print(f"JSON backend: {decoding.JSON_BACKEND}, {n} messages\n")
+
+    binance_symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT", "ADAUSDT", "DOGEUSDT", "DOTUSDT"]
+    bitmex_symbols = ["XBTUSD", "ETHUSD", "XBTUSDT", "SOLUSD", "LINKUSD", "XRPUSD", "DOGEUSD", "ADAUSD"]
+
+    for exchange, messages, legacy, new, symbols in [
+            ("Binance aggTrade", binance_agg_trades(n, binance_symbols), legacy_binance, new_binance, binance_symbols),
+            ("Bitmex trade", bitmex_trades(n, bitmex_symbols), legacy_bitmex, new_bitmex, bitmex_symbols)]:
+
+        for routed_name, routed in [("all symbols routed", set(symbols)), ("1 of 8 symbols routed", {symbols[0]})]:
+            print(f"{exchange}, {routed_name}")
+
+            legacy_time = measure("  json.loads (previous code)", lambda m: legacy(m, routed), messages)
+            new_time = measure("  connectors.decoding", lambda m: new(m, routed), messages)
+
+            assert legacy(messages, routed) == new(messages, routed)
+
+            print(f"  speed-up x{legacy_time / new_time:.2f}\n")
+
+    # Timestamp parser alone
+    timestamps = [json.loads(msg)['data'][0]['timestamp'] for msg in bitmex_trades(n, bitmex_symbols)]
+
+    print("Bitmex timestamps")
+    legacy_time = measure("  dateutil.parser.isoparse", lambda m: [int(dateutil.parser.isoparse(t).timestamp() * 1000)
+                                                                    for t in m], timestamps)
+    new_time = measure("  decoding.iso_to_ms", lambda m: [decoding.iso_to_ms(t) for t in m], timestamps)
+    print(f"  speed-up x{legacy_time / new_time:.2f}")
+
+    assert [int(dateutil.parser.isoparse(t).timestamp() * 1000) for t in timestamps] == \
+           [decoding.iso_to_ms(t) for t in timestamps]
+
+
+if __name__ == '__main__':
+    main()
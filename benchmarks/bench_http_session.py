@@ -0,0 +1,98 @@
+"""
+Latency of the REST requests with a new aiohttp session per request (previous _make_request()) against the
+persistent session of the connectors, on a local HTTP server standing in for the exchange.
+Run from the project root: python -m benchmarks.bench_http_session [number of requests]
+Over the internet the gap is larger: each new session also pays for the DNS resolution and the TLS handshake.
+"""
+
+import asyncio
+import statistics
+import sys
+import threading
+import time
+
+import aiohttp
+from aiohttp import web
+
+
+HOST = "127.0.0.1"
+PORT = 8766
+N = 500
+
+
+async def order_endpoint(request):
+    return web.json_response({"orderId": 283194212, "status": "FILLED", "avgPrice": "46250.10",
+                              "executedQty": "0.010"})
+
+
+def start_server():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    app = web.Application()
+    app.router.add_get("/fapi/v1/order", order_endpoint)
+
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, HOST, PORT).start())
+    loop.run_forever()
+
+
+async def new_session_request(url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, params={"symbol": "BTCUSDT"}) as resp:
+            return await resp.json()
+
+
+def pooled_session() -> aiohttp.ClientSession:
+    # Same settings as the connectors _get_session()
+    connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=60, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+
+
+async def pooled_request(session: aiohttp.ClientSession, url: str):
+    async with session.get(url, params={"symbol": "BTCUSDT"}) as resp:
+        return await resp.json()
+
+
+def measure(name: str, loop: asyncio.AbstractEventLoop, request, n: int):
+    latencies = []
+
+    for _ in range(n):
+        start = time.perf_counter()
+        loop.run_until_complete(request())  # Sequential, like make_request()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+
+    print(f"{name:<22} mean {statistics.mean(latencies):>7.3f} ms  p50 {latencies[len(latencies) // 2]:>7.3f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:>7.3f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    threading.Thread(target=start_server, daemon=True).start()
+    time.sleep(0.5)
+
+    url = f"http://{HOST}:{PORT}/fapi/v1/order"
+    loop = asyncio.new_event_loop()
+
+    print(f"{n} sequential requests to {url}")
+
+    measure("New session / request", loop, lambda: new_session_request(url), n)
+
+    async def create_session():
+        return pooled_session()
+
+    session = loop.run_until_complete(create_session())
+    loop.run_until_complete(pooled_request(session, url))  # Warm-up, like the connectors at startup
+
+    measure("Persistent session", loop, lambda: pooled_request(session, url), n)
+
+    loop.run_until_complete(session.close())
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Speed benchmark of the indicators package against the previous pandas code of TechnicalStrategy.
+Run from the project root: python -m benchmarks.bench_indicators [number of bars...]
+The values are compared in tests/test_indicators.py.
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+import indicators
+from tests.test_indicators import legacy_rsi, legacy_macd, random_candles
+
+
+SIZES = [1_000, 100_000, 10_000_000]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def benchmark_size(n: int):
+    highs, lows, closes, volumes = random_candles(n)
+    series = pd.Series(closes)
+
+    legacy, legacy_rsi_time = timed(legacy_rsi, series, 14)
+    rsi_values, rsi_time = timed(indicators.rsi, closes, 14)
+
+    (legacy_line, legacy_signal), legacy_macd_time = timed(legacy_macd, series, 12, 26, 9)
+    (macd_line, macd_signal), macd_time = timed(indicators.macd, closes, 12, 26, 9)
+
+    print(f"{n:>11,} bars | RSI pandas {legacy_rsi_time * 1000:>9.1f} ms  numpy {rsi_time * 1000:>9.1f} ms "
+          f"| MACD pandas {legacy_macd_time * 1000:>9.1f} ms  numpy {macd_time * 1000:>9.1f} ms")
+
+
+def benchmark_streaming(n: int = 5_000):
+    highs, lows, closes, volumes = random_candles(n, seed=2)
+
+    start = time.perf_counter()
+    rsi = indicators.StreamingRSI(14)
+    for c in closes:
+        rsi.update(c)
+    elapsed = time.perf_counter() - start
+
+    print(f"StreamingRSI {elapsed / n * 1e6:.2f} us per candle")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    for n in sizes:
+        benchmark_size(n)
+
+    benchmark_streaming()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Memory / allocation benchmark of the slotted models against the previous __dict__ based classes.
+Run from the project root: python -m benchmarks.bench_models
+"""
+
+import time
+import tracemalloc
+
+from models import Candle, Contract, OrderStatus, Trade
+
+
+# Previous implementation (plain classes branching on the exchange in __init__), kept here only for comparison
+
+class LegacyCandle:
+    def __init__(self, candle_info, timeframe, exchange):
+        if exchange in ["binance_futures", "binance_spot"]:
+            self.timestamp = candle_info[0]
+            self.open = float(candle_info[1])
+            self.high = float(candle_info[2])
+            self.low = float(candle_info[3])
+            self.close = float(candle_info[4])
+            self.volume = float(candle_info[5])
+
+
+class LegacyContract:
+    def __init__(self, contract_info, exchange):
+        if exchange == "binance_futures":
+            self.symbol = contract_info['symbol']
+            self.base_asset = contract_info['baseAsset']
+            self.quote_asset = contract_info['quoteAsset']
+            self.price_decimals = contract_info['pricePrecision']
+            self.quantity_decimals = contract_info['quantityPrecision']
+            self.tick_size = 1 / pow(10, contract_info['pricePrecision'])
+            self.lot_size = 1 / pow(10, contract_info['quantityPrecision'])
+        self.exchange = exchange
+
+
+class LegacyOrderStatus:
+    def __init__(self, order_info, exchange):
+        if exchange == "binance_futures":
+            self.order_id = order_info['orderId']
+            self.status = order_info['status'].lower()
+            self.avg_price = float(order_info['avgPrice'])
+            self.executed_qty = float(order_info['executedQty'])
+
+
+class LegacyTrade:
+    def __init__(self, trade_info):
+        self.time = trade_info['time']
+        self.contract = trade_info['contract']
+        self.strategy = trade_info['strategy']
+        self.side = trade_info['side']
+        self.entry_price = trade_info['entry_price']
+        self.status = trade_info['status']
+        self.pnl = trade_info['pnl']
+        self.quantity = trade_info['quantity']
+        self.entry_id = trade_info['entry_id']
+
+
+N = 100_000
+
+RAW_KLINE = [1640995200000, "46216.93", "46271.08", "46208.37", "46250.00", "40.57574", 1640995259999,
+             "1876433.40", 1261, "19.84306", "917570.39", "0"]
+RAW_CONTRACT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2,
+                "quantityPrecision": 3}
+RAW_ORDER = {"orderId": 283194212, "status": "FILLED", "avgPrice": "46250.10", "executedQty": "0.010"}
+
+
+def measure(name: str, factory):
+    start = time.perf_counter()
+    objects = [factory(i) for i in range(N)]
+    elapsed = time.perf_counter() - start  # Timed without tracemalloc, which slows down every allocation
+
+    del objects
+
+    tracemalloc.start()
+    objects = [factory(i) for i in range(N)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<20} {elapsed * 1000:>9.1f} ms {current / N:>9.1f} bytes/object {peak / 1024 / 1024:>8.1f} MB peak")
+
+    return objects
+
+
+def main():
+    print(f"{N} objects per model")
+
+    measure("LegacyCandle", lambda i: LegacyCandle(RAW_KLINE, "1m", "binance_futures"))
+    measure("Candle", lambda i: Candle.from_binance(RAW_KLINE))
+
+    measure("LegacyContract", lambda i: LegacyContract(RAW_CONTRACT, "binance_futures"))
+    measure("Contract", lambda i: Contract.from_binance_futures(RAW_CONTRACT))
+
+    measure("LegacyOrderStatus", lambda i: LegacyOrderStatus(RAW_ORDER, "binance_futures"))
+    measure("OrderStatus", lambda i: OrderStatus.from_binance(RAW_ORDER))
+
+    contract = Contract.from_binance_futures(RAW_CONTRACT)
+
+    measure("LegacyTrade", lambda i: LegacyTrade({"time": i, "contract": contract, "strategy": "Technical",
+                                                  "side": "long", "entry_price": 46250.1, "status": "open",
+                                                  "pnl": 0, "quantity": 0.01, "entry_id": i}))
+    measure("Trade", lambda i: Trade(time=i, contract=contract, strategy="Technical", side="long",
+                                     entry_price=46250.1, status="open", pnl=0, quantity=0.01, entry_id=i))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from models import Candle
+from candle_store import CANDLE_RETENTION
+
+
+CANDLE_CACHE_FILE = "candles.db"
+DEFAULT_CACHE_DIR = os.path.dirname(os.path.abspath(__file__))  # The project directory, whatever the working directory
+
+
+class CandleCache:
+    def __init__(self, directory: typing.Optional[str] = None, retention: int = CANDLE_RETENTION):
+
+        """
+        Local copy of the closed candles downloaded from the exchanges, keyed by (exchange, symbol, timeframe), so
+        that a strategy starts from the cached candles and only the candles since the last run are downloaded.
+        The database uses the WAL journal: the websocket/backfill threads write while the interface reads.
+        :param directory: Directory of the SQLite database (CANDLE_CACHE_FILE), DEFAULT_CACHE_DIR if None
+        :param retention: Number of candles kept for each exchange/symbol/timeframe
+        """
+
+        self._retention = retention
+
+        if directory is None:
+            directory = DEFAULT_CACHE_DIR
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = os.path.join(directory, CANDLE_CACHE_FILE)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)  # Shared by the threads, behind self._lock
+        self._lock = threading.Lock()
+
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, the cache can be downloaded again anyway
+
+        self.conn.execute("CREATE TABLE IF NOT EXISTS candles (exchange TEXT, symbol TEXT, timeframe TEXT, "
+                          "timestamp INTEGER, open REAL, high REAL, low REAL, close REAL, volume REAL, "
+                          "PRIMARY KEY (exchange, symbol, timeframe, timestamp)) WITHOUT ROWID")
+        self.conn.commit()
+
+    def load(self, exchange: str, symbol: str, timeframe: str) -> typing.List[Candle]:
+
+        """
+        :return: The most recent cached candles, sorted by timestamp
+        """
+
+        with self._lock:
+            rows = self.conn.execute("SELECT timestamp, open, high, low, close, volume FROM candles "
+                                     "WHERE exchange = ? AND symbol = ? AND timeframe = ? "
+                                     "ORDER BY timestamp DESC LIMIT ?",
+                                     (exchange, symbol, timeframe, self._retention)).fetchall()
+
+        return [Candle(*row) for row in reversed(rows)]
+
+    def save(self, exchange: str, symbol: str, timeframe: str, candles: typing.List[Candle], tf_equiv: int):
+
+        """
+        Record the closed candles (the candle still open is left out, it will be downloaded again once closed).
+        :param exchange:
+        :param symbol:
+        :param timeframe:
+        :param candles:
+        :param tf_equiv: Duration of a candle in milliseconds
+        :return:
+        """
+
+        now = int(time.time() * 1000)
+
+        rows = [(exchange, symbol, timeframe, c.timestamp, c.open, c.high, c.low, c.close, c.volume)
+                for c in candles if c.timestamp + tf_equiv <= now]
+
+        if len(rows) == 0:
+            return
+
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+            # Only the most recent candles are kept
+            self.conn.execute("DELETE FROM candles WHERE exchange = ? AND symbol = ? AND timeframe = ? AND "
+                              "timestamp <= (SELECT timestamp FROM candles WHERE exchange = ? AND symbol = ? AND "
+                              "timeframe = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?)",
+                              (exchange, symbol, timeframe, exchange, symbol, timeframe, self._retention))
+
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,150 @@
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from models import Candle
+
+
+CANDLE_RETENTION = 5000  # Default number of candles kept in memory for each strategy
+
+FIELDS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+class CandleBuffer:
+    def __init__(self, capacity: int = CANDLE_RETENTION):
+
+        """
+        Fixed-capacity columnar candle store, the oldest candles are overwritten once the capacity is reached.
+        Each column is allocated twice as long as the capacity and every value is written at its ring position
+        and at ring position + capacity, so that the last N candles are always contiguous in memory and can be
+        returned as NumPy views (no copy, no allocation) in chronological order.
+        :param capacity: The retention window, i.e the maximum number of candles kept
+        """
+
+        self.capacity = capacity
+
+        self._columns = {"timestamp": np.zeros(2 * capacity, dtype=np.int64)}
+        for field in FIELDS[1:]:
+            self._columns[field] = np.zeros(2 * capacity, dtype=np.float64)
+
+        self._head = -1  # Ring position of the last candle
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Candle:
+
+        """
+        Materialize one candle as a Candle object, only for occasional use (the hot paths read the columns).
+        :param index: Python-like index, -1 is the last candle
+        :return:
+        """
+
+        if index < 0:
+            index += self._size
+        if index < 0 or index >= self._size:
+            raise IndexError("CandleBuffer index out of range")
+
+        pos = self._head + self.capacity - self._size + 1 + index
+        return Candle(int(self._columns["timestamp"][pos]), float(self._columns["open"][pos]),
+                      float(self._columns["high"][pos]), float(self._columns["low"][pos]),
+                      float(self._columns["close"][pos]), float(self._columns["volume"][pos]))
+
+    def _view(self, field: str) -> np.ndarray:
+        start = self._head + self.capacity - self._size + 1
+        view = self._columns[field][start:self._head + self.capacity + 1]
+        view.flags.writeable = False  # The data is shared, it must only be modified through the buffer methods
+        return view
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._view("timestamp")
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._view("open")
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._view("high")
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._view("low")
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._view("close")
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._view("volume")
+
+    @property
+    def last_timestamp(self) -> int:
+        return int(self._columns["timestamp"][self._head])
+
+    @property
+    def last_close(self) -> float:
+        return float(self._columns["close"][self._head])
+
+    def series(self, field: str) -> pd.Series:
+
+        """
+        :param field: timestamp, open, high, low, close or volume
+        :return: A pandas Series backed by the buffer memory (zero-copy)
+        """
+
+        return pd.Series(self._view(field), copy=False)
+
+    def to_dataframe(self) -> pd.DataFrame:
+
+        """
+        :return: A DataFrame with one column per field (pandas copies the columns into its own blocks)
+        """
+
+        return pd.DataFrame({field: self._view(field) for field in FIELDS})
+
+    def _write(self, pos: int, field: str, value):
+        column = self._columns[field]
+        column[pos] = value
+        column[pos + self.capacity] = value
+
+    def append(self, timestamp: int, open_: float, high: float, low: float, close: float, volume: float):
+
+        """
+        Add a new candle at the end of the buffer, overwriting the oldest one if the buffer is full.
+        """
+
+        self._head = (self._head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+        for field, value in (("timestamp", timestamp), ("open", open_), ("high", high), ("low", low),
+                             ("close", close), ("volume", volume)):
+            self._write(self._head, field, value)
+
+    def extend(self, candles: List[Candle]):
+        for c in candles:
+            self.append(c.timestamp, c.open, c.high, c.low, c.close, c.volume)
+
+    def update_last(self, price: float, size: float):
+
+        """
+        Update the last candle in place with a new trade.
+        :param price: The trade price
+        :param size: The trade size
+        :return:
+        """
+
+        pos = self._head
+
+        self._write(pos, "close", price)
+        self._write(pos, "volume", self._columns["volume"][pos] + size)
+
+        if price > self._columns["high"][pos]:
+            self._write(pos, "high", price)
+        elif price < self._columns["low"][pos]:
+            self._write(pos, "low", price)
@@ -16,13 +16,32 @@ import threading
 
 from models import *
 from strategies import TechnicalStrategy, BreakoutStrategy
+from connectors.order_tracker import OrderTracker
+from connectors.execution import ExecutionQueue
+from connectors import decoding
+from connectors.decoding import peek
+from connectors.fills import FillCache
+from connectors.rate_limiter import RateLimiter, request_priority, request_weight
+from positions import PositionBook
+from history import HistoryDownloader
+from candle_store import CandleBuffer
+from candle_cache import CandleCache
+from tick_archive import TickRecorder
+from aggregator import SymbolAggregator, TF_EQUIV
 
 
 logger = logging.getLogger()
 
+LISTEN_KEY_KEEPALIVE = 30 * 60  # Seconds, a listenKey expires 60 minutes after its last keep-alive
+ORDER_HISTORY = 1000  # Number of order states kept in memory
+
 
 class BinanceClient:
-    def __init__(self, public_key: str, secret_key: str, testnet: bool, futures: bool):
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, futures: bool, pool_size: int = 10,
+                 timeout: float = 10.0, keepalive_timeout: float = 60.0, warm_connections: int = 2,
+                 user_stream: bool = True, user_stream_url: typing.Optional[str] = None,
+                 candle_cache_dir: typing.Optional[str] = None, base_url: typing.Optional[str] = None,
+                 wss_url: typing.Optional[str] = None):
 
         """
         https://binance-docs.github.io/apidocs/futures/en
@@ -30,9 +49,21 @@ class BinanceClient:
         :param secret_key:
         :param testnet:
         :param futures: if False, the Client will be a Spot API Client
+        :param pool_size: Maximum number of simultaneous connections to the REST API
+        :param timeout: Seconds before a REST request is abandoned
+        :param keepalive_timeout: Seconds an idle connection is kept open
+        :param warm_connections: Connections opened at startup, before the first request
+        :param user_stream: Keep the balances and the orders up to date with the user data stream
+        :param user_stream_url: Websocket url of the user data stream, the market data url if None
+        :param candle_cache_dir: Directory of the local candle cache, the project directory if None
+        :param base_url: REST API url, replaces the Binance one (e.g a local stand-in of the exchange in the tests)
+        :param wss_url: Websocket url, replaces the Binance one
         """
+        # The REST requests run in an event loop of their own thread: the interface, the websocket and the order
+        # threads submit coroutines to it with _run(), and the requests of different threads overlap
         self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._loop_thread.start()
 
         self.futures = futures
 
@@ -53,19 +84,58 @@ class BinanceClient:
                 self._base_url = "https://api.binance.com"
                 self._wss_url = "wss://stream.binance.com:9443/ws"
 
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
         self._public_key = public_key
         self._secret_key = secret_key
 
         self._headers = {'X-MBX-APIKEY': self._public_key}
 
+        # Persistent HTTP session, created on the first request
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._pool_size = pool_size
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self.rate_limiter = RateLimiter(self.platform)  # rate_limiter.headroom: share of the weight limit left
+        self._ping_endpoint = "/fapi/v1/ping" if self.futures else "/api/v3/ping"
+
+        self._run(self._warm_up(warm_connections))
+
+        # User data stream: balances and order updates pushed by Binance, instead of REST requests.
+        # Set before the first request: get_balances() and the OrderTracker read them
+        self._user_stream_url = user_stream_url if user_stream_url is not None else self._wss_url
+        self.user_ws: typing.Optional[websocket.WebSocketApp] = None
+        self.user_stream_connected = False
+        self._keep_alive_future: typing.Optional[asyncio.Future] = None
+        self.orders: typing.OrderedDict[int, OrderStatus] = collections.OrderedDict()  # Last known state of the orders
+
+        self._fills: typing.Dict[str, FillCache] = dict()  # Binance Spot fills of each symbol, by orderId
+
         self.contracts = self.get_contracts()
         self.balances = self.get_balances()
 
         self.prices = dict()
         self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self._routes: typing.Dict[str, typing.Tuple[typing.Union[TechnicalStrategy, BreakoutStrategy], ...]] = dict()
+        self._strategies_lock = threading.Lock()
 
         self.logs = []
 
+        self.order_tracker = OrderTracker(self)
+        self.execution = ExecutionQueue(self.platform)  # Order placement of the strategies, off the websocket thread
+
+        # Shared candles of the symbols the strategies are running on
+        self.aggregators: typing.Dict[str, SymbolAggregator] = dict()
+        self.candle_cache = CandleCache(candle_cache_dir)
+
+        self.recorder: typing.Optional[TickRecorder] = None  # Set to archive the trades of the subscribed symbols
+
+        # Open positions of each symbol, their PnL is recomputed at once on every bid/ask update
+        self.positions: typing.Dict[str, PositionBook] = dict()
+
         self._ws_id = 1
         self.ws: websocket.WebSocketApp
         self.reconnect = True
@@ -75,6 +145,10 @@ class BinanceClient:
         t = threading.Thread(target=self._start_ws)
         t.start()
 
+        if user_stream:
+            t = threading.Thread(target=self._start_user_stream)
+            t.start()
+
         logger.info("Binance Futures Client successfully initialized")
 
     def _add_log(self, msg: str):
@@ -102,51 +176,127 @@ class BinanceClient:
 
         """
             Wrapper that normalizes the requests to the REST API and error handling.
-            :param method: GET, POST, DELETE
+            :param method: GET, POST, PUT, DELETE
             :param endpoint: Includes the /api/v1 part
             :param data: Parameters of the request
             :return:
         """
 
-        async with aiohttp.ClientSession() as session:
-            if method == "GET":
-                try:
-                    async with session.get(self._base_url + endpoint, params=data,
-                                           headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:  # Takes into account any possible error, most likely network errors
-                    return None
-
-            elif method == "POST":
-                try:
-                    async with session.post(self._base_url + endpoint, params=data,
-                                            headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:
-                    return None
-
-            elif method == "DELETE":
-                try:
-                    async with session.delete(self._base_url + endpoint, params=data,
-                                              headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:
-                    return None
-            else:
-                raise ValueError()
+        # Orders first, and only once the exchange weight limit allows it
+        await self.rate_limiter.acquire(request_weight(method, endpoint, data), request_priority(method, endpoint))
 
-            if response.status == 200:  # 200 is the response code of successful requests
-                return resp_json
-            else:
-                logger.error("Error while making %s request to %s: %s (error code %s)",
-                             method, endpoint, resp_json, resp.status)
+        session = await self._get_session()
+
+        if method == "GET":
+            try:
+                async with session.get(self._base_url + endpoint, params=data,
+                                       headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:  # Takes into account any possible error, most likely network errors
+                return None
+
+        elif method == "POST":
+            try:
+                async with session.post(self._base_url + endpoint, params=data,
+                                        headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:
+                return None
+
+        elif method == "PUT":
+            try:
+                async with session.put(self._base_url + endpoint, params=data,
+                                       headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:
                 return None
 
+        elif method == "DELETE":
+            try:
+                async with session.delete(self._base_url + endpoint, params=data,
+                                          headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:
+                return None
+        else:
+            raise ValueError()
+
+        self.rate_limiter.update_from_headers(response.status, response.headers)
+
+        if response.status == 200:  # 200 is the response code of successful requests
+            return resp_json
+        else:
+            logger.error("Error while making %s request to %s: %s (error code %s)",
+                         method, endpoint, resp_json, resp.status)
+            return None
+
     def make_request(self, method: str, endpoint: str, data: typing.Dict):
-        return self.loop.run_until_complete(self._make_request(method, endpoint, data))
+        return self._run(self._make_request(method, endpoint, data))
+
+    def _run(self, coro: typing.Coroutine):
+
+        """
+        Run a coroutine in the event loop thread and wait for its result, can be called from any thread except the
+        event loop thread itself.
+        :param coro:
+        :return:
+        """
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+
+        """
+        The session is created once and reused by all the requests: its connections are kept alive, so the requests
+        don't pay for the DNS resolution and the TCP/TLS handshakes each time.
+        :return:
+        """
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=self._keepalive_timeout,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+        return self._session
+
+    async def _warm_up(self, connections: int):
+        session = await self._get_session()
+
+        async def ping():
+            try:
+                async with session.get(self._base_url + self._ping_endpoint) as resp:
+                    await resp.read()
+            except Exception as e:
+                logger.warning("%s connection warm-up failed: %s", self.platform, e)
+
+        await asyncio.gather(*[ping() for _ in range(connections)])
+
+    def close(self):
+
+        """
+        Close the pooled connections, stop the event loop thread and close the candle cache, called when the
+        interface is closed.
+        :return:
+        """
+
+        self.order_tracker.stop()
+
+        if self.user_ws is not None:
+            self.user_ws.close()
+
+        if self._keep_alive_future is not None:  # Cancelled here, the loop may stop before _on_user_close() runs
+            self._keep_alive_future.cancel()
+
+        if self._session is not None and not self._session.closed:
+            self._run(self._session.close())
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+        self.candle_cache.close()  # Checkpoints the WAL, the -wal/-shm files are removed
 
     def get_contracts(self) -> typing.Dict[str, Contract]:
 
@@ -164,24 +314,38 @@ class BinanceClient:
 
         if exchange_info is not None:
             for contract_data in exchange_info['symbols']:
-                contracts[contract_data['symbol']] = Contract(contract_data, self.platform)
+                if self.futures:
+                    contracts[contract_data['symbol']] = Contract.from_binance_futures(contract_data)
+                else:
+                    contracts[contract_data['symbol']] = Contract.from_binance_spot(contract_data)
 
         return collections.OrderedDict(sorted(contracts.items()))  # Sort keys of the dictionary alphabetically
 
-    def get_historical_candles(self, contract: Contract, interval: str) -> typing.List[Candle]:
+    def get_historical_candles(self, contract: Contract, interval: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.List[Candle]:
 
         """
         Get a list of the most recent candlesticks for a given symbol/contract and interval.
         :param contract:
         :param interval: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d, 3d, 1w, 1M
+        :param start_time: Open time (Unix timestamp in milliseconds) of the first candle, e.g to backfill a gap
+        :param end_time: Open time of the last candle
         :return:
         """
 
+        if start_time is not None:  # A gap can be longer than a page, e.g once resampled to a larger timeframe
+            candles = []
+            self._run(self.download_history_async(contract, interval, start_time, end_time, on_candles=candles.extend))
+            return candles
+
         data = dict()
         data['symbol'] = contract.symbol
         data['interval'] = interval
         data['limit'] = 1000  # The maximum number of candles is 1000 on Binance Spot
 
+        if end_time is not None:
+            data['endTime'] = end_time
+
         if self.futures:
             raw_candles = self.make_request("GET", "/fapi/v1/klines", data)
         else:
@@ -191,10 +355,125 @@ class BinanceClient:
 
         if raw_candles is not None:
             for c in raw_candles:
-                candles.append(Candle(c, interval, self.platform))
+                candles.append(Candle.from_binance(c))
 
         return candles
 
+    def download_history(self, contract: Contract, timeframe: str, start_time: int, end_time=None,
+                         store: typing.Optional[CandleBuffer] = None) -> int:
+
+        """
+        Download a long history (e.g a year of 1m candles for a backtest or an indicator warm-up) with concurrent
+        paginated requests, instead of the single page of recent candles of get_historical_candles().
+        :param contract:
+        :param timeframe: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d
+        :param start_time: Unix timestamp in milliseconds
+        :param end_time: Unix timestamp in milliseconds, now if None
+        :param store: The candles are appended to it as the pages arrive
+        :return: The number of candles downloaded
+        """
+
+        return self._run(self.download_history_async(contract, timeframe, start_time, end_time, store))
+
+    async def download_history_async(self, contract: Contract, timeframe: str, start_time: int, end_time=None,
+                                     store: typing.Optional[CandleBuffer] = None,
+                                     on_candles: typing.Optional[typing.Callable[[typing.List[Candle]], None]] = None
+                                     ) -> int:
+
+        """
+        Runs in the connector event loop: the pages go through the pooled session and the rate limiter (with the
+        market data priority), so a download never delays the orders nor exceeds the weight limit.
+        :param on_candles: Called with each page of candles, in order
+        """
+
+        downloader = HistoryDownloader(self.platform, self._base_url, session=await self._get_session(),
+                                       rate_limiter=self.rate_limiter)
+
+        return await downloader.download_async(contract.symbol, timeframe, start_time, end_time, store, on_candles)
+
+    def add_strategy(self, b_index: int, strategy: typing.Union[TechnicalStrategy, BreakoutStrategy]):
+
+        """
+        Start sending the market data to a strategy.
+        The dictionaries are replaced instead of modified so that the websocket thread can safely keep reading
+        the previous version while a strategy is added or removed from the interface.
+        :param b_index: The strategy row index in the strategy component
+        :param strategy:
+        :return:
+        """
+
+        with self._strategies_lock:
+            self.strategies = {**self.strategies, b_index: strategy}
+            self._rebuild_routes()
+
+    def remove_strategy(self, b_index: int):
+        with self._strategies_lock:
+            self.strategies = {key: strat for key, strat in self.strategies.items() if key != b_index}
+            self._rebuild_routes()
+
+    def _rebuild_routes(self):
+
+        """
+        Build the symbol -> strategies routing table used by _on_message(), so that each message is only
+        dispatched to the strategies running on its symbol.
+        :return:
+        """
+
+        routes = dict()
+        for strat in self.strategies.values():
+            routes.setdefault(strat.contract.symbol, []).append(strat)
+
+        self._routes = {symbol: tuple(strats) for symbol, strats in routes.items()}
+
+    def add_position(self, trade: Trade):
+
+        """
+        Called by the strategies once the entry price of a trade is known.
+        :param trade:
+        :return:
+        """
+
+        symbol = trade.contract.symbol
+
+        with self._strategies_lock:
+            if symbol not in self.positions:
+                self.positions = {**self.positions, symbol: PositionBook(trade.contract)}
+
+        self.positions[symbol].add(trade)
+
+    def remove_position(self, trade: Trade):
+
+        """
+        Called by the strategies when a trade is closed, its last PnL is kept in trade.pnl.
+        :param trade:
+        :return:
+        """
+
+        book = self.positions.get(trade.contract.symbol)
+        if book is not None:
+            book.remove(trade)
+
+    def get_trade_pnl(self, trade: Trade) -> float:
+        book = self.positions.get(trade.contract.symbol)
+        pnl = book.get_pnl(trade) if book is not None else None
+
+        return pnl if pnl is not None else trade.pnl
+
+    def get_aggregator(self, contract: Contract) -> SymbolAggregator:
+
+        """
+        Get (or create) the aggregator building the candles of a symbol for all the strategies and timeframes.
+        :param contract:
+        :return:
+        """
+
+        if contract.symbol not in self.aggregators:
+            self.aggregators[contract.symbol] = SymbolAggregator(f"{self.platform} {contract.symbol}", contract,
+                                                                 self.get_historical_candles, list(TF_EQUIV),
+                                                                 cache=self.candle_cache)
+
+        return self.aggregators[contract.symbol]
+
     def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
 
         """
@@ -221,7 +500,7 @@ class BinanceClient:
 
             return self.prices[contract.symbol]
 
-    def get_balances(self) -> typing.Dict[str, Balance]:
+    async def get_balances_async(self) -> typing.Dict[str, Balance]:
 
         """
         Get the current balance of the account, the data is different between Spot and Futures
@@ -235,21 +514,27 @@ class BinanceClient:
         balances = dict()
 
         if self.futures:
-            account_data = self.make_request("GET", "/fapi/v1/account", data)
+            account_data = await self._make_request("GET", "/fapi/v1/account", data)
         else:
-            account_data = self.make_request("GET", "/api/v3/account", data)
+            account_data = await self._make_request("GET", "/api/v3/account", data)
 
         if account_data is not None:
             if self.futures:
                 for a in account_data['assets']:
-                    balances[a['asset']] = Balance(a, self.platform)
+                    balances[a['asset']] = Balance.from_binance_futures(a)
             else:
                 for a in account_data['balances']:
-                    balances[a['asset']] = Balance(a, self.platform)
+                    balances[a['asset']] = Balance.from_binance_spot(a)
 
         return balances
 
-    def place_order(self, contract: Contract, order_type: str, quantity: float, side: str, price=None, tif=None) -> OrderStatus:
+    def get_balances(self) -> typing.Dict[str, Balance]:
+        if self.user_stream_connected:  # Kept up to date by the user data stream, no request needed
+            return self.balances
+
+        return self._run(self.get_balances_async())
+
+    async def place_order_async(self, contract: Contract, order_type: str, quantity: float, side: str, price=None, tif=None) -> OrderStatus:
 
         """
         Place an order. Based on the order_type, the price and tif arguments are not required
@@ -279,23 +564,32 @@ class BinanceClient:
         data['signature'] = self._generate_signature(data)
 
         if self.futures:
-            order_status = self.make_request("POST", "/fapi/v1/order", data)
+            order_status = await self._make_request("POST", "/fapi/v1/order", data)
         else:
-            order_status = self.make_request("POST", "/api/v3/order", data)
+            order_status = await self._make_request("POST", "/api/v3/order", data)
 
         if order_status is not None:
 
             if not self.futures:
+                # The FULL response of the order has its fills, no request needed for the average price
+                fills = self._fills.setdefault(contract.symbol, FillCache(ORDER_HISTORY))
+                for f in order_status.get('fills', []):
+                    fills.add(order_status['orderId'], f['tradeId'], float(f['price']), float(f['qty']))
+
                 if order_status['status'] == "FILLED":
-                    order_status['avgPrice'] = self._get_execution_price(contract, order_status['orderId'])
+                    order_status['avgPrice'] = await self._get_execution_price_async(
+                        contract, order_status['orderId'], float(order_status['executedQty']))
                 else:
                     order_status['avgPrice'] = 0
 
-            order_status = OrderStatus(order_status, self.platform)
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
-    def cancel_order(self, contract: Contract, order_id: int) -> OrderStatus:
+    def place_order(self, contract: Contract, order_type: str, quantity: float, side: str, price=None, tif=None) -> OrderStatus:
+        return self._run(self.place_order_async(contract, order_type, quantity, side, price, tif))
+
+    async def cancel_order_async(self, contract: Contract, order_id: int) -> OrderStatus:
 
         data = dict()
         data['orderId'] = order_id
@@ -305,52 +599,87 @@ class BinanceClient:
         data['signature'] = self._generate_signature(data)
 
         if self.futures:
-            order_status = self.make_request("DELETE", "/fapi/v1/order", data)
+            order_status = await self._make_request("DELETE", "/fapi/v1/order", data)
         else:
-            order_status = self.make_request("DELETE", "/api/v3/order", data)
+            order_status = await self._make_request("DELETE", "/api/v3/order", data)
 
         if order_status is not None:
             if not self.futures:
                 # Get the average execution price based on the recent trades
-                order_status['avgPrice'] = self._get_execution_price(contract, order_id)
-            order_status = OrderStatus(order_status, self.platform)
+                order_status['avgPrice'] = await self._get_execution_price_async(contract, order_id,
+                                                                                 float(order_status['executedQty']))
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
-    def _get_execution_price(self, contract: Contract, order_id: int) -> float:
+    def cancel_order(self, contract: Contract, order_id: int) -> OrderStatus:
+        return self._run(self.cancel_order_async(contract, order_id))
+
+    async def _get_execution_price_async(self, contract: Contract, order_id: int, executed_qty: float) -> float:
 
         """
         For Binance Spot only, find the equivalent of the 'avgPrice' key on the futures side.
-        The average price is the weighted sum of each trade price related to the order_id
+        The average price is the weighted sum of each trade price related to the order_id, read from the fills cache
+        of the symbol. The missing fills are downloaded from the last known trade (fromId), or with an orderId
+        filter for the orders older than the cache.
         :param contract:
         :param order_id:
+        :param executed_qty: Executed quantity of the order, tells if the cache has all its fills
         :return:
         """
 
-        data = dict()
-        data['timestamp'] = int(time.time() * 1000)
-        data['symbol'] = contract.symbol
-        data['signature'] = self._generate_signature(data)
+        fills = self._fills.setdefault(contract.symbol, FillCache(ORDER_HISTORY))
 
-        trades = self.make_request("GET", "/api/v3/myTrades", data)
+        if not fills.has_fills(order_id, executed_qty) and fills.last_trade_id is not None:
+            await self._download_fills(contract, fills)
 
-        avg_price = 0
+        if not fills.has_fills(order_id, executed_qty):
+            data = dict()
+            data['timestamp'] = int(time.time() * 1000)
+            data['symbol'] = contract.symbol
+            data['orderId'] = order_id
+            data['signature'] = self._generate_signature(data)
 
-        if trades is not None:
+            trades = await self._make_request("GET", "/api/v3/myTrades", data)
 
-            executed_qty = 0
-            for t in trades:
-                if t['orderId'] == order_id:
-                    executed_qty += float(t['qty'])
+            if trades is not None:
+                fills.add_trades(trades)
 
-            for t in trades:
-                if t['orderId'] == order_id:
-                    fill_pct = float(t['qty']) / executed_qty
-                    avg_price += (float(t['price']) * fill_pct)  # Weighted sum
+        avg_price = fills.avg_price(order_id)
 
         return round(round(avg_price / contract.tick_size) * contract.tick_size, 8)
 
-    def get_order_status(self, contract: Contract, order_id: int) -> OrderStatus:
+    def _get_execution_price(self, contract: Contract, order_id: int, executed_qty: float) -> float:
+        return self._run(self._get_execution_price_async(contract, order_id, executed_qty))
+
+    async def _download_fills(self, contract: Contract, fills: FillCache):
+
+        """
+        Download the account trades of the symbol made since the last known one, page by page.
+        :param contract:
+        :param fills:
+        :return:
+        """
+
+        while True:
+            data = dict()
+            data['timestamp'] = int(time.time() * 1000)
+            data['symbol'] = contract.symbol
+            data['fromId'] = fills.last_trade_id + 1
+            data['limit'] = 1000
+            data['signature'] = self._generate_signature(data)
+
+            trades = await self._make_request("GET", "/api/v3/myTrades", data)
+
+            if trades is None:
+                return
+
+            fills.add_trades(trades)
+
+            if len(trades) < 1000:
+                return
+
+    async def get_order_status_async(self, contract: Contract, order_id: int) -> OrderStatus:
 
         data = dict()
         data['timestamp'] = int(time.time() * 1000)
@@ -359,22 +688,72 @@ class BinanceClient:
         data['signature'] = self._generate_signature(data)
 
         if self.futures:
-            order_status = self.make_request("GET", "/fapi/v1/order", data)
+            order_status = await self._make_request("GET", "/fapi/v1/order", data)
         else:
-            order_status = self.make_request("GET", "/api/v3/order", data)
+            order_status = await self._make_request("GET", "/api/v3/order", data)
 
         if order_status is not None:
             if not self.futures:
                 if order_status['status'] == "FILLED":
                     # Get the average execution price based on the recent trades
-                    order_status['avgPrice'] = self._get_execution_price(contract, order_id)
+                    order_status['avgPrice'] = await self._get_execution_price_async(
+                        contract, order_id, float(order_status['executedQty']))
                 else:
                     order_status['avgPrice'] = 0
 
-            order_status = OrderStatus(order_status, self.platform)
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
+    def get_order_status(self, contract: Contract, order_id: int) -> OrderStatus:
+        return self._run(self.get_order_status_async(contract, order_id))
+
+    def get_order_statuses(self, contract: Contract, order_ids: typing.List[int]) -> typing.Dict[int, OrderStatus]:
+        return self._run(self.get_order_statuses_async(contract, order_ids))
+
+    async def get_order_statuses_async(self, contract: Contract,
+                                       order_ids: typing.List[int]) -> typing.Dict[int, OrderStatus]:
+
+        """
+        Check several orders of the same symbol at once: one request for the open orders of the symbol, then
+        get_order_status() requests (sent concurrently) only for the orders that are no longer open, to get their
+        final status.
+        :param contract:
+        :param order_ids:
+        :return:
+        """
+
+        data = dict()
+        data['timestamp'] = int(time.time() * 1000)
+        data['symbol'] = contract.symbol
+        data['signature'] = self._generate_signature(data)
+
+        if self.futures:
+            open_orders = await self._make_request("GET", "/fapi/v1/openOrders", data)
+        else:
+            open_orders = await self._make_request("GET", "/api/v3/openOrders", data)
+
+        statuses = dict()
+
+        if open_orders is None:
+            return statuses
+
+        for order in open_orders:
+            if order['orderId'] in order_ids:
+                if 'avgPrice' not in order:  # Binance Spot
+                    order['avgPrice'] = 0
+                statuses[order['orderId']] = OrderStatus.from_binance(order)
+
+        closed_ids = [order_id for order_id in order_ids if order_id not in statuses]
+        closed_statuses = await asyncio.gather(*[self.get_order_status_async(contract, order_id)
+                                                 for order_id in closed_ids])
+
+        for order_id, order_status in zip(closed_ids, closed_statuses):
+            if order_status is not None:
+                statuses[order_id] = order_status
+
+        return statuses
+
     def _start_ws(self):
 
         """
@@ -409,7 +788,7 @@ class BinanceClient:
         if "BTCUSDT" not in self.ws_subscriptions["bookTicker"]:
             self.subscribe_channel([self.contracts["BTCUSDT"]], "bookTicker")
 
-    def _on_close(self, ws):
+    def _on_close(self, ws, *args):  # websocket-client also passes the close status code and message
 
         """
         Callback method triggered when the connection drops
@@ -437,7 +816,11 @@ class BinanceClient:
         :return:
         """
 
-        data = json.loads(msg)
+        # aggTrade of a symbol no strategy uses anymore (the channel stays subscribed): dropped before decoding
+        if msg.startswith('{"e":"aggTrade"') and peek(msg, "s") not in self.aggregators:
+            return
+
+        data = decoding.loads(msg)
 
         if "u" in data and "A" in data:
             data['e'] = "bookTicker"  # For Binance Spot, to make the data structure uniform with Binance Futures
@@ -456,26 +839,30 @@ class BinanceClient:
 
                 # PNL Calculation
 
-                try:
-                    for b_index, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            for trade in strat.trades:
-                                if trade.status == "open" and trade.entry_price is not None:
-                                    if trade.side == "long":
-                                        trade.pnl = (self.prices[symbol]['bid'] - trade.entry_price) * trade.quantity
-                                    elif trade.side == "short":
-                                        trade.pnl = (trade.entry_price - self.prices[symbol]['ask']) * trade.quantity
-                except RuntimeError as e:  # Handles the case  the dictionary is modified while loop through it
-                    logger.error("Error while looping through the Binance strategies: %s", e)
+                book = self.positions.get(symbol)
+                if book is not None:
+                    book.update(self.prices[symbol]['bid'], self.prices[symbol]['ask'])
 
             if data['e'] == "aggTrade":
 
                 symbol = data['s']
 
-                for key, strat in self.strategies.items():
-                    if strat.contract.symbol == symbol:
-                        res = strat.parse_trades(float(data['p']), float(data['q']), data['T'])  # Updates candlesticks
-                        strat.check_trade(res)
+                aggregator = self.aggregators.get(symbol)
+                if aggregator is None:
+                    return
+
+                price = float(data['p'])
+                size = float(data['q'])
+
+                if self.recorder is not None:  # 'm' is True when the buyer is the maker, i.e the seller is the taker
+                    self.recorder.record(self.platform, symbol, data['T'], price, size, -1 if data['m'] else 1)
+
+                results = aggregator.on_trade(price, size, data['T'])  # Updates candlesticks
+
+                for strat in self._routes.get(symbol, ()):
+                    if strat.tf in results:
+                        strat.on_tick(results[strat.tf], price)
+                        strat.check_trade(results[strat.tf])
 
     def subscribe_channel(self, contracts: typing.List[Contract], channel: str, reconnection=False):
 
@@ -519,6 +906,130 @@ class BinanceClient:
 
         self._ws_id += 1
 
+    def _start_user_stream(self):
+
+        """
+        Same reconnection loop as _start_ws() for the user data stream. Each connection uses a new listenKey, kept
+        alive by _keep_alive_listen_key() while the connection is open.
+        :return:
+        """
+
+        retry_delay = 2
+
+        while self.reconnect:
+            if self.futures:
+                response = self.make_request("POST", "/fapi/v1/listenKey", dict())
+            else:
+                response = self.make_request("POST", "/api/v3/userDataStream", dict())
+
+            if response is None:
+                logger.error("Binance: could not create a listenKey, new attempt in %s seconds", retry_delay)
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+                continue
+
+            retry_delay = 2
+            listen_key = response['listenKey']
+
+            self.user_ws = websocket.WebSocketApp(self._user_stream_url + "/" + listen_key,
+                                                  on_open=lambda ws: self._on_user_open(ws, listen_key),
+                                                  on_close=self._on_user_close, on_error=self._on_error,
+                                                  on_message=self._on_user_message)
+
+            try:
+                self.user_ws.run_forever()
+            except Exception as e:
+                logger.error("Binance error in the user data stream run_forever() method: %s", e)
+
+            time.sleep(2)
+
+    async def _keep_alive_listen_key(self, listen_key: str):
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE)
+
+            if self.futures:
+                response = await self._make_request("PUT", "/fapi/v1/listenKey", dict())
+            else:
+                response = await self._make_request("PUT", "/api/v3/userDataStream", {'listenKey': listen_key})
+
+            if response is None:  # The listenKey expired, reconnect with a new one
+                logger.warning("Binance listenKey keep-alive failed, reconnecting the user data stream")
+                self.user_ws.close()
+                return
+
+    def _on_user_open(self, ws, listen_key: str):
+        logger.info("Binance user data stream opened")
+
+        # The updates are only pushed from now on: start from a fresh snapshot of the balances
+        balances = self._run(self.get_balances_async())
+        if len(balances) > 0:
+            self.balances = balances
+
+        self.user_stream_connected = True
+        self._keep_alive_future = asyncio.run_coroutine_threadsafe(self._keep_alive_listen_key(listen_key),
+                                                                   self.loop)
+
+    def _on_user_close(self, ws, *args):  # websocket-client also passes the close status code and message
+        logger.warning("Binance user data stream closed")
+
+        self.user_stream_connected = False  # Back to the REST requests until it reconnects
+        self.order_tracker.poll_now()  # The updates sent while disconnected are missed
+
+        if self._keep_alive_future is not None:
+            self._keep_alive_future.cancel()
+
+    def _on_user_message(self, ws, msg: str):
+
+        """
+        Balance and order updates of the account.
+        Futures: ACCOUNT_UPDATE and ORDER_TRADE_UPDATE, Spot: outboundAccountPosition and executionReport.
+        :param msg:
+        :return:
+        """
+
+        data = decoding.loads(msg)
+        event = data.get('e')
+
+        if event == "ACCOUNT_UPDATE":
+            for b in data['a']['B']:
+                if b['a'] in self.balances:
+                    self.balances[b['a']].wallet_balance = float(b['wb'])
+                else:
+                    self.balances[b['a']] = Balance(wallet_balance=float(b['wb']))
+
+        elif event == "outboundAccountPosition":
+            for b in data['B']:
+                self.balances[b['a']] = Balance(free=float(b['f']), locked=float(b['l']))
+
+        elif event == "ORDER_TRADE_UPDATE":
+            self._on_order_update(OrderStatus.from_binance_stream(data['o']))
+
+        elif event == "executionReport":
+            if data['x'] == "TRADE":  # Execution type of the fills
+                self._fills.setdefault(data['s'], FillCache(ORDER_HISTORY)).add(data['i'], data['t'], float(data['L']),
+                                                                                float(data['l']))
+
+            order_status = OrderStatus.from_binance_stream(data)
+
+            contract = self.contracts.get(data['s'])
+            if contract is not None:
+                order_status.avg_price = round(round(order_status.avg_price / contract.tick_size) *
+                                               contract.tick_size, 8)
+
+            self._on_order_update(order_status)
+
+        elif event == "listenKeyExpired":
+            ws.close()
+
+    def _on_order_update(self, order_status: OrderStatus):
+        self.orders[order_status.order_id] = order_status
+        self.orders.move_to_end(order_status.order_id)
+
+        if len(self.orders) > ORDER_HISTORY:
+            self.orders.popitem(last=False)
+
+        self.order_tracker.update(order_status)
+
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
 
         """
@@ -12,30 +12,62 @@ import hashlib
 import websocket
 import json
 
-import dateutil.parser
+import datetime
 
 import threading
 
 from models import *
 
 from strategies import TechnicalStrategy, BreakoutStrategy
+from connectors.order_tracker import OrderTracker
+from connectors import decoding
+from connectors.decoding import iso_to_ms, mentions
+from connectors.execution import ExecutionQueue
+from connectors.rate_limiter import RateLimiter, request_priority, request_weight
+from positions import PositionBook
+from history import HistoryDownloader
+from candle_store import CandleBuffer
+from candle_cache import CandleCache
+from tick_archive import TickRecorder
+from aggregator import SymbolAggregator
 
 
 logger = logging.getLogger()
 
+ORDER_HISTORY = 1000  # Number of order states kept in memory
+
+# Fields of the margin table updates -> Balance attributes
+MARGIN_FIELDS = {"initMargin": "initial_margin", "maintMargin": "maintenance_margin",
+                 "marginBalance": "margin_balance", "walletBalance": "wallet_balance",
+                 "unrealisedPnl": "unrealized_pnl"}
+
+PRIVATE_TOPICS = ["margin", "execution", "order", "position"]
+
 
 class BitmexClient:
-    def __init__(self, public_key: str, secret_key: str, testnet: bool):
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, pool_size: int = 10, timeout: float = 10.0,
+                 keepalive_timeout: float = 60.0, warm_connections: int = 2, private_topics: bool = True,
+                 candle_cache_dir: typing.Optional[str] = None):
 
         """
         See comments in the Binance connector.
         :param public_key:
         :param secret_key:
         :param testnet:
+        :param pool_size:
+        :param timeout:
+        :param keepalive_timeout:
+        :param warm_connections:
+        :param private_topics: Authenticate the websocket and keep the balances, orders and positions up to date
+        :param candle_cache_dir:
         """
 
+        # The REST requests run in an event loop of their own thread: the interface, the websocket and the order
+        # threads submit coroutines to it with _run(), and the requests of different threads overlap
         self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._loop_thread.start()
+
         self.futures = True
         self.platform = "bitmex"  # Just to have more homogeneous connectors, even if self.platform is not used
 
@@ -49,6 +81,22 @@ class BitmexClient:
         self._public_key = public_key
         self._secret_key = secret_key
 
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._pool_size = pool_size
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self.rate_limiter = RateLimiter(self.platform)  # rate_limiter.headroom: share of the weight limit left
+        self._ping_endpoint = "/api/v1"
+
+        self._run(self._warm_up(warm_connections))
+
+        # Tables of the private topics (margin, execution, order, position), updated by the websocket.
+        # Set before the first request: get_balances() and the OrderTracker read them
+        self._private_topics = private_topics
+        self.user_stream_connected = False
+        self.orders: typing.OrderedDict[str, OrderStatus] = collections.OrderedDict()  # orderID -> last known state
+        self.exchange_positions: typing.Dict[str, typing.Dict] = dict()  # symbol -> position table row
+
         self.ws: websocket.WebSocketApp
         self.reconnect = True
 
@@ -57,9 +105,22 @@ class BitmexClient:
 
         self.prices = dict()
         self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self._routes: typing.Dict[str, typing.Tuple[typing.Union[TechnicalStrategy, BreakoutStrategy], ...]] = dict()
+        self._strategies_lock = threading.Lock()
 
         self.logs = []
 
+        self.order_tracker = OrderTracker(self)
+        self.execution = ExecutionQueue(self.platform)  # Order placement of the strategies, off the websocket thread
+
+        self.aggregators: typing.Dict[str, SymbolAggregator] = dict()
+        self.candle_cache = CandleCache(candle_cache_dir)
+
+        self.recorder: typing.Optional[TickRecorder] = None  # Set to archive the trades of the subscribed symbols
+
+        # Open positions of each symbol, their PnL is recomputed at once on every bid/ask update
+        self.positions: typing.Dict[str, PositionBook] = dict()
+
         t = threading.Thread(target=self._start_ws)
         t.start()
 
@@ -84,45 +145,106 @@ class BitmexClient:
             :return:
         """
 
-        async with aiohttp.ClientSession() as session:
-            if method == "GET":
-                try:
-                    async with session.get(self._base_url + endpoint, params=data,
-                                           headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:  # Takes into account any possible error, most likely network errors
-                    return None
-
-            elif method == "POST":
-                try:
-                    async with session.post(self._base_url + endpoint, params=data,
-                                            headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:
-                    return None
-
-            elif method == "DELETE":
-                try:
-                    async with session.delete(self._base_url + endpoint, params=data,
-                                              headers={'X-MBX-APIKEY': self._public_key}) as resp:
-                        response = resp
-                        resp_json = await resp.json()
-                except Exception as e:
-                    return None
-            else:
-                raise ValueError()
+        # Orders first, and only once the exchange weight limit allows it
+        await self.rate_limiter.acquire(request_weight(method, endpoint, data), request_priority(method, endpoint))
 
-            if response.status == 200:  # 200 is the response code of successful requests
-                return resp_json
-            else:
-                logger.error("Error while making %s request to %s: %s (error code %s)",
-                             method, endpoint, resp_json, resp.status)
+        session = await self._get_session()
+
+        if method == "GET":
+            try:
+                async with session.get(self._base_url + endpoint, params=data,
+                                       headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:  # Takes into account any possible error, most likely network errors
+                return None
+
+        elif method == "POST":
+            try:
+                async with session.post(self._base_url + endpoint, params=data,
+                                        headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:
+                return None
+
+        elif method == "DELETE":
+            try:
+                async with session.delete(self._base_url + endpoint, params=data,
+                                          headers={'X-MBX-APIKEY': self._public_key}) as resp:
+                    response = resp
+                    resp_json = await resp.json()
+            except Exception as e:
                 return None
+        else:
+            raise ValueError()
+
+        self.rate_limiter.update_from_headers(response.status, response.headers)
+
+        if response.status == 200:  # 200 is the response code of successful requests
+            return resp_json
+        else:
+            logger.error("Error while making %s request to %s: %s (error code %s)",
+                         method, endpoint, resp_json, resp.status)
+            return None
 
     def make_request(self, method: str, endpoint: str, data: typing.Dict):
-        return self.loop.run_until_complete(self._make_request(method, endpoint, data))
+        return self._run(self._make_request(method, endpoint, data))
+
+    def _run(self, coro: typing.Coroutine):
+
+        """
+        Run a coroutine in the event loop thread and wait for its result, can be called from any thread except the
+        event loop thread itself.
+        :param coro:
+        :return:
+        """
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+
+        """
+        The session is created once and reused by all the requests: its connections are kept alive, so the requests
+        don't pay for the DNS resolution and the TCP/TLS handshakes each time.
+        :return:
+        """
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=self._keepalive_timeout,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+        return self._session
+
+    async def _warm_up(self, connections: int):
+        session = await self._get_session()
+
+        async def ping():
+            try:
+                async with session.get(self._base_url + self._ping_endpoint) as resp:
+                    await resp.read()
+            except Exception as e:
+                logger.warning("%s connection warm-up failed: %s", self.platform, e)
+
+        await asyncio.gather(*[ping() for _ in range(connections)])
+
+    def close(self):
+
+        """
+        Close the pooled connections, stop the event loop thread and close the candle cache, called when the
+        interface is closed.
+        :return:
+        """
+
+        self.order_tracker.stop()
+
+        if self._session is not None and not self._session.closed:
+            self._run(self._session.close())
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+        self.candle_cache.close()  # Checkpoints the WAL, the -wal/-shm files are removed
 
     def get_contracts(self) -> typing.Dict[str, Contract]:
 
@@ -132,25 +254,47 @@ class BitmexClient:
 
         if instruments is not None:
             for s in instruments:
-                contracts[s['symbol']] = Contract(s, "bitmex")
+                contracts[s['symbol']] = Contract.from_bitmex(s)
 
         return collections.OrderedDict(sorted(contracts.items()))  # Sort keys of the dictionary alphabetically
 
-    def get_balances(self) -> typing.Dict[str, Balance]:
+    async def get_balances_async(self) -> typing.Dict[str, Balance]:
         data = dict()
         data['currency'] = "all"
 
-        margin_data = self.make_request("GET", "/api/v1/user/margin", data)
+        margin_data = await self._make_request("GET", "/api/v1/user/margin", data)
 
         balances = dict()
 
         if margin_data is not None:
             for a in margin_data:
-                balances[a['currency']] = Balance(a, "bitmex")
+                balances[a['currency']] = Balance.from_bitmex(a)
 
         return balances
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> typing.List[Candle]:
+    def get_balances(self) -> typing.Dict[str, Balance]:
+        if self.user_stream_connected:  # Kept up to date by the margin topic, no request needed
+            return self.balances
+
+        return self._run(self.get_balances_async())
+
+    def get_historical_candles(self, contract: Contract, timeframe: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.List[Candle]:
+
+        """
+        :param contract:
+        :param timeframe: 1m, 5m, 1h, 1d
+        :param start_time: Open time (Unix timestamp in milliseconds) of the first candle, e.g to backfill a gap
+        :param end_time: Open time of the last candle
+        :return:
+        """
+
+        if start_time is not None:  # A gap can be longer than a page, e.g once resampled to a larger timeframe
+            candles = []
+            self._run(self.download_history_async(contract, timeframe, start_time, end_time,
+                                                  on_candles=candles.extend))
+            return candles
+
         data = dict()
 
         data['symbol'] = contract.symbol
@@ -159,6 +303,12 @@ class BitmexClient:
         data['count'] = 500
         data['reverse'] = True
 
+        # The Bitmex timestamps are the candles close time
+        tf_ms = BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+
+        if end_time is not None:
+            data['endTime'] = datetime.datetime.utcfromtimestamp((end_time + tf_ms) / 1000).isoformat()
+
         raw_candles = self.make_request("GET", "/api/v1/trade/bucketed", data)
 
         candles = []
@@ -167,11 +317,127 @@ class BitmexClient:
             for c in reversed(raw_candles):
                 if c['open'] is None or c['close'] is None:  # Some candles returned by Bitmex miss data
                     continue
-                candles.append(Candle(c, timeframe, "bitmex"))
+                candles.append(Candle.from_bitmex(c, timeframe))
 
         return candles
 
-    def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None) -> OrderStatus:
+    def download_history(self, contract: Contract, timeframe: str, start_time: int, end_time=None,
+                         store: typing.Optional[CandleBuffer] = None) -> int:
+
+        """
+        Download a long history (e.g a year of 1m candles for a backtest or an indicator warm-up) with concurrent
+        paginated requests, instead of the single page of recent candles of get_historical_candles().
+        :param contract:
+        :param timeframe: 1m, 5m, 1h, 1d
+        :param start_time: Unix timestamp in milliseconds
+        :param end_time: Unix timestamp in milliseconds, now if None
+        :param store: The candles are appended to it as the pages arrive
+        :return: The number of candles downloaded
+        """
+
+        return self._run(self.download_history_async(contract, timeframe, start_time, end_time, store))
+
+    async def download_history_async(self, contract: Contract, timeframe: str, start_time: int, end_time=None,
+                                     store: typing.Optional[CandleBuffer] = None,
+                                     on_candles: typing.Optional[typing.Callable[[typing.List[Candle]], None]] = None
+                                     ) -> int:
+
+        """
+        Runs in the connector event loop: the pages go through the pooled session and the rate limiter (with the
+        market data priority), so a download never delays the orders nor exceeds the weight limit.
+        :param on_candles: Called with each page of candles, in order
+        """
+
+        downloader = HistoryDownloader(self.platform, self._base_url, session=await self._get_session(),
+                                       rate_limiter=self.rate_limiter)
+
+        return await downloader.download_async(contract.symbol, timeframe, start_time, end_time, store, on_candles)
+
+    def add_strategy(self, b_index: int, strategy: typing.Union[TechnicalStrategy, BreakoutStrategy]):
+
+        """
+        Start sending the market data to a strategy.
+        The dictionaries are replaced instead of modified so that the websocket thread can safely keep reading
+        the previous version while a strategy is added or removed from the interface.
+        :param b_index: The strategy row index in the strategy component
+        :param strategy:
+        :return:
+        """
+
+        with self._strategies_lock:
+            self.strategies = {**self.strategies, b_index: strategy}
+            self._rebuild_routes()
+
+    def remove_strategy(self, b_index: int):
+        with self._strategies_lock:
+            self.strategies = {key: strat for key, strat in self.strategies.items() if key != b_index}
+            self._rebuild_routes()
+
+    def _rebuild_routes(self):
+
+        """
+        Build the symbol -> strategies routing table used by _on_message(), so that each message is only
+        dispatched to the strategies running on its symbol.
+        :return:
+        """
+
+        routes = dict()
+        for strat in self.strategies.values():
+            routes.setdefault(strat.contract.symbol, []).append(strat)
+
+        self._routes = {symbol: tuple(strats) for symbol, strats in routes.items()}
+
+    def add_position(self, trade: Trade):
+
+        """
+        Called by the strategies once the entry price of a trade is known.
+        :param trade:
+        :return:
+        """
+
+        symbol = trade.contract.symbol
+
+        with self._strategies_lock:
+            if symbol not in self.positions:
+                self.positions = {**self.positions, symbol: PositionBook(trade.contract)}
+
+        self.positions[symbol].add(trade)
+
+    def remove_position(self, trade: Trade):
+
+        """
+        Called by the strategies when a trade is closed, its last PnL is kept in trade.pnl.
+        :param trade:
+        :return:
+        """
+
+        book = self.positions.get(trade.contract.symbol)
+        if book is not None:
+            book.remove(trade)
+
+    def get_trade_pnl(self, trade: Trade) -> float:
+        book = self.positions.get(trade.contract.symbol)
+        pnl = book.get_pnl(trade) if book is not None else None
+
+        return pnl if pnl is not None else trade.pnl
+
+    def get_aggregator(self, contract: Contract) -> SymbolAggregator:
+
+        """
+        Get (or create) the aggregator building the candles of a symbol for all the strategies and timeframes.
+        The 15m, 30m and 4h candles aren't available on Bitmex, they are built from the 5m and 1h candles.
+        :param contract:
+        :return:
+        """
+
+        if contract.symbol not in self.aggregators:
+            self.aggregators[contract.symbol] = SymbolAggregator(f"bitmex {contract.symbol}", contract,
+                                                                 self.get_historical_candles, list(BITMEX_TF_MINUTES),
+                                                                 cache=self.candle_cache)
+
+        return self.aggregators[contract.symbol]
+
+    async def place_order_async(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None) -> OrderStatus:
         data = dict()
 
         data['symbol'] = contract.symbol
@@ -185,36 +451,71 @@ class BitmexClient:
         if tif is not None:
             data['timeInForce'] = tif
 
-        order_status = self.make_request("POST", "/api/v1/order", data)
+        order_status = await self._make_request("POST", "/api/v1/order", data)
 
         if order_status is not None:
-            order_status = OrderStatus(order_status, "bitmex")
+            order_status = OrderStatus.from_bitmex(order_status)
 
         return order_status
 
-    def cancel_order(self, order_id: str) -> OrderStatus:
+    def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None) -> OrderStatus:
+        return self._run(self.place_order_async(contract, order_type, quantity, side, price, tif))
+
+    async def cancel_order_async(self, order_id: str) -> OrderStatus:
         data = dict()
         data['orderID'] = order_id
 
-        order_status = self.make_request("DELETE", "/api/v1/order", data)
+        order_status = await self._make_request("DELETE", "/api/v1/order", data)
 
         if order_status is not None:
-            order_status = OrderStatus(order_status[0], "bitmex")
+            order_status = OrderStatus.from_bitmex(order_status[0])
 
         return order_status
 
+    def cancel_order(self, order_id: str) -> OrderStatus:
+        return self._run(self.cancel_order_async(order_id))
+
+    async def get_order_status_async(self, contract: Contract, order_id: str) -> OrderStatus:
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['filter'] = json.dumps({"orderID": order_id})
+        data['count'] = 1
+
+        order_status = await self._make_request("GET", "/api/v1/order", data)
+
+        if order_status is not None and len(order_status) > 0:
+            return OrderStatus.from_bitmex(order_status[0])
+
     def get_order_status(self, contract: Contract, order_id: str) -> OrderStatus:
+        if self.user_stream_connected and order_id in self.orders:  # Kept up to date by the order topic
+            return self.orders[order_id]
+
+        return self._run(self.get_order_status_async(contract, order_id))
+
+    def get_order_statuses(self, contract: Contract, order_ids: typing.List[str]) -> typing.Dict[str, OrderStatus]:
+
+        """
+        Check several orders of the same symbol with one request, filtered on their orderID.
+        :param contract:
+        :param order_ids:
+        :return:
+        """
 
         data = dict()
         data['symbol'] = contract.symbol
-        data['reverse'] = True
+        data['filter'] = json.dumps({"orderID": order_ids})
+        data['count'] = len(order_ids)
 
-        order_status = self.make_request("GET", "/api/v1/order", data)
+        orders = self.make_request("GET", "/api/v1/order", data)
 
-        if order_status is not None:
-            for order in order_status:
-                if order['orderID'] == order_id:
-                    return OrderStatus(order, "bitmex")
+        statuses = dict()
+
+        if orders is not None:
+            for order in orders:
+                statuses[order['orderID']] = OrderStatus.from_bitmex(order)
+
+        return statuses
 
     def _start_ws(self):
         self.ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close,
@@ -236,17 +537,68 @@ class BitmexClient:
         self.subscribe_channel("instrument")
         self.subscribe_channel("trade")
 
-    def _on_close(self, ws):
+        if self._private_topics and self._public_key:
+            self._authenticate()
+
+    def _on_close(self, ws, *args):  # websocket-client also passes the close status code and message
         logger.warning("Bitmex Websocket connection closed")
 
+        self.user_stream_connected = False  # Back to the REST requests until it reconnects
+        self.order_tracker.poll_now()  # The updates sent while disconnected are missed
+
+    def _authenticate(self):
+
+        """
+        https://www.bitmex.com/app/wsAPI#API-Keys
+        The signature is the same as the REST API one, for a GET request to /realtime.
+        """
+
+        expires = str(int(time.time()) + 5)
+        signature = self._generate_signature("GET", "/realtime", expires, dict())
+
+        try:
+            self.ws.send(json.dumps({"op": "authKeyExpires", "args": [self._public_key, int(expires), signature]}))
+        except Exception as e:
+            logger.error("Websocket error while authenticating: %s", e)
+
     def _on_error(self, ws, msg: str):
         logger.error("Bitmex connection error: %s", msg)
 
     def _on_message(self, ws, msg: str):
 
-        data = json.loads(msg)
+        # Bitmex sends the trades of the whole market: the messages without a symbol of the aggregators are dropped
+        # before decoding
+        if msg.startswith('{"table":"trade"') and not mentions(msg, "symbol", tuple(self.aggregators)):
+            return
+
+        data = decoding.loads(msg)
+
+        if data.get("request", dict()).get("op") == "authKeyExpires":
+            if data.get("success"):
+                logger.info("Bitmex websocket authenticated")
+                for topic in PRIVATE_TOPICS:
+                    self.subscribe_channel(topic)
+                self.user_stream_connected = True
+            else:
+                logger.error("Bitmex websocket authentication failed: %s", data.get("error"))
+            return
 
         if "table" in data:
+            if data['table'] in ("order", "execution"):
+                self._on_order_rows(data['data'])
+
+            elif data['table'] == "margin":
+                self._on_margin_rows(data['action'], data['data'])
+
+            elif data['table'] == "position":
+                for d in data['data']:
+                    if data['action'] == "delete":
+                        self.exchange_positions.pop(d['symbol'], None)
+                    elif data['action'] == "update" and d['symbol'] in self.exchange_positions:
+                        self.exchange_positions[d['symbol']].update(d)
+                    else:
+                        self.exchange_positions[d['symbol']] = d
+
             if data['table'] == "instrument":
 
                 for d in data['data']:
@@ -263,30 +615,10 @@ class BitmexClient:
 
                     # PNL Calculation
 
-                    try:
-                        for b_index, strat in self.strategies.items():
-                            if strat.contract.symbol == symbol:
-                                for trade in strat.trades:
-                                    if trade.status == "open" and trade.entry_price is not None:
-
-                                        if trade.side == "long":
-                                            price = self.prices[symbol]['bid']
-                                        else:
-                                            price = self.prices[symbol]['ask']
-                                        multiplier = trade.contract.multiplier
-
-                                        if trade.contract.inverse:
-                                            if trade.side == "long":
-                                                trade.pnl = (1 / trade.entry_price - 1 / price) * multiplier * trade.quantity
-                                            elif trade.side == "short":
-                                                trade.pnl = (1 / price - 1 / trade.entry_price) * multiplier * trade.quantity
-                                        else:
-                                            if trade.side == "long":
-                                                trade.pnl = (price - trade.entry_price) * multiplier * trade.quantity
-                                            elif trade.side == "short":
-                                                trade.pnl = (trade.entry_price - price) * multiplier * trade.quantity
-                    except RuntimeError as e:
-                        logger.error("Error while looping through the Bitmex strategies: %s", e)
+                    book = self.positions.get(symbol)
+                    if book is not None and self.prices[symbol]['bid'] is not None \
+                            and self.prices[symbol]['ask'] is not None:
+                        book.update(self.prices[symbol]['bid'], self.prices[symbol]['ask'])
 
             if data['table'] == "trade":
 
@@ -294,12 +626,74 @@ class BitmexClient:
 
                     symbol = d['symbol']
 
-                    ts = int(dateutil.parser.isoparse(d['timestamp']).timestamp() * 1000)
+                    aggregator = self.aggregators.get(symbol)
+                    if aggregator is None:  # Bitmex sends the trades of the whole market
+                        continue
+
+                    ts = iso_to_ms(d['timestamp'])
+
+                    price = float(d['price'])
+                    size = float(d['size'])
+
+                    if self.recorder is not None:
+                        self.recorder.record(self.platform, symbol, ts, price, size, 1 if d['side'] == "Buy" else -1)
+
+                    results = aggregator.on_trade(price, size, ts)
+
+                    for strat in self._routes.get(symbol, ()):
+                        if strat.tf in results:
+                            strat.on_tick(results[strat.tf], price)
+                            strat.check_trade(results[strat.tf])
+
+    def _on_margin_rows(self, action: str, rows: typing.List[typing.Dict]):
+        for d in rows:
+            if action in ("partial", "insert"):
+                self.balances[d['currency']] = Balance.from_bitmex(d)
 
-                    for key, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            res = strat.parse_trades(float(d['price']), float(d['size']), ts)
-                            strat.check_trade(res)
+            elif action == "update" and d['currency'] in self.balances:  # Only the fields that changed
+                balance = self.balances[d['currency']]
+                for field, attribute in MARGIN_FIELDS.items():
+                    if d.get(field) is not None:
+                        setattr(balance, attribute, d[field] * BITMEX_MULTIPLIER)
+
+    def _on_order_rows(self, rows: typing.List[typing.Dict]):
+
+        """
+        The order and execution topics both carry the order status: the partial/insert rows are complete, the update
+        rows only have the orderID and the fields that changed.
+        :param rows:
+        :return:
+        """
+
+        for d in rows:
+            order_id = d.get('orderID')
+            if order_id is None:
+                continue
+
+            order_status = self.orders.get(order_id)
+
+            if order_status is None:
+                if d.get('ordStatus') is None:  # Update of an order placed before the connection
+                    continue
+                order_status = OrderStatus.from_bitmex({'orderID': order_id, 'ordStatus': d['ordStatus'],
+                                                        'avgPx': d.get('avgPx'), 'cumQty': d.get('cumQty', 0)})
+            else:
+                order_status = OrderStatus(order_id, order_status.status, order_status.avg_price,
+                                           order_status.executed_qty)
+                if d.get('ordStatus') is not None:
+                    order_status.status = d['ordStatus'].lower()
+                if d.get('avgPx') is not None:
+                    order_status.avg_price = d['avgPx']
+                if d.get('cumQty') is not None:
+                    order_status.executed_qty = d['cumQty']
+
+            self.orders[order_id] = order_status
+            self.orders.move_to_end(order_id)
+
+            if len(self.orders) > ORDER_HISTORY:
+                self.orders.popitem(last=False)
+
+            self.order_tracker.update(order_status)
 
     def subscribe_channel(self, topic: str):
         data = dict()
@@ -0,0 +1,77 @@
+import calendar
+import json
+import time
+import typing
+
+import dateutil.parser
+
+try:
+    import orjson  # Optional (pip install orjson), about 3x faster than the json module on the websocket messages
+except ImportError:
+    orjson = None
+
+
+# Decoding of the websocket messages, the hot path of the connectors: every trade and bid/ask update of every
+# subscribed symbol goes through it.
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+loads: typing.Callable[[typing.Union[str, bytes]], typing.Any] = orjson.loads if orjson is not None else json.loads
+
+_day_timestamps: typing.Dict[str, int] = dict()  # "YYYY-MM-DD" -> Unix timestamp of the day in milliseconds
+
+
+def iso_to_ms(timestamp: str) -> int:
+
+    """
+    Convert the Bitmex timestamps (e.g 2021-11-22T10:15:30.123Z) to Unix timestamps in milliseconds.
+    The date part is converted once and cached, the time part is read with slices. The other ISO 8601 formats go
+    through dateutil.
+    :param timestamp:
+    :return:
+    """
+
+    if len(timestamp) != 24 or timestamp[10] != "T" or timestamp[23] != "Z":
+        return int(dateutil.parser.isoparse(timestamp).timestamp() * 1000)
+
+    day = _day_timestamps.get(timestamp[:10])
+
+    if day is None:
+        if len(_day_timestamps) > 100:  # Only the last days are received by the websockets
+            _day_timestamps.clear()
+        day = calendar.timegm(time.strptime(timestamp[:10], "%Y-%m-%d")) * 1000
+        _day_timestamps[timestamp[:10]] = day
+
+    return day + int(timestamp[11:13]) * 3600000 + int(timestamp[14:16]) * 60000 + int(timestamp[17:19]) * 1000 + \
+        int(timestamp[20:23])
+
+
+def peek(msg: str, key: str) -> typing.Optional[str]:
+
+    """
+    Read a string field of a message without decoding it, to drop the messages nobody uses before json.loads().
+    Only for the compact messages where the key is unique, e.g the "s" (symbol) of the Binance aggTrade messages.
+    :param msg: Raw websocket message
+    :param key:
+    :return: None if the key isn't in the message
+    """
+
+    pattern = '"' + key + '":"'
+
+    start = msg.find(pattern)
+    if start == -1:
+        return None
+
+    start += len(pattern)
+
+    return msg[start:msg.find('"', start)]
+
+
+def mentions(msg: str, key: str, values: typing.Iterable[str]) -> bool:
+
+    """
+    :return: True if one of the values appears as a string field of the raw message, e.g one of the symbols of a
+    Bitmex trade message (which can contain the trades of several symbols)
+    """
+
+    return any('"' + key + '":"' + value + '"' in msg for value in values)
@@ -0,0 +1,100 @@
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+import typing
+
+
+logger = logging.getLogger()
+
+
+class ExecutionQueue:
+    def __init__(self, name: str, workers: int = 2, maxsize: int = 100, latency_samples: int = 1000):
+
+        """
+        Runs the order placement of the strategies (trade sizing, REST orders...) outside the websocket thread:
+        the websocket callbacks only submit the jobs and go back to reading the market data.
+        :param name: Used in the logs and the thread names
+        :param workers: Number of worker threads. 0 runs the jobs immediately in the calling thread (tick replay).
+        :param maxsize: Jobs waiting to be executed, the new jobs are rejected when the queue is full (except the
+        critical ones, see submit())
+        :param latency_samples: Number of enqueue-to-ack latencies kept for the statistics
+        """
+
+        self.name = name
+        self.workers = workers
+
+        # (0 for the critical jobs / 1, sequence number, enqueued at, job, args): the critical jobs go first, the
+        # others in submission order. Not bounded by the Queue itself, the critical jobs must always be accepted.
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._maxsize = maxsize
+        self._sequence = itertools.count()
+
+        self._latencies = collections.deque(maxlen=latency_samples)  # Seconds between submit() and the job end
+        self.max_depth = 0
+        self.rejected = 0
+
+        for i in range(workers):
+            t = threading.Thread(target=self._run, name=f"{name} execution {i}", daemon=True)
+            t.start()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, job: typing.Callable, *args, critical: bool = False) -> bool:
+
+        """
+        :param job: Function placing the orders, e.g Strategy._open_position
+        :param args:
+        :param critical: Exit orders: executed before the other waiting jobs and never rejected
+        :return: False if the queue is full and the job was dropped
+        """
+
+        if self.workers == 0:
+            self._execute(time.perf_counter(), job, args)
+            return True
+
+        if not critical and self._queue.qsize() >= self._maxsize:
+            self.rejected += 1
+            logger.error("%s execution queue is full, %s dropped", self.name, getattr(job, "__name__", job))
+            return False
+
+        self._queue.put_nowait((0 if critical else 1, next(self._sequence), time.perf_counter(), job, args))
+
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+        return True
+
+    def stats(self) -> typing.Dict[str, float]:
+
+        """
+        :return: Current/max queue depth and enqueue-to-ack latency (milliseconds) of the last jobs
+        """
+
+        latencies = sorted(self._latencies)
+
+        stats = {"depth": self.depth, "max_depth": self.max_depth, "rejected": self.rejected,
+                 "jobs": len(latencies)}
+
+        if len(latencies) > 0:
+            stats["latency_avg_ms"] = sum(latencies) / len(latencies) * 1000
+            stats["latency_p95_ms"] = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+            stats["latency_max_ms"] = latencies[-1] * 1000
+
+        return stats
+
+    def _execute(self, enqueued_at: float, job: typing.Callable, args: tuple):
+        try:
+            job(*args)
+        except Exception as e:
+            logger.error("%s error while executing %s: %s", self.name, getattr(job, "__name__", job), e)
+
+        self._latencies.append(time.perf_counter() - enqueued_at)
+
+    def _run(self):
+        while True:
+            priority, sequence, enqueued_at, job, args = self._queue.get()
+            self._execute(enqueued_at, job, args)
@@ -0,0 +1,75 @@
+import collections
+import threading
+import typing
+
+
+class FillCache:
+    def __init__(self, max_orders: int = 1000):
+
+        """
+        Binance Spot fills of one symbol, indexed by orderId, to compute the average execution price of an order
+        without downloading the account trades again.
+        Fed by the order responses, the user data stream (executionReport) and the /api/v3/myTrades pages: the
+        trades are indexed by their id, so a trade received twice is only counted once.
+        :param max_orders: Number of orders kept, the oldest ones are forgotten first
+        """
+
+        self._max_orders = max_orders
+
+        self._orders: typing.OrderedDict[int, typing.Dict[int, typing.Tuple[float, float]]] = \
+            collections.OrderedDict()  # orderId -> {trade id: (price, quantity)}
+        self._lock = threading.Lock()  # Fed by the event loop and the user data stream threads
+
+        self.last_trade_id: typing.Optional[int] = None  # fromId cursor of the next /api/v3/myTrades page
+
+    def add(self, order_id: int, trade_id: int, price: float, quantity: float):
+        with self._lock:
+            fills = self._orders.get(order_id)
+
+            if fills is None:
+                fills = self._orders[order_id] = dict()
+                if len(self._orders) > self._max_orders:
+                    self._orders.popitem(last=False)
+
+            fills[trade_id] = (price, quantity)
+
+    def add_trades(self, trades: typing.List[typing.Dict]):
+
+        """
+        :param trades: /api/v3/myTrades response, moves the fromId cursor forward
+        :return:
+        """
+
+        for t in trades:
+            self.add(t['orderId'], t['id'], float(t['price']), float(t['qty']))
+
+            if self.last_trade_id is None or t['id'] > self.last_trade_id:
+                self.last_trade_id = t['id']
+
+    def has_fills(self, order_id: int, executed_qty: float) -> bool:
+
+        """
+        :param executed_qty: Executed quantity of the order status
+        :return: True if all the fills of the order are in the cache
+        """
+
+        with self._lock:
+            fills = self._orders.get(order_id, dict())
+            quantity = sum(qty for price, qty in fills.values())
+
+        return quantity >= executed_qty * (1 - 1e-9)  # The quantities are decimal strings converted to float
+
+    def avg_price(self, order_id: int) -> float:
+
+        """
+        :return: Average price of the order fills weighted by their quantity, 0 if the order has no fill
+        """
+
+        with self._lock:
+            fills = list(self._orders.get(order_id, dict()).values())
+
+        executed_qty = sum(qty for price, qty in fills)
+        if executed_qty == 0:
+            return 0
+
+        return sum(price * qty for price, qty in fills) / executed_qty
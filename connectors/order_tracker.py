@@ -0,0 +1,144 @@
+import logging
+import threading
+import typing
+
+from models import Contract, OrderStatus
+
+
+logger = logging.getLogger()
+
+FINAL_STATUSES = {"filled", "canceled", "cancelled", "rejected", "expired"}
+
+
+class OrderTracker:
+    def __init__(self, client, min_interval: float = 0.5, max_interval: float = 8.0):
+
+        """
+        Follow the status of the orders placed by the strategies until they are filled (or canceled).
+        One thread per connector, whatever the number of orders: the orders are grouped by symbol and the
+        connector get_order_statuses() method checks them with as few requests as the exchange allows.
+        The polling interval starts at min_interval and doubles (up to max_interval) while nothing changes.
+        When the connector receives the order updates from a private websocket (user_stream_connected), the updates
+        are pushed with update() and the polling every max_interval is only a safety net.
+        :param client: BinanceClient or BitmexClient
+        :param min_interval: Seconds
+        :param max_interval: Seconds
+        """
+
+        self._client = client
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+
+        # order_id -> [contract, callback, last known status]
+        self._orders: typing.Dict[typing.Any, list] = dict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self._running = True
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    def track(self, contract: Contract, order_id, callback: typing.Callable[[OrderStatus], None]):
+
+        """
+        :param contract:
+        :param order_id:
+        :param callback: Called with the OrderStatus once the order reaches a final status (filled, canceled...)
+        :return:
+        """
+
+        with self._lock:
+            self._orders[order_id] = [contract, callback, None]
+
+        # The websocket update can arrive before the order is tracked, e.g a market order filled immediately
+        known_status = getattr(self._client, "orders", dict()).get(order_id)
+        if known_status is not None and known_status.status in FINAL_STATUSES:
+            self.update(known_status)
+            return
+
+        if not self._pushed():
+            self.poll_now()
+
+    def update(self, order_status: OrderStatus):
+
+        """
+        Push an order update received from another source (e.g a private websocket) instead of waiting for the
+        next poll.
+        :param order_status:
+        :return:
+        """
+
+        with self._lock:
+            order = self._orders.get(order_status.order_id)
+            if order is None:
+                return
+            if order_status.status in FINAL_STATUSES:
+                del self._orders[order_status.order_id]
+            else:
+                order[2] = order_status.status
+                return
+
+        order[1](order_status)
+
+    def poll_now(self):
+
+        """
+        Check the tracked orders without waiting, e.g when the private websocket disconnects.
+        """
+
+        self._interval = self._min_interval
+        self._wakeup.set()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _pushed(self) -> bool:
+        return getattr(self._client, "user_stream_connected", False)
+
+    def _run(self):
+        while self._running:
+            if self._pushed():
+                self._wakeup.wait(self._max_interval)
+            else:
+                self._wakeup.wait(self._interval if len(self._orders) > 0 else None)  # Sleeps until an order is tracked
+            self._wakeup.clear()
+
+            with self._lock:
+                by_symbol: typing.Dict[str, typing.Tuple[Contract, list]] = dict()
+                for order_id, (contract, callback, last_status) in self._orders.items():
+                    by_symbol.setdefault(contract.symbol, (contract, []))[1].append(order_id)
+
+            if len(by_symbol) == 0:
+                self._interval = self._min_interval
+                continue
+
+            changed = False
+
+            for symbol, (contract, order_ids) in by_symbol.items():
+                try:
+                    statuses = self._client.get_order_statuses(contract, order_ids)
+                except Exception as e:
+                    logger.error("Error while checking the %s order statuses: %s", symbol, e)
+                    continue
+
+                for order_id, order_status in statuses.items():
+                    with self._lock:
+                        order = self._orders.get(order_id)
+                        if order is None:
+                            continue
+                        if order_status.status != order[2]:
+                            changed = True
+                            order[2] = order_status.status
+                            logger.info("%s order status: %s", self._client.platform, order_status.status)
+
+                    if order_status.status in FINAL_STATUSES:
+                        self.update(order_status)
+
+            if changed:
+                self._interval = self._min_interval
+            else:
+                self._interval = min(self._interval * 2, self._max_interval)
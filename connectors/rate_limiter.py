@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import typing
+
+
+logger = logging.getLogger()
+
+
+# Request priorities, the lowest value goes first: the orders (and their cancels) are never delayed by the market
+# data or status requests, which also leave RESERVE_SHARE of the weight limit to them.
+PRIORITY_ORDER = 0
+PRIORITY_QUERY = 1
+PRIORITY_MARKET_DATA = 2
+
+RESERVE_SHARE = 0.1
+
+# platform -> REST weight limit per minute (Bitmex counts requests)
+WEIGHT_LIMITS = {
+    "binance_futures": 2400,
+    "binance_spot": 6000,
+    "bitmex": 120,
+}
+
+# (method, endpoint) -> weight of the request, 1 if not listed
+REQUEST_WEIGHTS = {
+    ("GET", "/fapi/v1/exchangeInfo"): 1,
+    ("GET", "/fapi/v1/ticker/bookTicker"): 2,
+    ("GET", "/fapi/v1/account"): 5,
+    ("GET", "/fapi/v1/openOrders"): 1,
+    ("GET", "/api/v3/exchangeInfo"): 20,
+    ("GET", "/api/v3/ticker/bookTicker"): 2,
+    ("GET", "/api/v3/account"): 20,
+    ("GET", "/api/v3/myTrades"): 20,
+    ("GET", "/api/v3/openOrders"): 6,
+    ("GET", "/api/v3/order"): 4,
+    ("GET", "/api/v3/klines"): 2,
+}
+
+MARKET_DATA_ENDPOINTS = {"/fapi/v1/exchangeInfo", "/fapi/v1/klines", "/fapi/v1/ticker/bookTicker",
+                         "/api/v3/exchangeInfo", "/api/v3/klines", "/api/v3/ticker/bookTicker",
+                         "/api/v1/instrument/active", "/api/v1/trade/bucketed"}
+
+
+def request_priority(method: str, endpoint: str) -> int:
+    if method in ("POST", "DELETE"):
+        return PRIORITY_ORDER
+    if endpoint in MARKET_DATA_ENDPOINTS:
+        return PRIORITY_MARKET_DATA
+    return PRIORITY_QUERY
+
+
+def request_weight(method: str, endpoint: str, data: typing.Dict) -> int:
+    if endpoint == "/fapi/v1/klines":  # The Futures klines weight depends on the number of candles
+        limit = int(data.get("limit", 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+
+    return REQUEST_WEIGHTS.get((method, endpoint), 1)
+
+
+class RateLimiter:
+    def __init__(self, platform: str):
+
+        """
+        Token bucket of the REST weight of an exchange, shared by all the requests of a connector. The requests wait
+        in a priority queue until their weight is available, and the bucket is corrected with the used weight the
+        exchange returns in the response headers.
+        Must be used from the connector event loop thread.
+        :param platform: binance_futures, binance_spot or bitmex
+        """
+
+        self.platform = platform
+
+        self._capacity = WEIGHT_LIMITS[platform]
+        self._rate = self._capacity / 60
+        self._tokens = float(self._capacity)
+        self._last = time.monotonic()
+
+        self._waiting = []  # Heap of (priority, sequence number, weight, future)
+        self._sequence = itertools.count()
+        self._wakeup: typing.Optional[asyncio.TimerHandle] = None
+
+        self.throttled = 0  # Requests that had to wait
+        self.rate_limited = 0  # 418/429 responses
+
+    @property
+    def headroom(self) -> float:
+
+        """
+        :return: Share of the weight limit currently available, between 0 and 1 (negative during a pause)
+        """
+
+        tokens = min(self._capacity, self._tokens + (time.monotonic() - self._last) * self._rate)
+        return tokens / self._capacity
+
+    def stats(self) -> typing.Dict[str, float]:
+        return {"headroom": self.headroom, "capacity": self._capacity, "waiting": len(self._waiting),
+                "throttled": self.throttled, "rate_limited": self.rate_limited}
+
+    async def acquire(self, weight: int, priority: int):
+
+        """
+        Wait until the request can be sent.
+        :param weight: See request_weight()
+        :param priority: PRIORITY_ORDER, PRIORITY_QUERY or PRIORITY_MARKET_DATA
+        :return:
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), weight, future))
+
+        self._dispatch()
+
+        if not future.done():
+            self.throttled += 1
+
+        await future
+
+    def update_from_headers(self, status: int, headers: typing.Mapping[str, str]):
+
+        """
+        Align the bucket on the weight the exchange counted, and stop all the requests when it rate limits.
+        :param status: HTTP status code of the response
+        :param headers: Response headers
+        :return:
+        """
+
+        self._refill()
+
+        if self.platform == "bitmex":
+            if "x-ratelimit-limit" in headers:
+                self._capacity = int(headers["x-ratelimit-limit"])
+                self._rate = self._capacity / 60
+            if "x-ratelimit-remaining" in headers:
+                self._tokens = min(self._tokens, float(headers["x-ratelimit-remaining"]))
+        elif "X-MBX-USED-WEIGHT-1M" in headers:
+            self._tokens = min(self._tokens, self._capacity - float(headers["X-MBX-USED-WEIGHT-1M"]))
+
+        if status in (418, 429):
+            self.rate_limited += 1
+            retry_after = float(headers.get("Retry-After", 60))
+            logger.warning("%s rate limit reached, requests paused for %s seconds", self.platform, retry_after)
+            self._tokens = -retry_after * self._rate
+
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def _dispatch(self):
+
+        """
+        Release the waiting requests in priority order, as long as the bucket has their weight. A request that
+        doesn't fit blocks the ones behind it, so the orders are never overtaken.
+        """
+
+        self._refill()
+
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        while len(self._waiting) > 0:
+            priority, _, weight, future = self._waiting[0]
+
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiting)
+                continue
+
+            required = weight if priority == PRIORITY_ORDER else weight + RESERVE_SHARE * self._capacity
+
+            if self._tokens < required:
+                delay = (required - self._tokens) / self._rate
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiting)
+            self._tokens -= weight
+            future.set_result(None)
@@ -0,0 +1,255 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import *
+
+import aiohttp
+
+from models import Candle, BITMEX_TF_MINUTES
+from candle_store import CandleBuffer
+from connectors.rate_limiter import RateLimiter, WEIGHT_LIMITS, PRIORITY_MARKET_DATA, request_weight
+
+
+logger = logging.getLogger()
+
+
+# Deep history download: the time range is cut into pages of the maximum number of candles per request, several
+# pages are requested concurrently (within the exchange weight limit) and the candles are passed on in
+# chronological order as soon as the previous pages arrived.
+
+BINANCE_TF = ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d"]
+
+# platform -> candles per request, the weight of the requests and the limits are the ones of connectors.rate_limiter
+HISTORY_PAGE_SIZES = {
+    "binance_futures": 1000,
+    "binance_spot": 1000,
+    "bitmex": 1000,
+}
+
+# Share of the weight limit used by a downloader without the connector rate limiter (e.g a script), the rest is left
+# to the running strategies
+WEIGHT_SHARE = 0.5
+
+
+def timeframe_ms(timeframe: str) -> int:
+    units = {"m": 60, "h": 3600, "d": 86400}
+    return int(timeframe[:-1]) * units[timeframe[-1]] * 1000
+
+
+class WeightBudget:
+    def __init__(self, weight_per_minute: float):
+
+        """
+        Token bucket spreading the requests weight evenly over the minute.
+        :param weight_per_minute:
+        """
+
+        self._rate = weight_per_minute / 60
+        self._capacity = max(weight_per_minute / 6, 1)  # Allows bursts of 10 seconds of weight
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, weight: float):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+
+                await asyncio.sleep((weight - self._tokens) / self._rate)
+
+    def pause(self, seconds: float):
+
+        """
+        Empty the bucket for a few seconds, when the exchange asks to slow down.
+        """
+
+        self._tokens = -seconds * self._rate
+
+
+class HistoryDownloader:
+    def __init__(self, platform: str, base_url: str, concurrency: int = 4, max_retries: int = 5,
+                 session: Optional[aiohttp.ClientSession] = None, rate_limiter: Optional[RateLimiter] = None):
+
+        """
+        :param platform: binance_futures, binance_spot or bitmex
+        :param base_url: The connector REST API url (testnet or not)
+        :param concurrency: Maximum number of requests at the same time
+        :param max_retries: Attempts per page before giving up
+        :param session: The connector pooled session, a session is opened for each download if None
+        :param rate_limiter: The connector rate limiter, the pages are then requested with the market data priority
+        and count in the same weight as the other requests. Without it, the downloader has its own budget of
+        WEIGHT_SHARE of the limit.
+        """
+
+        if platform not in HISTORY_PAGE_SIZES:
+            raise ValueError(f"History download isn't available for {platform}")
+
+        self.platform = platform
+        self._base_url = base_url
+        self._concurrency = concurrency
+        self._max_retries = max_retries
+
+        self._session = session
+        self._rate_limiter = rate_limiter
+
+        self._page_size = HISTORY_PAGE_SIZES[platform]
+        self._weight_per_minute = WEIGHT_LIMITS[platform] * WEIGHT_SHARE
+
+    def native_timeframes(self) -> List[str]:
+        return list(BITMEX_TF_MINUTES) if self.platform == "bitmex" else BINANCE_TF
+
+    def download(self, symbol: str, timeframe: str, start_time: int, end_time: Optional[int] = None,
+                 store: Optional[CandleBuffer] = None,
+                 on_candles: Optional[Callable[[List[Candle]], None]] = None) -> int:
+
+        """
+        Blocking version of download_async(), runs its own event loop: only without the connector session and rate
+        limiter, which belong to the connector event loop (see the connectors download_history()).
+        """
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            return loop.run_until_complete(self.download_async(symbol, timeframe, start_time, end_time, store,
+                                                               on_candles))
+        finally:
+            loop.close()
+
+    async def download_async(self, symbol: str, timeframe: str, start_time: int, end_time: Optional[int] = None,
+                             store: Optional[CandleBuffer] = None,
+                             on_candles: Optional[Callable[[List[Candle]], None]] = None) -> int:
+
+        """
+        Download the candles between two open times.
+        :param symbol:
+        :param timeframe: A native timeframe of the exchange, see native_timeframes()
+        :param start_time: Unix timestamp in milliseconds
+        :param end_time: Unix timestamp in milliseconds, now if None
+        :param store: The candles are appended to it (in chronological order, without duplicates) page by page
+        :param on_candles: Called with the candles of each page, in chronological order
+        :return: The number of candles downloaded
+        """
+
+        if timeframe not in self.native_timeframes():
+            raise ValueError(f"{timeframe} candles aren't available on {self.platform}, use aggregator.resample()")
+
+        tf_ms = timeframe_ms(timeframe)
+
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+
+        start_time -= start_time % tf_ms  # Open time of the first candle
+        page_span = self._page_size * tf_ms
+        pages = list(range(start_time, end_time + 1, page_span))
+
+        logger.info("%s %s %s: downloading %s pages of %s candles", self.platform, symbol, timeframe, len(pages),
+                    self._page_size)
+
+        budget = WeightBudget(self._weight_per_minute) if self._rate_limiter is None else None
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        last_timestamp = -1
+        count = 0
+
+        if self._session is not None:
+            session = self._session
+        else:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+
+        async def fetch(page_start: int) -> List[Candle]:
+            async with semaphore:
+                page_end = min(page_start + page_span - tf_ms, end_time)
+                return await self._fetch_page(session, budget, symbol, timeframe, page_start, page_end)
+
+        # Requested ahead of time, awaited in order: the pages are ordered while the requests overlap
+        tasks = [asyncio.ensure_future(fetch(page_start)) for page_start in pages]
+
+        try:
+            for task in tasks:
+                candles = await task
+
+                # Boundary candles returned by two pages are only kept once
+                candles = [c for c in candles if c.timestamp > last_timestamp]
+                if len(candles) == 0:
+                    continue
+
+                last_timestamp = candles[-1].timestamp
+                count += len(candles)
+
+                if store is not None:
+                    store.extend(candles)
+                if on_candles is not None:
+                    on_candles(candles)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            if self._session is None:
+                await session.close()
+
+        logger.info("%s %s %s: %s candles downloaded", self.platform, symbol, timeframe, count)
+
+        return count
+
+    async def _fetch_page(self, session: aiohttp.ClientSession, budget: Optional[WeightBudget], symbol: str,
+                          timeframe: str, start_time: int, end_time: int) -> List[Candle]:
+
+        if self.platform == "bitmex":
+            # The Bitmex timestamps are the candles close time
+            tf_ms = timeframe_ms(timeframe)
+            endpoint = "/api/v1/trade/bucketed"
+            params = {"symbol": symbol, "binSize": timeframe, "count": self._page_size, "reverse": "false",
+                      "startTime": datetime.datetime.utcfromtimestamp((start_time + tf_ms) / 1000).isoformat(),
+                      "endTime": datetime.datetime.utcfromtimestamp((end_time + tf_ms) / 1000).isoformat()}
+        else:
+            endpoint = "/fapi/v1/klines" if self.platform == "binance_futures" else "/api/v3/klines"
+            params = {"symbol": symbol, "interval": timeframe, "limit": self._page_size, "startTime": start_time,
+                      "endTime": end_time}
+
+        for attempt in range(self._max_retries):
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire(request_weight("GET", endpoint, params), PRIORITY_MARKET_DATA)
+            else:
+                await budget.acquire(request_weight("GET", endpoint, params))
+
+            try:
+                async with session.get(self._base_url + endpoint, params=params) as resp:
+                    if self._rate_limiter is not None:  # Also pauses all the requests when rate limited
+                        self._rate_limiter.update_from_headers(resp.status, resp.headers)
+
+                    if resp.status in (418, 429):  # Rate limited: wait as long as the exchange asks
+                        retry_after = float(resp.headers.get("Retry-After", 2 ** attempt))
+                        logger.warning("%s history download rate limited, waiting %s seconds", self.platform,
+                                       retry_after)
+                        if budget is not None:
+                            budget.pause(retry_after)
+                        continue
+
+                    raw_candles = await resp.json()
+
+                    if resp.status != 200:
+                        logger.error("Error while downloading the %s %s candles: %s (error code %s)", symbol,
+                                     timeframe, raw_candles, resp.status)
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+
+            except Exception as e:  # Network errors and timeouts
+                logger.error("Error while downloading the %s %s candles: %s", symbol, timeframe, e)
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            if self.platform == "bitmex":
+                return [Candle.from_bitmex(c, timeframe) for c in raw_candles
+                        if c['open'] is not None and c['close'] is not None]
+            else:
+                return [Candle.from_binance(c) for c in raw_candles]
+
+        raise ConnectionError(f"Could not download the {symbol} {timeframe} candles from {start_time}")
@@ -0,0 +1,9 @@
+# Technical indicators, each with two entry points:
+# - a batch function computing the indicator on whole NumPy arrays (indicators.batch)
+# - a Streaming* class updated with one candle at a time, in constant time and memory (indicators.streaming)
+# The IndicatorCache shares the streaming indicators between the strategies running on the same candles.
+
+from indicators.batch import ewm_mean, ema, sma, rsi, macd, bollinger, atr, vwap
+from indicators.streaming import StreamingEMA, StreamingSMA, StreamingRSI, StreamingMACD, StreamingBollinger, \
+    StreamingATR, StreamingVWAP
+from indicators.cache import IndicatorCache, INDICATORS
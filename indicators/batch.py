@@ -0,0 +1,162 @@
+import math
+from typing import *
+
+import numpy as np
+
+
+# Batch versions of the streaming indicators, computed on whole NumPy arrays (backtests, optimizations, warm-up).
+# Each function returns arrays of the same length as its input, with NaN where the indicator isn't defined yet,
+# and gives the same values as the matching Streaming* class fed one candle at a time.
+# The inputs must not contain NaN.
+
+
+def ewm_mean(values: np.ndarray, alpha: float, min_periods: int = 0) -> np.ndarray:
+
+    """
+    Equivalent to pandas Series.ewm(alpha=alpha, adjust=True).mean() without the Python loop:
+    the adjusted EWM at t is sum(x[i] * d ** (t - i)) / sum(d ** (t - i)) with d = 1 - alpha, i.e a cumulative sum
+    of x[i] * d ** -i rescaled by d ** t. d ** -i overflows after a few thousand values for short EMAs, so the
+    cumulative sums are done on chunks small enough for d ** -i to stay below e ** 300, the sums being carried
+    from one chunk to the next.
+    :param values:
+    :param alpha: Smoothing factor, 2 / (span + 1) for a span, 1 / (1 + com) for a center of mass
+    :param min_periods: Number of values required before the EMA is defined
+    :return:
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(len(values))
+
+    decay = 1 - alpha
+
+    if decay == 0:
+        result[:] = values
+    else:
+        chunk_size = min(max(1, int(300 / -math.log(decay))), max(len(values), 1))
+
+        # The same powers are used by every chunk: d ** 0 ... d ** chunk_size
+        powers = decay ** np.arange(chunk_size + 1, dtype=np.float64)
+        growth = 1 / powers[:-1]
+
+        # The denominator doesn't depend on the values: 1 + d + ... + d ** k = (1 - d ** (k + 1)) / alpha
+        denominator = (1 - powers[1:]) / alpha
+
+        numerator = 0.0
+
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            size = len(chunk)
+
+            chunk_numerator = np.cumsum(chunk * growth[:size])
+            chunk_numerator *= powers[:size]
+            chunk_numerator += numerator * powers[1:size + 1]
+
+            # The denominator of the k-th value of the chunk also has the decayed sum of all the previous values
+            offset = (1 - decay ** start) / alpha
+            result[start:start + size] = chunk_numerator / (denominator[:size] + offset * powers[1:size + 1])
+
+            numerator = chunk_numerator[-1]
+
+    result[:max(min_periods - 1, 0)] = np.nan
+
+    return result
+
+
+def ema(values: np.ndarray, span: int, min_periods: int = 0) -> np.ndarray:
+    return ewm_mean(values, 2 / (span + 1), min_periods)
+
+
+def sma(values: np.ndarray, length: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+
+    if len(values) >= length:
+        # Mean of each window rather than a difference of cumulative sums, which drifts on long histories
+        result[length - 1:] = np.lib.stride_tricks.sliding_window_view(values, length).mean(axis=1)
+
+    return result
+
+
+def rsi(closes: np.ndarray, length: int) -> np.ndarray:
+
+    """
+    Same calculation as StreamingRSI (and the previous pandas code of TechnicalStrategy._rsi()).
+    :param closes:
+    :param length: The RSI periods
+    :return: The RSI rounded to 2 decimals
+    """
+
+    closes = np.asarray(closes, dtype=np.float64)
+    result = np.full(len(closes), np.nan)
+
+    if len(closes) < 2:
+        return result
+
+    delta = np.diff(closes)
+
+    avg_gain = ewm_mean(np.where(delta > 0, delta, 0.0), 1 / length, length)
+    avg_loss = ewm_mean(np.where(delta < 0, -delta, 0.0), 1 / length, length)
+
+    with np.errstate(divide="ignore", invalid="ignore"):  # 0 / 0 gives NaN and x / 0 gives 100, like pandas
+        rs = avg_gain / avg_loss
+        result[1:] = np.round(100 - 100 / (1 + rs), 2)
+
+    return result
+
+
+def macd(closes: np.ndarray, ema_fast: int, ema_slow: int, ema_signal: int) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    :return: The MACD and the MACD Signal arrays
+    """
+
+    macd_line = ema(closes, ema_fast) - ema(closes, ema_slow)
+    macd_signal = ema(macd_line, ema_signal)
+
+    return macd_line, macd_signal
+
+
+def bollinger(closes: np.ndarray, length: int, num_std: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """
+    :return: The middle, upper and lower bands arrays
+    """
+
+    closes = np.asarray(closes, dtype=np.float64)
+
+    middle = np.full(len(closes), np.nan)
+    std = np.full(len(closes), np.nan)
+
+    if len(closes) >= length:
+        windows = np.lib.stride_tricks.sliding_window_view(closes, length)
+        middle[length - 1:] = windows.mean(axis=1)
+        if length > 1:
+            std[length - 1:] = windows.std(axis=1, ddof=1)
+
+    return middle, middle + num_std * std, middle - num_std * std
+
+
+def atr(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, length: int) -> np.ndarray:
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+
+    true_range = highs - lows
+    if len(closes) > 1:
+        prev_closes = closes[:-1]
+        true_range[1:] = np.maximum.reduce([true_range[1:], np.abs(highs[1:] - prev_closes),
+                                            np.abs(lows[1:] - prev_closes)])
+
+    return ewm_mean(true_range, 1 / length, length)
+
+
+def vwap(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+    typical_price = (np.asarray(highs, dtype=np.float64) + lows + closes) / 3
+    cumulative_volume = np.cumsum(volumes, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.cumsum(typical_price * volumes) / cumulative_volume
+
+    result[cumulative_volume == 0] = np.nan
+
+    return result
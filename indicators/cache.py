@@ -0,0 +1,71 @@
+import threading
+from typing import *
+
+import numpy as np
+
+from indicators.streaming import StreamingEMA, StreamingSMA, StreamingRSI, StreamingMACD, StreamingBollinger
+
+
+# Streaming indicators available in the IndicatorCache, by name. The parameters of the key are passed to the factory.
+INDICATORS: Dict[str, Callable[..., Any]] = {
+    "ema": StreamingEMA.from_span,
+    "rsi": StreamingRSI,
+    "macd": StreamingMACD,
+    "sma": StreamingSMA,
+    "bollinger": StreamingBollinger,
+}
+
+
+class IndicatorCache:
+    def __init__(self, candles):
+
+        """
+        Indicators of one symbol and timeframe shared by all the strategies reading the same candles: each
+        (name, parameters) key is computed once, e.g 20 strategies asking for ("ema", 12) feed a single EMA.
+        The values are those of the last closed candle, they are brought up to date lazily when a new candle
+        appeared since the previous get().
+        :param candles: The CandleBuffer of the symbol and timeframe
+        """
+
+        self._candles = candles
+
+        # (name, parameters) -> [streaming indicator, timestamp of the last candle fed, last value]
+        self._entries: Dict[tuple, list] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, *params):
+
+        """
+        :param name: One of the INDICATORS names (ema, sma, rsi, macd, bollinger)
+        :param params: The indicator parameters, e.g get("macd", 12, 26, 9)
+        :return: The indicator value of the last closed candle (a tuple for the MACD and the Bollinger Bands)
+        """
+
+        key = (name, *params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                indicator = INDICATORS[name](*params)
+                entry = [indicator, None, indicator.value]
+                self._entries[key] = entry
+
+            candles = self._candles
+
+            if len(candles) < 2 or candles.timestamp[-2] == entry[1]:  # No new closed candle
+                return entry[2]
+
+            # Find the first candle more recent than the last one processed, O(log n) since the timestamps are sorted
+            timestamps = candles.timestamp
+            start = 0 if entry[1] is None else int(np.searchsorted(timestamps, entry[1], side="right"))
+
+            closes = candles.close
+            indicator = entry[0]
+
+            for i in range(start, len(closes) - 1):  # The last candle is still open, it is never used
+                entry[2] = indicator.update(float(closes[i]))
+
+            entry[1] = int(timestamps[-2])
+
+            return entry[2]
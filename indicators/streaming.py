@@ -0,0 +1,242 @@
+import collections
+import math
+from typing import *
+
+
+# The streaming indicators below reproduce the pandas calculations previously done in strategies.py
+# (Series.ewm(adjust=True).mean()), one value at a time and in constant time/memory.
+# The adjusted EWM is a ratio of two exponentially decayed sums, so it can be carried forward exactly:
+#   numerator = x + (1 - alpha) * numerator,  denominator = 1 + (1 - alpha) * denominator
+# Compared to pandas, the results only differ by floating point rounding: the MACD and Signal values match to
+# within 1e-9 (relative), the RSI (rounded to 2 decimals like before) matches to within 0.01.
+
+
+class StreamingEMA:
+    def __init__(self, alpha: float, min_periods: int = 0):
+
+        """
+        Exponential Moving Average equivalent to pandas Series.ewm(alpha=alpha, adjust=True).mean()
+        :param alpha: Smoothing factor, 2 / (span + 1) for a span, 1 / (1 + com) for a center of mass
+        :param min_periods: Number of values required before the EMA is defined (NaN is returned before)
+        """
+
+        self._decay = 1 - alpha
+        self._min_periods = min_periods
+
+        self._numerator = 0.0
+        self._denominator = 0.0
+        self.count = 0
+        self.value = math.nan
+
+    @classmethod
+    def from_span(cls, span: int, min_periods: int = 0) -> "StreamingEMA":
+        return cls(2 / (span + 1), min_periods)
+
+    @classmethod
+    def from_com(cls, com: float, min_periods: int = 0) -> "StreamingEMA":
+        return cls(1 / (1 + com), min_periods)
+
+    def update(self, x: float) -> float:
+        self._numerator = x + self._decay * self._numerator
+        self._denominator = 1 + self._decay * self._denominator
+        self.count += 1
+
+        if self.count >= self._min_periods:
+            self.value = self._numerator / self._denominator
+
+        return self.value
+
+
+class StreamingRSI:
+    def __init__(self, length: int):
+
+        """
+        Relative Strength Index using the same ewm(com=length - 1, min_periods=length) smoothing as before.
+        :param length: The RSI periods
+        """
+
+        self._avg_gain = StreamingEMA.from_com(length - 1, min_periods=length)
+        self._avg_loss = StreamingEMA.from_com(length - 1, min_periods=length)
+
+        self._prev_close: Optional[float] = None
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+
+        """
+        :param close: The close price of the candle that just closed
+        :return: The RSI rounded to 2 decimals, NaN until there are enough candles
+        """
+
+        if self._prev_close is None:  # The first close has no delta, like closes.diff().dropna()
+            self._prev_close = close
+            return self.value
+
+        delta = close - self._prev_close
+        self._prev_close = close
+
+        avg_gain = self._avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-delta if delta < 0 else 0.0)
+
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            return self.value
+
+        if avg_loss == 0:
+            self.value = math.nan if avg_gain == 0 else 100.0  # Same as pandas with 0 / 0 and x / 0
+        else:
+            rs = avg_gain / avg_loss  # Relative Strength
+            self.value = round(100 - 100 / (1 + rs), 2)
+
+        return self.value
+
+
+class StreamingMACD:
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+        self._ema_fast = StreamingEMA.from_span(ema_fast)
+        self._ema_slow = StreamingEMA.from_span(ema_slow)
+        self._ema_signal = StreamingEMA.from_span(ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> Tuple[float, float]:
+
+        """
+        :param close: The close price of the candle that just closed
+        :return: The MACD and the MACD Signal values
+        """
+
+        self.macd_line = self._ema_fast.update(close) - self._ema_slow.update(close)
+        self.macd_signal = self._ema_signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+    @property
+    def value(self) -> Tuple[float, float]:
+        return self.macd_line, self.macd_signal
+
+
+class StreamingSMA:
+    def __init__(self, length: int):
+
+        """
+        Simple Moving Average, equivalent to pandas Series.rolling(length).mean()
+        :param length: Number of values averaged, NaN is returned before
+        """
+
+        self._window = collections.deque(maxlen=length)
+        self._length = length
+        self._sum = 0.0
+        self.value = math.nan
+
+    def update(self, x: float) -> float:
+        if len(self._window) == self._length:
+            self._sum -= self._window[0]
+
+        self._window.append(x)
+        self._sum += x
+
+        if len(self._window) == self._length:
+            self.value = self._sum / self._length
+
+        return self.value
+
+
+class StreamingBollinger:
+    def __init__(self, length: int, num_std: float = 2.0):
+
+        """
+        Bollinger Bands: SMA +/- num_std standard deviations (sample standard deviation, like pandas rolling().std())
+        :param length: Number of candles of the moving average
+        :param num_std: Width of the bands
+        """
+
+        self._window = collections.deque(maxlen=length)
+        self._length = length
+        self._num_std = num_std
+
+        self.middle = math.nan
+        self.upper = math.nan
+        self.lower = math.nan
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+
+        """
+        :param close: The close price of the candle that just closed
+        :return: The middle, upper and lower bands
+        """
+
+        self._window.append(close)
+
+        if len(self._window) == self._length:
+            # Computed on the window (a few dozen values) rather than from running sums of squares, which lose
+            # precision with large prices
+            mean = sum(self._window) / self._length
+            std = math.sqrt(sum((x - mean) ** 2 for x in self._window) / (self._length - 1)) \
+                if self._length > 1 else math.nan
+
+            self.middle = mean
+            self.upper = mean + self._num_std * std
+            self.lower = mean - self._num_std * std
+
+        return self.value
+
+    @property
+    def value(self) -> Tuple[float, float, float]:
+        return self.middle, self.upper, self.lower
+
+
+class StreamingATR:
+    def __init__(self, length: int):
+
+        """
+        Average True Range, smoothed like the RSI: ewm(com=length - 1, min_periods=length) of the True Range.
+        :param length: The ATR periods
+        """
+
+        self._avg_tr = StreamingEMA.from_com(length - 1, min_periods=length)
+        self._prev_close: Optional[float] = None
+        self.value = math.nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+
+        """
+        :return: The ATR, NaN until there are enough candles
+        """
+
+        if self._prev_close is None:  # No previous close for the first candle, its True Range is the high - low
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+
+        self._prev_close = close
+        self.value = self._avg_tr.update(true_range)
+
+        return self.value
+
+
+class StreamingVWAP:
+    def __init__(self):
+
+        """
+        Volume Weighted Average Price of the typical price (high + low + close) / 3, since the start or the last
+        reset() (e.g at the start of each session).
+        """
+
+        self._price_volume = 0.0
+        self._volume = 0.0
+        self.value = math.nan
+
+    def reset(self):
+        self._price_volume = 0.0
+        self._volume = 0.0
+        self.value = math.nan
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        self._price_volume += (high + low + close) / 3 * volume
+        self._volume += volume
+
+        if self._volume > 0:
+            self.value = self._price_volume / self._volume
+
+        return self.value
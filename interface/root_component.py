@@ -77,6 +77,14 @@ class Root(tk.Tk):
             self.binance.ws.close()
             self.bitmex.ws.close()
 
+            self.binance.close()  # Closes the pooled HTTP connections
+            self.bitmex.close()
+
+            if self.binance.recorder is not None:  # Writes the trades still in memory
+                self.binance.recorder.close()
+            if self.bitmex.recorder is not None and self.bitmex.recorder is not self.binance.recorder:
+                self.bitmex.recorder.close()
+
             self.destroy()  # Destroys the UI and terminates the program as no other thread is running
 
     def _update_ui(self):
@@ -123,7 +131,8 @@ class Root(tk.Tk):
                         else:
                             precision = 8  # The Bitmex PNL is always is BTC, thus 8 decimals
 
-                        pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=precision)
+                        # Open trades: last PnL computed by the connector position book
+                        pnl_str = "{0:.{prec}f}".format(client.get_trade_pnl(trade), prec=precision)
                         self._trades_frame.body_widgets['pnl_var'][trade.time].set(pnl_str)
                         self._trades_frame.body_widgets['status_var'][trade.time].set(trade.status.capitalize())
                         self._trades_frame.body_widgets['quantity_var'][trade.time].set(trade.quantity)
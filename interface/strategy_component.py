@@ -9,7 +9,7 @@ from interface.scrollable_frame import ScrollableFrame
 from connectors.binance_futures import BinanceClient
 from connectors.bitmex_futures import BitmexClient
 
-from strategies import TechnicalStrategy, BreakoutStrategy
+from strategies import STRATEGIES
 from utils import *
 
 from database import WorkspaceData
@@ -62,7 +62,7 @@ class StrategyEditor(tk.Frame):
         # The width may need to be adjusted depending on your screen size and resolution
         self._base_params = [
             {"code_name": "strategy_type", "widget": tk.OptionMenu, "data_type": str,
-             "values": ["Technical", "Breakout"], "width": 10, "header": "Strategy"},
+             "values": list(STRATEGIES), "width": 10, "header": "Strategy"},
             {"code_name": "contract", "widget": tk.OptionMenu, "data_type": str, "values": self._all_contracts,
              "width": 16, "header": "Contract"},
             {"code_name": "timeframe", "widget": tk.OptionMenu, "data_type": str, "values": self._all_timeframes,
@@ -79,16 +79,10 @@ class StrategyEditor(tk.Frame):
 
         ]
 
+        # Extra parameters of each registered strategy, entered in the popup window
         self.extra_params = {
-            "Technical": [
-                {"code_name": "rsi_length", "name": "RSI Periods", "widget": tk.Entry, "data_type": int},
-                {"code_name": "ema_fast", "name": "MACD Fast Length", "widget": tk.Entry, "data_type": int},
-                {"code_name": "ema_slow", "name": "MACD Slow Length", "widget": tk.Entry, "data_type": int},
-                {"code_name": "ema_signal", "name": "MACD Signal Length", "widget": tk.Entry, "data_type": int},
-            ],
-            "Breakout": [
-                {"code_name": "min_volume", "name": "Minimum Volume", "widget": tk.Entry, "data_type": float},
-            ]
+            name: [{**param, "widget": tk.Entry} for param in strategy_class.PARAMETERS]
+            for name, strategy_class in STRATEGIES.items()
         }
 
         for idx, h in enumerate(self._base_params):
@@ -287,29 +281,33 @@ class StrategyEditor(tk.Frame):
 
         if self.body_widgets['activation'][b_index].cget("text") == "OFF":
 
-            if strat_selected == "Technical":
-                new_strategy = TechnicalStrategy(self._exchanges[exchange], contract, exchange, timeframe, balance_pct,
-                                                 take_profit, stop_loss, self.additional_parameters[b_index])
-            elif strat_selected == "Breakout":
-                new_strategy = BreakoutStrategy(self._exchanges[exchange], contract, exchange, timeframe, balance_pct,
-                                                take_profit, stop_loss, self.additional_parameters[b_index])
-            else:
+            if strat_selected not in STRATEGIES:
                 return
 
-            # Collects historical data. It is just one API call so that is ok, but be careful not to call methods
-            # that would lock the UI for too long.
+            new_strategy = STRATEGIES[strat_selected](self._exchanges[exchange], contract, exchange, timeframe,
+                                                      balance_pct, take_profit, stop_loss,
+                                                      self.additional_parameters[b_index])
+
+            # Collects historical data (only if no other strategy runs on the same symbol and timeframe).
+            # The candles come from the local candle cache when it is recent enough (the candles since then are
+            # downloaded in the background once the first trade arrives), otherwise it is just one API call.
+            # Be careful not to call methods that would lock the UI for too long.
             # For example don't make a query to a database containing billions of rows, your interface would freeze.
-            new_strategy.candles = self._exchanges[exchange].get_historical_candles(contract, timeframe)
+            aggregator = self._exchanges[exchange].get_aggregator(contract)
+            candles = aggregator.subscribe(timeframe)
 
-            if len(new_strategy.candles) == 0:
+            if len(candles) == 0:
                 self.root.logging_frame.add_log(f"No historical data retrieved for {contract.symbol}")
                 return
 
+            new_strategy.use_shared_candles(candles, aggregator.indicators(timeframe))
+            new_strategy.seed_indicators()
+
             if exchange == "Binance":
                 self._exchanges[exchange].subscribe_channel([contract], "aggTrade")
                 self._exchanges[exchange].subscribe_channel([contract], "bookTicker")
 
-            self._exchanges[exchange].strategies[b_index] = new_strategy
+            self._exchanges[exchange].add_strategy(b_index, new_strategy)
 
             for param in self._base_params:
                 code_name = param['code_name']
@@ -321,7 +319,8 @@ class StrategyEditor(tk.Frame):
             self.root.logging_frame.add_log(f"{strat_selected} strategy on {symbol} / {timeframe} started")
 
         else:
-            del self._exchanges[exchange].strategies[b_index]
+            self._exchanges[exchange].remove_strategy(b_index)
+            self._exchanges[exchange].get_aggregator(contract).unsubscribe(timeframe)
 
             for param in self._base_params:
                 code_name = param['code_name']
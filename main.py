@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from connectors.binance_futures import BinanceClient
 from connectors.bitmex_futures import BitmexClient
 from interface.root_component import Root
+from tick_archive import TickRecorder
 
 load_dotenv()
 
@@ -13,6 +14,8 @@ binance_secret_key = os.getenv('BINANCE_SK')
 bitmex_public_key = os.getenv('BITMEX_PK')
 bitmex_secret_key = os.getenv('BITMEX_SK')
 bitmex_test_key = os.getenv('BITMEX_TK')
+tick_archive_dir = os.getenv('TICK_ARCHIVE_DIR')  # Records the trades of the subscribed symbols if set
+candle_cache_dir = os.getenv('CANDLE_CACHE_DIR')  # Local candle cache directory, the project directory if not set
 
 logger = logging.getLogger()
 
@@ -31,8 +34,13 @@ logger.addHandler(stream_handler)
 logger.addHandler(file_handler)
 
 if __name__ == '__main__':
-    binance = BinanceClient(binance_public_key, binance_secret_key, True, True)
-    bitmex = BitmexClient(bitmex_public_key, bitmex_secret_key, True)
+    binance = BinanceClient(binance_public_key, binance_secret_key, True, True, candle_cache_dir=candle_cache_dir)
+    bitmex = BitmexClient(bitmex_public_key, bitmex_secret_key, True, candle_cache_dir=candle_cache_dir)
+
+    if tick_archive_dir:
+        recorder = TickRecorder(tick_archive_dir)
+        binance.recorder = recorder
+        bitmex.recorder = recorder
 
     root = Root(binance, bitmex)
     root.mainloop()
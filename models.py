@@ -6,54 +6,68 @@ BITMEX_MULTIPLIER = 0.00000001  # Converts satoshi numbers to Bitcoin on Bitmex
 BITMEX_TF_MINUTES = {"1m": 1, "5m": 5, "1h": 60, "1d": 1440}
 
 
+# The models use __slots__ instead of a per-instance __dict__: thousands of candles and contracts are kept in memory.
+# Each exchange has its own alternate constructor (from_binance..., from_bitmex) that converts the raw API data.
+
+
 class Balance:
-    def __init__(self, info, exchange):
-        if exchange == "binance_futures":
-            self.initial_margin = float(info['initialMargin'])
-            self.maintenance_margin = float(info['maintMargin'])
-            self.margin_balance = float(info['marginBalance'])
-            self.wallet_balance = float(info['walletBalance'])
-            self.unrealized_pnl = float(info['unrealizedProfit'])
-
-        elif exchange == "binance_spot":
-            self.free = float(info['free'])
-            self.locked = float(info['locked'])
-
-        elif exchange == "bitmex":
-            self.initial_margin = info['initMargin'] * BITMEX_MULTIPLIER
-            self.maintenance_margin = info['maintMargin'] * BITMEX_MULTIPLIER
-            self.margin_balance = info['marginBalance'] * BITMEX_MULTIPLIER
-            self.wallet_balance = info['walletBalance'] * BITMEX_MULTIPLIER
-            self.unrealized_pnl = info['unrealisedPnl'] * BITMEX_MULTIPLIER
+    __slots__ = ("initial_margin", "maintenance_margin", "margin_balance", "wallet_balance", "unrealized_pnl",
+                 "free", "locked")
+
+    def __init__(self, initial_margin=None, maintenance_margin=None, margin_balance=None, wallet_balance=None,
+                 unrealized_pnl=None, free=None, locked=None):
+        self.initial_margin = initial_margin
+        self.maintenance_margin = maintenance_margin
+        self.margin_balance = margin_balance
+        self.wallet_balance = wallet_balance
+        self.unrealized_pnl = unrealized_pnl
+
+        self.free = free  # Binance Spot only
+        self.locked = locked
+
+    @classmethod
+    def from_binance_futures(cls, info) -> "Balance":
+        return cls(initial_margin=float(info['initialMargin']), maintenance_margin=float(info['maintMargin']),
+                   margin_balance=float(info['marginBalance']), wallet_balance=float(info['walletBalance']),
+                   unrealized_pnl=float(info['unrealizedProfit']))
+
+    @classmethod
+    def from_binance_spot(cls, info) -> "Balance":
+        return cls(free=float(info['free']), locked=float(info['locked']))
+
+    @classmethod
+    def from_bitmex(cls, info) -> "Balance":
+        return cls(initial_margin=info['initMargin'] * BITMEX_MULTIPLIER,
+                   maintenance_margin=info['maintMargin'] * BITMEX_MULTIPLIER,
+                   margin_balance=info['marginBalance'] * BITMEX_MULTIPLIER,
+                   wallet_balance=info['walletBalance'] * BITMEX_MULTIPLIER,
+                   unrealized_pnl=info['unrealisedPnl'] * BITMEX_MULTIPLIER)
 
 
 class Candle:
-    def __init__(self, candle_info, timeframe, exchange):
-        if exchange in ["binance_futures", "binance_spot"]:
-            self.timestamp = candle_info[0]
-            self.open = float(candle_info[1])
-            self.high = float(candle_info[2])
-            self.low = float(candle_info[3])
-            self.close = float(candle_info[4])
-            self.volume = float(candle_info[5])
-
-        elif exchange == "bitmex":
-            self.timestamp = dateutil.parser.isoparse(candle_info['timestamp'])
-            self.timestamp = self.timestamp - datetime.timedelta(minutes=BITMEX_TF_MINUTES[timeframe])
-            self.timestamp = int(self.timestamp.timestamp() * 1000)
-            self.open = candle_info['open']
-            self.high = candle_info['high']
-            self.low = candle_info['low']
-            self.close = candle_info['close']
-            self.volume = candle_info['volume']
-
-        elif exchange == "parse_trade":
-            self.timestamp = candle_info['ts']
-            self.open = candle_info['open']
-            self.high = candle_info['high']
-            self.low = candle_info['low']
-            self.close = candle_info['close']
-            self.volume = candle_info['volume']
+    __slots__ = ("timestamp", "open", "high", "low", "close", "volume")
+
+    def __init__(self, timestamp: int, open_: float, high: float, low: float, close: float, volume: float):
+        self.timestamp = timestamp
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_binance(cls, candle_info) -> "Candle":
+        return cls(candle_info[0], float(candle_info[1]), float(candle_info[2]), float(candle_info[3]),
+                   float(candle_info[4]), float(candle_info[5]))
+
+    @classmethod
+    def from_bitmex(cls, candle_info, timeframe: str) -> "Candle":
+        # Bitmex timestamps are the candle close time, convert it to the open time like on Binance
+        timestamp = dateutil.parser.isoparse(candle_info['timestamp'])
+        timestamp = timestamp - datetime.timedelta(minutes=BITMEX_TF_MINUTES[timeframe])
+
+        return cls(int(timestamp.timestamp() * 1000), candle_info['open'], candle_info['high'], candle_info['low'],
+                   candle_info['close'], candle_info['volume'])
 
 
 def tick_to_decimals(tick_size: float) -> int:
@@ -70,84 +84,115 @@ def tick_to_decimals(tick_size: float) -> int:
 
 
 class Contract:
-    def __init__(self, contract_info, exchange):
-        if exchange == "binance_futures":
-            self.symbol = contract_info['symbol']
-            self.base_asset = contract_info['baseAsset']
-            self.quote_asset = contract_info['quoteAsset']
-            self.price_decimals = contract_info['pricePrecision']
-            self.quantity_decimals = contract_info['quantityPrecision']
-            self.tick_size = 1 / pow(10, contract_info['pricePrecision'])
-            self.lot_size = 1 / pow(10, contract_info['quantityPrecision'])
-
-        elif exchange == "binance_spot":
-            self.symbol = contract_info['symbol']
-            self.base_asset = contract_info['baseAsset']
-            self.quote_asset = contract_info['quoteAsset']
-
-            # The actual lot size and tick size on Binance spot can be found in the 'filters' fields
-            # contract_info['filters'] is a list
-            for b_filter in contract_info['filters']:
-                if b_filter['filterType'] == 'PRICE_FILTER':
-                    self.tick_size = float(b_filter['tickSize'])
-                    self.price_decimals = tick_to_decimals(float(b_filter['tickSize']))
-                if b_filter['filterType'] == 'LOT_SIZE':
-                    self.lot_size = float(b_filter['stepSize'])
-                    self.quantity_decimals = tick_to_decimals(float(b_filter['stepSize']))
-
-        elif exchange == "bitmex":
-            self.symbol = contract_info['symbol']
-            self.base_asset = contract_info['rootSymbol']
-            self.quote_asset = contract_info['quoteCurrency']
-            self.price_decimals = tick_to_decimals(contract_info['tickSize'])
-            self.quantity_decimals = tick_to_decimals(contract_info['lotSize'])
-            self.tick_size = contract_info['tickSize']
-            self.lot_size = contract_info['lotSize']
-
-            self.quanto = contract_info['isQuanto']
-            self.inverse = contract_info['isInverse']
-
-            self.multiplier = contract_info['multiplier'] * BITMEX_MULTIPLIER
-
-            if self.inverse:
-                self.multiplier *= -1
+    __slots__ = ("symbol", "base_asset", "quote_asset", "price_decimals", "quantity_decimals", "tick_size",
+                 "lot_size", "quanto", "inverse", "multiplier", "exchange")
+
+    def __init__(self, symbol: str, base_asset: str, quote_asset: str, price_decimals: int, quantity_decimals: int,
+                 tick_size: float, lot_size: float, exchange: str, quanto=False, inverse=False, multiplier=1.0):
+        self.symbol = symbol
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.price_decimals = price_decimals
+        self.quantity_decimals = quantity_decimals
+        self.tick_size = tick_size
+        self.lot_size = lot_size
+
+        self.quanto = quanto
+        self.inverse = inverse
+        self.multiplier = multiplier
 
         self.exchange = exchange
 
+    @classmethod
+    def from_binance_futures(cls, contract_info) -> "Contract":
+        return cls(contract_info['symbol'], contract_info['baseAsset'], contract_info['quoteAsset'],
+                   contract_info['pricePrecision'], contract_info['quantityPrecision'],
+                   1 / pow(10, contract_info['pricePrecision']), 1 / pow(10, contract_info['quantityPrecision']),
+                   "binance_futures")
+
+    @classmethod
+    def from_binance_spot(cls, contract_info) -> "Contract":
+        tick_size = None
+        lot_size = None
+
+        # The actual lot size and tick size on Binance spot can be found in the 'filters' fields
+        # contract_info['filters'] is a list
+        for b_filter in contract_info['filters']:
+            if b_filter['filterType'] == 'PRICE_FILTER':
+                tick_size = float(b_filter['tickSize'])
+            if b_filter['filterType'] == 'LOT_SIZE':
+                lot_size = float(b_filter['stepSize'])
+
+        return cls(contract_info['symbol'], contract_info['baseAsset'], contract_info['quoteAsset'],
+                   tick_to_decimals(tick_size) if tick_size is not None else None,
+                   tick_to_decimals(lot_size) if lot_size is not None else None,
+                   tick_size, lot_size, "binance_spot")
+
+    @classmethod
+    def from_bitmex(cls, contract_info) -> "Contract":
+        multiplier = contract_info['multiplier'] * BITMEX_MULTIPLIER
+
+        if contract_info['isInverse']:
+            multiplier *= -1
+
+        return cls(contract_info['symbol'], contract_info['rootSymbol'], contract_info['quoteCurrency'],
+                   tick_to_decimals(contract_info['tickSize']), tick_to_decimals(contract_info['lotSize']),
+                   contract_info['tickSize'], contract_info['lotSize'], "bitmex",
+                   quanto=contract_info['isQuanto'], inverse=contract_info['isInverse'], multiplier=multiplier)
+
 
 class OrderStatus:
-    def __init__(self, order_info, exchange):
-        if exchange == "binance_futures":
-            self.order_id = order_info['orderId']
-            self.status = order_info['status'].lower()
-            self.avg_price = float(order_info['avgPrice'])
-            self.executed_qty = float(order_info['executedQty'])
-        elif exchange == "binance_spot":
-            self.order_id = order_info['orderId']
-            self.status = order_info['status'].lower()
-            self.avg_price = float(order_info['avgPrice'])
-            self.executed_qty = float(order_info['executedQty'])
-        elif exchange == "bitmex":
-            self.order_id = order_info['orderID']
-            self.status = order_info['ordStatus'].lower()
-            self.avg_price = order_info['avgPx']
-            self.executed_qty = order_info['cumQty']
+    __slots__ = ("order_id", "status", "avg_price", "executed_qty")
 
+    def __init__(self, order_id, status: str, avg_price: float, executed_qty: float):
+        self.order_id = order_id
+        self.status = status
+        self.avg_price = avg_price
+        self.executed_qty = executed_qty
 
-class Trade:
-    def __init__(self, trade_info):
-        self.time: int = trade_info['time']
-        self.contract: Contract = trade_info['contract']
-        self.strategy: str = trade_info['strategy']
-        self.side: str = trade_info['side']
-        self.entry_price: float = trade_info['entry_price']
-        self.status: str = trade_info['status']
-        self.pnl: float = trade_info['pnl']
-        self.quantity = trade_info['quantity']
-        self.entry_id = trade_info['entry_id']
+    @classmethod
+    def from_binance(cls, order_info) -> "OrderStatus":
+        # On Binance Spot, 'avgPrice' is added by the connector from the order trades
+        return cls(order_info['orderId'], order_info['status'].lower(), float(order_info['avgPrice']),
+                   float(order_info['executedQty']))
 
+    @classmethod
+    def from_binance_stream(cls, order_info) -> "OrderStatus":
+        # ORDER_TRADE_UPDATE (Futures) has the average price, executionReport (Spot) the cumulative quote quantity
+        executed_qty = float(order_info['z'])
 
+        if 'ap' in order_info:
+            avg_price = float(order_info['ap'])
+        else:
+            avg_price = float(order_info['Z']) / executed_qty if executed_qty > 0 else 0
 
+        return cls(order_info['i'], order_info['X'].lower(), avg_price, executed_qty)
 
+    @classmethod
+    def from_bitmex(cls, order_info) -> "OrderStatus":
+        return cls(order_info['orderID'], order_info['ordStatus'].lower(), order_info['avgPx'], order_info['cumQty'])
 
 
+class Trade:
+    __slots__ = ("time", "contract", "strategy", "side", "entry_price", "status", "pnl", "quantity", "entry_id",
+                 "tp_price", "sl_price", "exit_attempts", "next_exit_attempt")
+
+    def __init__(self, time: int, contract: Contract, strategy: str, side: str, entry_price: float, status: str,
+                 pnl: float, quantity, entry_id, tp_price=None, sl_price=None):
+        self.time = time
+        self.contract = contract
+        self.strategy = strategy
+        self.side = side
+        self.entry_price = entry_price
+        self.status = status
+        self.pnl = pnl
+        self.quantity = quantity
+        self.entry_id = entry_id
+
+        # Absolute Take Profit / Stop Loss prices, computed once the entry price is known
+        self.tp_price = tp_price
+        self.sl_price = sl_price
+
+        # Failed exit orders, the exit isn't tried again before next_exit_attempt (time.monotonic())
+        self.exit_attempts = 0
+        self.next_exit_attempt = 0.0
@@ -0,0 +1,281 @@
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import *
+
+import numpy as np
+
+import backtesting
+from candle_store import FIELDS
+
+
+logger = logging.getLogger()
+
+
+# Grid / random search over the strategy parameters, the backtests (backtesting.py) run in a ProcessPoolExecutor.
+# The candles are copied once into a shared memory block that every worker maps when it starts, the tasks only
+# carry the parameters. Results are cached in a SQLite database by hash of (data, strategy, parameters).
+
+SIGNAL_PARAMS = {"Technical": ["ema_fast", "ema_slow", "ema_signal", "rsi_length"], "Breakout": ["min_volume"]}
+
+_worker_arrays: Dict[str, np.ndarray] = dict()
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+
+
+def load_candles_file(path: str) -> Dict[str, np.ndarray]:
+
+    """
+    Load OHLCV data from a .npz file (one array per field) or a CSV file with the columns
+    timestamp, open, high, low, close, volume (extra columns are ignored, like in the Binance kline files).
+    :param path:
+    :return:
+    """
+
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {field: data[field] for field in FIELDS}
+
+    with open(path) as f:
+        first_line = f.readline()
+    skip_header = 0 if first_line.split(",")[0].strip().isdigit() else 1
+
+    raw = np.loadtxt(path, delimiter=",", skiprows=skip_header, usecols=range(6), ndmin=2)
+
+    arrays = {field: raw[:, i].copy() for i, field in enumerate(FIELDS)}
+    arrays["timestamp"] = arrays["timestamp"].astype(np.int64)
+
+    return arrays
+
+
+def _init_worker(shm_name: str, n: int):
+
+    """
+    ProcessPoolExecutor initializer: map the shared candles, once per worker process.
+    """
+
+    global _worker_shm, _worker_arrays
+
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray((len(FIELDS), n), dtype=np.float64, buffer=_worker_shm.buf)
+
+    _worker_arrays = {field: block[i] for i, field in enumerate(FIELDS)}
+    _worker_arrays["timestamp"] = block[0].astype(np.int64)  # Milliseconds timestamps are exact in float64
+
+
+@functools.lru_cache(maxsize=64)
+def _signals(strategy_type: str, signal_params: Tuple) -> np.ndarray:
+
+    """
+    The signals only depend on the indicator parameters, not on the TP/SL: they are reused between tasks.
+    """
+
+    params = dict(zip(SIGNAL_PARAMS[strategy_type], signal_params))
+
+    if strategy_type == "Technical":
+        return backtesting.technical_signals(_worker_arrays, params['ema_fast'], params['ema_slow'],
+                                             params['ema_signal'], params['rsi_length'])
+    else:
+        return backtesting.breakout_signals(_worker_arrays, params['min_volume'])
+
+
+def _run_task(strategy_type: str, params: Dict, balance_pct: float, allow_short: bool,
+              fee_pct: float) -> Tuple[float, float, int]:
+
+    signal_params = tuple(params[p] for p in SIGNAL_PARAMS[strategy_type])
+    signals = _signals(strategy_type, signal_params)
+
+    result = backtesting.simulate(_worker_arrays, signals, params['take_profit'], params['stop_loss'], balance_pct,
+                                  strategy_type == "Technical", allow_short, fee_pct)
+
+    return result.pnl, result.max_drawdown, len(result.trades)
+
+
+class ResultCache:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS backtests (hash TEXT PRIMARY KEY, params TEXT, pnl REAL, "
+                          "max_drawdown REAL, trades INTEGER)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[float, float, int]]:
+        row = self.conn.execute("SELECT pnl, max_drawdown, trades FROM backtests WHERE hash = ?", (key,)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def save(self, rows: List[Tuple[str, str, float, float, int]]):
+        self.conn.executemany("INSERT OR REPLACE INTO backtests VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+
+def data_fingerprint(arrays: Dict[str, np.ndarray]) -> str:
+    digest = hashlib.sha1()
+    for field in FIELDS:
+        digest.update(np.ascontiguousarray(arrays[field]).tobytes())
+    return digest.hexdigest()
+
+
+def parameter_hash(fingerprint: str, strategy_type: str, params: Dict, balance_pct: float, allow_short: bool,
+                   fee_pct: float) -> str:
+    key = json.dumps([fingerprint, strategy_type, params, balance_pct, allow_short, fee_pct], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def parameter_grid(ranges: Dict[str, List], random_samples: Optional[int] = None, seed: int = 0) -> List[Dict]:
+
+    """
+    :param ranges: Values to test for each parameter
+    :param random_samples: If set, only this number of random combinations of the grid is tested
+    :return: A list of parameter dictionaries
+    """
+
+    names = list(ranges)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+
+    if random_samples is not None and random_samples < len(grid):
+        grid = random.Random(seed).sample(grid, random_samples)
+
+    return grid
+
+
+def optimize(arrays: Dict[str, np.ndarray], strategy_type: str, ranges: Dict[str, List],
+             random_samples: Optional[int] = None, workers: Optional[int] = None, balance_pct: float = 100,
+             allow_short: bool = True, fee_pct: float = 0, cache_path: str = "optimizer.db",
+             rank_by: str = "ratio") -> List[Dict]:
+
+    """
+    Backtest every parameter combination in parallel.
+    :param arrays: OHLCV arrays, see backtesting.candles_to_arrays()
+    :param strategy_type: Technical or Breakout
+    :param ranges: e.g {"ema_fast": [8, 12], ..., "take_profit": [1, 2], "stop_loss": [1, 2]}
+    :param random_samples: Random search instead of the full grid
+    :param workers: Number of processes, all the cores by default
+    :param rank_by: pnl, or ratio (PnL / max drawdown)
+    :return: The results sorted from best to worst
+    """
+
+    fingerprint = data_fingerprint(arrays)
+    cache = ResultCache(cache_path)
+
+    combinations = parameter_grid(ranges, random_samples)
+
+    # Group the tasks with the same indicator parameters so that the worker signal cache is reused
+    combinations.sort(key=lambda p: tuple(p[name] for name in SIGNAL_PARAMS[strategy_type]))
+
+    results = []
+    to_run = []
+
+    for params in combinations:
+        key = parameter_hash(fingerprint, strategy_type, params, balance_pct, allow_short, fee_pct)
+        cached = cache.get(key)
+        if cached is not None:
+            results.append((params, cached))
+        else:
+            to_run.append((key, params))
+
+    logger.info("%s parameter combinations, %s already in the cache", len(combinations), len(results))
+
+    if len(to_run) > 0:
+        n = len(arrays["close"])
+        shm = shared_memory.SharedMemory(create=True, size=len(FIELDS) * n * 8)
+
+        try:
+            block = np.ndarray((len(FIELDS), n), dtype=np.float64, buffer=shm.buf)
+            for i, field in enumerate(FIELDS):
+                block[i] = arrays[field]
+
+            workers = workers or os.cpu_count()
+            chunksize = max(1, len(to_run) // (workers * 4))
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, n)) as executor:
+                outputs = executor.map(_run_task, itertools.repeat(strategy_type), [p for k, p in to_run],
+                                       itertools.repeat(balance_pct), itertools.repeat(allow_short),
+                                       itertools.repeat(fee_pct), chunksize=chunksize)
+
+                rows = []
+                for (key, params), output in zip(to_run, outputs):
+                    results.append((params, output))
+                    rows.append((key, json.dumps(params), *output))
+
+            cache.save(rows)
+
+        finally:
+            shm.close()
+            shm.unlink()
+
+    ranked = []
+    for params, (pnl, max_drawdown, trades) in results:
+        ratio = pnl / max_drawdown if max_drawdown > 0 else pnl
+        ranked.append({**params, "pnl": pnl, "max_drawdown": max_drawdown, "ratio": ratio, "trades": trades})
+
+    ranked.sort(key=lambda r: r[rank_by], reverse=True)
+
+    return ranked
+
+
+def _parse_range(text: str, data_type) -> List:
+
+    """
+    :param text: A comma separated list (9,12,15) or a start:stop:step range, stop included (1:3:0.5)
+    """
+
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+        return [data_type(round(v, 8)) for v in values]
+
+    return [data_type(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest a grid of strategy parameters in parallel")
+    parser.add_argument("--data", required=True, help="CSV (timestamp,open,high,low,close,volume) or .npz file")
+    parser.add_argument("--strategy", choices=["Technical", "Breakout"], default="Technical")
+    parser.add_argument("--ema-fast", default="12")
+    parser.add_argument("--ema-slow", default="26")
+    parser.add_argument("--ema-signal", default="9")
+    parser.add_argument("--rsi-length", default="14")
+    parser.add_argument("--min-volume", default="0")
+    parser.add_argument("--take-profit", default="1:3:0.5")
+    parser.add_argument("--stop-loss", default="1:3:0.5")
+    parser.add_argument("--balance-pct", type=float, default=100)
+    parser.add_argument("--fee-pct", type=float, default=0)
+    parser.add_argument("--spot", action="store_true", help="Ignore short signals")
+    parser.add_argument("--random", type=int, default=None, help="Number of random combinations to test")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default="optimizer.db")
+    parser.add_argument("--rank", choices=["pnl", "ratio"], default="ratio")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s :: %(message)s")
+
+    if args.strategy == "Technical":
+        ranges = {"ema_fast": _parse_range(args.ema_fast, int), "ema_slow": _parse_range(args.ema_slow, int),
+                  "ema_signal": _parse_range(args.ema_signal, int), "rsi_length": _parse_range(args.rsi_length, int)}
+    else:
+        ranges = {"min_volume": _parse_range(args.min_volume, float)}
+
+    ranges["take_profit"] = _parse_range(args.take_profit, float)
+    ranges["stop_loss"] = _parse_range(args.stop_loss, float)
+
+    arrays = load_candles_file(args.data)
+
+    start = time.perf_counter()
+    ranked = optimize(arrays, args.strategy, ranges, args.random, args.workers, args.balance_pct, not args.spot,
+                      args.fee_pct, args.cache, args.rank)
+    logger.info("%s backtests done in %.2f seconds", len(ranked), time.perf_counter() - start)
+
+    for result in ranked[:args.top]:
+        print(" ".join(f"{k}={round(v, 4) if isinstance(v, float) else v}" for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
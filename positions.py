@@ -0,0 +1,100 @@
+import threading
+from typing import *
+
+import numpy as np
+
+from models import Contract, Trade
+
+
+class PositionBook:
+    def __init__(self, contract: Contract):
+
+        """
+        Open positions of one symbol kept in NumPy arrays (entry price, quantity, side sign), so that a price
+        update refreshes the PnL of every position with one vectorized expression:
+        - linear contracts: sign * (price - entry_price) * multiplier * quantity
+        - inverse contracts: sign * (1 / entry_price - 1 / price) * multiplier * quantity
+        Longs are valued at the bid, shorts at the ask. The multiplier is 1 on Binance.
+        The state is an immutable tuple replaced on every change, the interface reads it without locking.
+        :param contract:
+        """
+
+        self._inverse = contract.inverse
+        self._multiplier = contract.multiplier
+
+        self._lock = threading.Lock()  # Serializes the writers (websocket and order threads)
+
+        # (trade id -> row, trades, entry prices, quantities, signs, PnLs)
+        self._state = (dict(), (), np.empty(0), np.empty(0), np.empty(0), np.empty(0))
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    def add(self, trade: Trade):
+        with self._lock:
+            rows, trades, entry, qty, sign, pnl = self._state
+
+            trades = trades + (trade,)
+            rows = {id(t): i for i, t in enumerate(trades)}
+
+            self._state = (rows, trades, np.append(entry, trade.entry_price), np.append(qty, trade.quantity),
+                           np.append(sign, 1.0 if trade.side == "long" else -1.0), np.append(pnl, 0.0))
+
+    def remove(self, trade: Trade):
+
+        """
+        Remove a closed trade, its last PnL is written to trade.pnl.
+        :param trade:
+        :return:
+        """
+
+        with self._lock:
+            rows, trades, entry, qty, sign, pnl = self._state
+
+            row = rows.get(id(trade))
+            if row is None:
+                return
+
+            trade.pnl = float(pnl[row])
+
+            keep = np.arange(len(trades)) != row
+            trades = tuple(t for t in trades if t is not trade)
+            rows = {id(t): i for i, t in enumerate(trades)}
+
+            self._state = (rows, trades, entry[keep], qty[keep], sign[keep], pnl[keep])
+
+    def update(self, bid: float, ask: float):
+
+        """
+        Recompute the PnL of all the open positions of the symbol.
+        :param bid:
+        :param ask:
+        :return:
+        """
+
+        with self._lock:
+            rows, trades, entry, qty, sign, pnl = self._state
+
+            if len(trades) == 0:
+                return
+
+            price = np.where(sign > 0, bid, ask)
+
+            if self._inverse:
+                pnl = sign * (1 / entry - 1 / price) * self._multiplier * qty
+            else:
+                pnl = sign * (price - entry) * self._multiplier * qty
+
+            self._state = (rows, trades, entry, qty, sign, pnl)
+
+    def get_pnl(self, trade: Trade) -> Optional[float]:
+
+        """
+        :param trade:
+        :return: The last computed PnL of the trade, None if it is not an open position of this book
+        """
+
+        rows, trades, entry, qty, sign, pnl = self._state
+
+        row = rows.get(id(trade))
+        return float(pnl[row]) if row is not None else None
@@ -0,0 +1,235 @@
+import csv
+import datetime
+import logging
+import time
+from typing import *
+
+from models import *
+from strategies import Strategy, TF_EQUIV
+from positions import PositionBook
+from connectors.execution import ExecutionQueue
+
+
+logger = logging.getLogger()
+
+
+# Tick replay: recorded trades are streamed through the real Strategy.parse_trades() -> check_trade() path, so
+# the Take Profit / Stop Loss are checked on every trade like in live trading (which the candle backtest in
+# backtesting.py can't reproduce). The orders are filled by a SimulatedClient instead of an exchange connector.
+# The ticks are consumed from generators, nothing is loaded in memory at once.
+
+
+class SimulatedClient:
+    def __init__(self, contract: Contract, quote_balance: float, futures: bool = True, fee_pct: float = 0.0):
+
+        """
+        Minimal stand-in for the BinanceClient used by the strategies: market orders are filled at the last trade price.
+        :param contract:
+        :param quote_balance: Initial balance of the quote asset (e.g USDT)
+        :param futures: if False, behaves like Binance Spot (no short, base asset balance)
+        :param fee_pct: Fee paid on each fill, in % of the notional
+        """
+
+        self.futures = futures
+        self.platform = "binance_futures" if futures else "binance_spot"
+
+        self.contracts = {contract.symbol: contract}
+
+        self.fee_pct = fee_pct
+
+        self.balances: Dict[str, Balance] = dict()
+        self.balances[contract.quote_asset] = Balance(wallet_balance=quote_balance, free=quote_balance, locked=0)
+        self.balances[contract.base_asset] = Balance(wallet_balance=0, free=0, locked=0)
+
+        self.last_price: Optional[float] = None  # Updated by replay() before each trade is parsed
+        self.last_timestamp: Optional[int] = None
+
+        self.position_qty = 0.0  # Signed quantity of the open position (futures)
+        self.position_price = 0.0
+
+        self.fills = []  # (timestamp, side, quantity, price) of every order
+        self.positions = PositionBook(contract)
+        self.execution = ExecutionQueue("replay", workers=0)  # Orders filled in the replay thread, in tick order
+        self._orders: Dict[int, OrderStatus] = dict()
+        self._order_id = 0
+
+    def get_balances(self) -> Dict[str, Balance]:
+        return self.balances
+
+    def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+
+        """
+        Same sizing as BinanceClient.get_trade_size(), without the REST call.
+        """
+
+        balance = self.balances[contract.quote_asset]
+        balance = balance.wallet_balance if self.futures else balance.free
+
+        trade_size = (balance * balance_pct / 100) / price
+
+        return round(round(trade_size / contract.lot_size) * contract.lot_size, 8)
+
+    def place_order(self, contract: Contract, order_type: str, quantity: float, side: str, price=None,
+                    tif=None) -> Optional[OrderStatus]:
+
+        if self.last_price is None or quantity <= 0:
+            return None
+
+        fill_price = self.last_price
+        direction = 1 if side.lower() == "buy" else -1
+        fee = quantity * fill_price * self.fee_pct / 100
+
+        quote = self.balances[contract.quote_asset]
+
+        if self.futures:
+            # Realize the PnL of the part of the position that is reduced
+            if self.position_qty * direction < 0:
+                closed_qty = min(quantity, abs(self.position_qty))
+                pnl = (fill_price - self.position_price) * closed_qty * (1 if self.position_qty > 0 else -1)
+                quote.wallet_balance += pnl
+                self.position_qty += direction * closed_qty
+                remaining = quantity - closed_qty
+            else:
+                remaining = quantity
+
+            if remaining > 0:
+                new_qty = self.position_qty + direction * remaining
+                self.position_price = (self.position_price * abs(self.position_qty) + fill_price * remaining) \
+                    / abs(new_qty)
+                self.position_qty = new_qty
+
+            quote.wallet_balance -= fee
+            quote.free = quote.wallet_balance
+
+        else:
+            base = self.balances[contract.base_asset]
+            quote.free -= direction * quantity * fill_price + fee
+            base.free += direction * quantity
+            quote.wallet_balance = quote.free
+            base.wallet_balance = base.free
+
+        self._order_id += 1
+        self.fills.append((self.last_timestamp, side.lower(), quantity, fill_price))
+
+        order_status = OrderStatus(self._order_id, "filled", fill_price, quantity)
+        self._orders[self._order_id] = order_status
+
+        return order_status
+
+    def get_order_status(self, contract: Contract, order_id: int) -> Optional[OrderStatus]:
+        return self._orders.get(order_id)
+
+    def add_position(self, trade: Trade):
+        self.positions.add(trade)
+
+    def remove_position(self, trade: Trade):
+        # The exit order was just filled at the last price, which gives the final PnL of the trade
+        self.positions.update(self.last_price, self.last_price)
+        self.positions.remove(trade)
+
+    def cancel_order(self, contract: Contract, order_id: int) -> Optional[OrderStatus]:
+        return self._orders.get(order_id)
+
+
+class ReplayResult:
+    def __init__(self, ticks: int, candles: int, elapsed: float, client: SimulatedClient):
+        self.ticks = ticks
+        self.candles = candles
+        self.elapsed = elapsed
+        self.fills = client.fills
+        self.balances = client.balances
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def replay(strategy: Strategy, ticks: Iterable[Tuple[float, float, int]]) -> ReplayResult:
+
+    """
+    Stream recorded trades through the strategy. Its client must be a SimulatedClient.
+    Builds the strategy own candles (see Strategy.use_own_candles()) if it has none, the first candle is then started
+    from the first trade.
+    :param strategy: A TechnicalStrategy or BreakoutStrategy created with a SimulatedClient
+    :param ticks: (price, size, timestamp in milliseconds) tuples, e.g from read_binance_agg_trades()
+    :return:
+    """
+
+    client: SimulatedClient = strategy.client
+
+    strategy.check_latency = False
+
+    if strategy.candles is None:
+        strategy.use_own_candles()
+
+    # Local references, this loop runs millions of times
+    parse_trades = strategy.parse_trades
+    check_trade = strategy.check_trade
+
+    tick_count = 0
+    new_candles = 0
+
+    start = time.perf_counter()
+
+    for price, size, timestamp in ticks:
+
+        if tick_count == 0 and len(strategy.candles) == 0:
+            tf = TF_EQUIV[strategy.tf] * 1000
+            strategy.candles.append(timestamp - timestamp % tf, price, price, price, price, 0)
+            strategy.seed_indicators()
+
+        client.last_price = price
+        client.last_timestamp = timestamp
+
+        res = parse_trades(price, size, timestamp)
+        check_trade(res)
+
+        tick_count += 1
+        if res == "new_candle":
+            new_candles += 1
+
+    elapsed = time.perf_counter() - start
+
+    logger.info("Replayed %s trades (%s new candles) in %.2f seconds", tick_count, new_candles, elapsed)
+
+    return ReplayResult(tick_count, new_candles, elapsed, client)
+
+
+def read_binance_agg_trades(path: str) -> Generator[Tuple[float, float, int], None, None]:
+
+    """
+    Read an aggTrades CSV file from https://data.binance.vision
+    Columns: agg_trade_id, price, quantity, first_trade_id, last_trade_id, transact_time, is_buyer_maker
+    :param path:
+    :return: (price, size, timestamp) tuples
+    """
+
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row[0].isdigit():  # Header line of the recent files
+                continue
+            yield float(row[1]), float(row[2]), int(row[5])
+
+
+def read_bitmex_trades(path: str, symbol: str) -> Generator[Tuple[float, float, int], None, None]:
+
+    """
+    Read a trade CSV file from https://public.bitmex.com (all the symbols are in the same file).
+    Columns: timestamp, symbol, side, size, price, ... with timestamps like 2021-01-01D00:00:09.447585000
+    :param path:
+    :param symbol: Only the trades of this symbol are returned
+    :return: (price, size, timestamp) tuples
+    """
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # Header
+
+        for row in reader:
+            if row[1] != symbol:
+                continue
+
+            dt = datetime.datetime.fromisoformat(row[0][:26].replace("D", "T"))
+            timestamp = int(dt.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+            yield float(row[4]), float(row[3]), timestamp
@@ -2,11 +2,11 @@ import logging
 from typing import *
 import time
 
-from threading import Timer
-
-import pandas as pd
-
 from models import *
+from candle_store import CandleBuffer, CANDLE_RETENTION
+from aggregator import BarSeries, TF_EQUIV
+from indicators import IndicatorCache
+from triggers import PriceTriggerIndex
 
 if TYPE_CHECKING:  # Import the connector class names only for typing purpose (the classes aren't actually imported)
     from connectors.bitmex_futures import BitmexClient
@@ -14,13 +14,35 @@ if TYPE_CHECKING:  # Import the connector class names only for typing purpose (t
 
 logger = logging.getLogger()
 
-# TF_EQUIV is used in parse_trades() to compare the last candle timestamp to the new trade timestamp
-TF_EQUIV = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
+
+# Strategy plugins: the interface lists the strategies registered here with @register_strategy("Name").
+# Each strategy declares its extra PARAMETERS (shown in the parameters popup of the strategy component) and the
+# indicators it reads, which are computed once per symbol/timeframe by the shared IndicatorCache.
+STRATEGIES: Dict[str, Type["Strategy"]] = dict()
+
+# A failed exit order (rejected by the exchange or the execution queue, or an error) is tried again after
+# EXIT_RETRY_DELAY seconds, doubled on each failure up to EXIT_MAX_RETRY_DELAY. After EXIT_MAX_ATTEMPTS failures the
+# trade is left to be closed manually.
+EXIT_RETRY_DELAY = 1
+EXIT_MAX_RETRY_DELAY = 60
+EXIT_MAX_ATTEMPTS = 10
+
+
+def register_strategy(name: str):
+    def decorator(strategy_class: Type["Strategy"]) -> Type["Strategy"]:
+        STRATEGIES[name] = strategy_class
+        return strategy_class
+
+    return decorator
 
 
 class Strategy:
+    # {"code_name": ..., "name": ..., "data_type": int/float} for each parameter of the other_params dictionary
+    PARAMETERS: List[Dict] = []
+
     def __init__(self, client: Union["BitmexClient", "BinanceClient"], contract: Contract, exchange: str,
-                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name):
+                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name,
+                 candle_retention: int = CANDLE_RETENTION):
 
         self.client = client
 
@@ -36,193 +58,285 @@ class Strategy:
 
         self.ongoing_position = False
 
-        self.candles: List[Candle] = []
+        self.check_latency = True  # Disabled when replaying recorded trades, their timestamps are in the past
+
+        # Set by use_shared_candles() when the strategy runs live (the candles of the connector SymbolAggregator), or
+        # by use_own_candles() when its candles are built by parse_trades() (e.g replayed trades)
+        self._candle_retention = candle_retention
+        self._bars: Optional[BarSeries] = None
+        self.candles: Optional[CandleBuffer] = None
+        self.indicators: Optional[IndicatorCache] = None
+
         self.trades: List[Trade] = []
         self.logs = []
 
+        self._triggers = PriceTriggerIndex()  # TP/SL prices of the open trades
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
-    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+    def required_indicators(self) -> List[tuple]:
 
         """
-        Parse new trades coming in from the websocket and update the Candle list based on the timestamp.
-        :param price: The trade price
-        :param size: The trade size
-        :param timestamp: Unix timestamp in milliseconds
-        :return:
+        :return: The (name, parameters...) keys of the IndicatorCache read by the strategy, e.g [("rsi", 14)]
         """
 
-        timestamp_diff = int(time.time() * 1000) - timestamp
-        if timestamp_diff >= 2000:
-            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
-                           self.exchange, self.contract.symbol, timestamp_diff)
+        return []
 
-        last_candle = self.candles[-1]
+    def seed_indicators(self):
 
-        # Same Candle
+        """
+        Called once the historical candles are loaded, before the strategy receives its first trade: computes the
+        indicators on the history (nothing to do if another strategy already requested them).
+        :return:
+        """
 
-        if timestamp < last_candle.timestamp + self.tf_equiv:
+        for key in self.required_indicators():
+            self.indicators.get(*key)
 
-            last_candle.close = price
-            last_candle.volume += size
+    def use_shared_candles(self, candles: CandleBuffer, indicators: IndicatorCache):
 
-            if price > last_candle.high:
-                last_candle.high = price
-            elif price < last_candle.low:
-                last_candle.low = price
+        """
+        Read the candles built by the connector aggregator (shared with the other strategies on the same symbol and
+        timeframe) instead of building them. The connector then calls on_tick() instead of parse_trades().
+        :param candles:
+        :param indicators: The indicator cache of the same symbol and timeframe
+        :return:
+        """
 
-            # Check Take profit / Stop loss
+        self._bars = None
+        self.candles = candles
+        self.indicators = indicators
 
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_sl(trade)
+    def use_own_candles(self):
 
-            return "same_candle"
+        """
+        Build the candles of the strategy from the trades received by parse_trades(), e.g to replay recorded trades.
+        :return:
+        """
 
-        # Missing Candle(s)
+        self._bars = BarSeries(f"{self.exchange} {self.contract.symbol}", self.tf, self._candle_retention)
+        self.candles = self._bars.candles
+        self.indicators = self._bars.indicators
 
-        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
+    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
 
-            missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
+        """
+        Parse new trades and update the strategy own candles based on the timestamp (used when replaying trades,
+        live strategies share the candles of the connector aggregator). See use_own_candles().
+        :param price: The trade price
+        :param size: The trade size
+        :param timestamp: Unix timestamp in milliseconds
+        :return: same_candle or new_candle
+        """
+
+        if self.check_latency:
+            timestamp_diff = int(time.time() * 1000) - timestamp
+            if timestamp_diff >= 2000:
+                logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
+                               self.exchange, self.contract.symbol, timestamp_diff)
 
-            logger.info("%s missing %s candles for %s %s (%s %s)", self.exchange, missing_candles, self.contract.symbol,
-                        self.tf, timestamp, last_candle.timestamp)
+        tick_type = self._bars.add_trade(price, size, timestamp)
 
-            for missing in range(missing_candles):
-                new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {'ts': new_ts, 'open': last_candle.close, 'high': last_candle.close,
-                               'low': last_candle.close, 'close': last_candle.close, 'volume': 0}
-                new_candle = Candle(candle_info, self.tf, "parse_trade")
+        self.on_tick(tick_type, price)
 
-                self.candles.append(new_candle)
+        return tick_type
 
-                last_candle = new_candle
+    def on_tick(self, tick_type: str, price: float):
 
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+        """
+        Called for every trade once the candles are updated.
+        :param tick_type: same_candle, new_candle or backfill (missing candles being downloaded)
+        :param price: The trade price
+        :return:
+        """
 
-            self.candles.append(new_candle)
+        # Check Take profit / Stop loss, only the nearest levels are compared to the price.
+        # During a backfill, the candles are behind but the trade price is still checked.
 
-            return "new_candle"
+        if tick_type in ("same_candle", "backfill"):
+            if price >= self._triggers.next_above or price <= self._triggers.next_below:
+                self._check_tp_sl(price)
 
-        # New Candle
+    def _on_order_update(self, order_status: OrderStatus):
 
-        elif timestamp >= last_candle.timestamp + self.tf_equiv:
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+        """
+        Called by the connector order tracker once an entry order that wasn't filled immediately reaches
+        a final status (filled, canceled, rejected, expired).
+        :param order_status:
+        :return:
+        """
 
-            self.candles.append(new_candle)
+        logger.info("%s order status: %s", self.exchange, order_status.status)
 
-            logger.info("%s New candle for %s %s", self.exchange, self.contract.symbol, self.tf)
+        for trade in self.trades:
+            if trade.entry_id == order_status.order_id:
+                break
+        else:
+            return
 
-            return "new_candle"
+        # A canceled/expired order can be partially filled: the position is the filled part
+        if order_status.status == "filled" or order_status.executed_qty > 0:
+            trade.entry_price = order_status.avg_price
+            trade.quantity = order_status.executed_qty
+            self._register_tp_sl(trade)
+        else:
+            self._add_log(f"Entry order on {self.contract.symbol} {self.tf} {order_status.status}, no position opened")
+            trade.status = order_status.status
+            self.ongoing_position = False
 
-    def _check_order_status(self, order_id):
+    def _submit_entry(self, signal_result: int):
 
         """
-        Called regularly after an order has been placed, until it is filled.
-        :param order_id: The order id to check.
+        Called from the websocket thread: the order is placed by the connector execution queue, and the strategy
+        is marked as in position right away so that no other signal is submitted meanwhile.
+        :param signal_result: 1 (Long) or -1 (Short)
         :return:
         """
 
-        order_status = self.client.get_order_status(self.contract, order_id)
-
-        if order_status is not None:
+        # Short is not allowed on Spot platforms
+        if self.client.platform == "binance_spot" and signal_result == -1:
+            return
 
-            logger.info("%s order status: %s", self.exchange, order_status.status)
+        self.ongoing_position = True
 
-            if order_status.status == "filled":
-                for trade in self.trades:
-                    if trade.entry_id == order_id:
-                        trade.entry_price = order_status.avg_price
-                        trade.quantity = order_status.executed_qty
-                        break
-                return
+        if not self.client.execution.submit(self._open_position, signal_result, self.candles.last_close):
+            self.ongoing_position = False
 
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
-
-    def _open_position(self, signal_result: int):
+    def _open_position(self, signal_result: int, price: float):
 
         """
-        Open Long or Short position based on the signal result.
+        Open Long or Short position based on the signal result. Runs in an execution queue worker thread.
         :param signal_result: 1 (Long) or -1 (Short)
+        :param price: Last price when the signal occurred, used for the trade size
         :return:
         """
 
-        # Short is not allowed on Spot platforms
-        if self.client.platform == "binance_spot" and signal_result == -1:
-            return
+        new_trade = None
 
-        trade_size = self.client.get_trade_size(self.contract, self.candles[-1].close, self.balance_pct)
-        if trade_size is None:
-            return
+        try:  # An exception (REST error, timeout) must not leave the strategy in position forever
+            trade_size = self.client.get_trade_size(self.contract, price, self.balance_pct)
+            if trade_size is None:
+                self.ongoing_position = False
+                return
 
-        order_side = "buy" if signal_result == 1 else "sell"
-        position_side = "long" if signal_result == 1 else "short"
+            order_side = "buy" if signal_result == 1 else "sell"
+            position_side = "long" if signal_result == 1 else "short"
 
-        self._add_log(f"{position_side.capitalize()} signal on {self.contract.symbol} {self.tf}")
+            self._add_log(f"{position_side.capitalize()} signal on {self.contract.symbol} {self.tf}")
 
-        order_status = self.client.place_order(self.contract, "MARKET", trade_size, order_side)
+            order_status = self.client.place_order(self.contract, "MARKET", trade_size, order_side)
+
+            if order_status is None:
+                self.ongoing_position = False
+                return
 
-        if order_status is not None:
             self._add_log(f"{order_side.capitalize()} order placed on {self.exchange} | Status: {order_status.status}")
 
-            self.ongoing_position = True
+            avg_fill_price = order_status.avg_price if order_status.status == "filled" else None
 
-            avg_fill_price = None
+            new_trade = Trade(time=int(time.time() * 1000), entry_price=avg_fill_price, contract=self.contract,
+                              strategy=self.strat_name, side=position_side, status="open", pnl=0,
+                              quantity=order_status.executed_qty, entry_id=order_status.order_id)
+            self.trades.append(new_trade)
 
-            if order_status.status == "filled":
-                avg_fill_price = order_status.avg_price
+            if avg_fill_price is not None:
+                self._register_tp_sl(new_trade)
             else:
-                t = Timer(2.0, lambda: self._check_order_status(order_status.order_id))
-                t.start()
+                # Tracked once the trade is in self.trades: the final status can be passed to _on_order_update() right
+                # away (websocket update received before the tracking, or a fast poll)
+                self.client.order_tracker.track(self.contract, order_status.order_id, self._on_order_update)
+        except Exception as e:
+            logger.error("Error while opening the %s %s position: %s", self.contract.symbol, self.tf, e)
 
-            new_trade = Trade({"time": int(time.time() * 1000), "entry_price": avg_fill_price,
-                               "contract": self.contract, "strategy": self.strat_name, "side": position_side,
-                               "status": "open", "pnl": 0, "quantity": order_status.executed_qty, "entry_id": order_status.order_id})
-            self.trades.append(new_trade)
+            if new_trade is not None:  # Half-built trade, its TP/SL levels (if registered) are then ignored
+                new_trade.status = "closed"
+                if new_trade in self.trades:
+                    self.trades.remove(new_trade)
 
-    def _check_tp_sl(self, trade: Trade):
+            self.ongoing_position = False
+
+    def _register_tp_sl(self, trade: Trade):
 
         """
-        Based on the average entry price, calculates whether the defined stop loss or take profit has been reached.
+        Compute the absolute Take Profit / Stop Loss prices once the average entry price is known and add them to
+        the trigger index checked on every trade. The trade is also added to the connector position book that
+        keeps its PnL up to date.
         :param trade:
         :return:
         """
 
-        tp_triggered = False
-        sl_triggered = False
+        if trade.side == "long":
+            trade.sl_price = trade.entry_price * (1 - self.stop_loss / 100) if self.stop_loss is not None else None
+            trade.tp_price = trade.entry_price * (1 + self.take_profit / 100) if self.take_profit is not None else None
+        else:
+            trade.sl_price = trade.entry_price * (1 + self.stop_loss / 100) if self.stop_loss is not None else None
+            trade.tp_price = trade.entry_price * (1 - self.take_profit / 100) if self.take_profit is not None else None
 
-        price = self.candles[-1].close
+        self._triggers.add(trade)
+        self.client.add_position(trade)
 
-        if trade.side == "long":
-            if self.stop_loss is not None:
-                if price <= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price >= trade.entry_price * (1 + self.take_profit / 100):
-                    tp_triggered = True
+    def _check_tp_sl(self, price: float):
+
+        """
+        Close the open trades whose stop loss or take profit price has been reached.
+        :param price: The last trade price
+        :return:
+        """
+
+        now = time.monotonic()
+
+        for trade, kind in self._triggers.pop_triggered(price):
+            if now < trade.next_exit_attempt:  # The last exit order failed, wait before trying again
+                self._triggers.add(trade)
+                continue
+
+            if not self.client.execution.submit(self._close_position, trade, kind, price, critical=True):
+                self._exit_failed(trade)
+
+    def _exit_failed(self, trade: Trade):
+
+        """
+        Register the levels of a trade again after a failed exit order, with an exponential retry delay, so that an
+        exchange that keeps rejecting the order isn't sent a new one on every trade.
+        :param trade:
+        :return:
+        """
 
-        elif trade.side == "short":
-            if self.stop_loss is not None:
-                if price >= trade.entry_price * (1 + self.stop_loss / 100):
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price <= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
+        trade.exit_attempts += 1
 
-        if tp_triggered or sl_triggered:
+        if trade.exit_attempts >= EXIT_MAX_ATTEMPTS:
+            logger.error("%s %s exit order failed %s times, giving up", self.contract.symbol, self.tf,
+                         trade.exit_attempts)
+            self._add_log(f"Exit order on {self.contract.symbol} {self.tf} failed {trade.exit_attempts} times, "
+                          f"the position must be closed manually")
+            return
 
-            self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol} {self.tf} "
-                          f"| Current Price = {price} (Entry price was {trade.entry_price})")
+        delay = min(EXIT_RETRY_DELAY * 2 ** (trade.exit_attempts - 1), EXIT_MAX_RETRY_DELAY)
+        trade.next_exit_attempt = time.monotonic() + delay
 
-            order_side = "SELL" if trade.side == "long" else "BUY"
+        logger.warning("%s %s exit order failed (attempt %s), trying again in %s seconds", self.contract.symbol,
+                       self.tf, trade.exit_attempts, delay)
 
+        self._triggers.add(trade)
+
+    def _close_position(self, trade: Trade, kind: str, price: float):
+
+        """
+        Place the exit order of a trade. Runs in an execution queue worker thread.
+        :param trade:
+        :param kind: tp or sl
+        :param price: The trade price that reached the level
+        :return:
+        """
+
+        self._add_log(f"{'Stop loss' if kind == 'sl' else 'Take profit'} for {self.contract.symbol} {self.tf} "
+                      f"| Current Price = {price} (Entry price was {trade.entry_price})")
+
+        order_side = "SELL" if trade.side == "long" else "BUY"
+
+        try:  # An exception must not lose the exit: the level is added back below
             if not self.client.futures:
                 # Make sure we don't sell more than what's in the available balance on Binance Spot
                 current_balances = self.client.get_balances()
@@ -231,14 +345,28 @@ class Strategy:
                         trade.quantity = min(current_balances[self.contract.base_asset].free, trade.quantity)
 
             order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side)
+        except Exception as e:
+            logger.error("Error while placing the %s exit order: %s", self.contract.symbol, e)
+            order_status = None
 
-            if order_status is not None:
-                self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
-                trade.status = "closed"
-                self.ongoing_position = False
+        if order_status is not None:
+            self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
+            trade.status = "closed"
+            self.client.remove_position(trade)
+            self.ongoing_position = False
+        else:
+            self._exit_failed(trade)
 
 
+@register_strategy("Technical")
 class TechnicalStrategy(Strategy):
+    PARAMETERS = [
+        {"code_name": "rsi_length", "name": "RSI Periods", "data_type": int},
+        {"code_name": "ema_fast", "name": "MACD Fast Length", "data_type": int},
+        {"code_name": "ema_slow", "name": "MACD Slow Length", "data_type": int},
+        {"code_name": "ema_signal", "name": "MACD Signal Length", "data_type": int},
+    ]
+
     def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
         super().__init__(client, contract, exchange, timeframe, balance_pct, take_profit, stop_loss, "Technical")
@@ -249,6 +377,9 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params['rsi_length']
 
+    def required_indicators(self) -> List[tuple]:
+        return [("rsi", self._rsi_length), ("macd", self._ema_fast, self._ema_slow, self._ema_signal)]
+
     def _rsi(self) -> float:
 
         """
@@ -256,28 +387,7 @@ class TechnicalStrategy(Strategy):
         :return: The RSI value of the previous candlestick
         """
 
-        close_list = []
-        for candle in self.candles:
-            close_list.append(candle.close)
-
-        closes = pd.Series(close_list)
-
-        # Calculate the different between the value of one row and the value of the row before
-        delta = closes.diff().dropna()
-
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0  # Keep only the negative change, others are set to 0
-
-        avg_gain = up.ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
-
-        rs = avg_gain / avg_loss  # Relative Strength
-
-        rsi = 100 - 100 / (1 + rs)
-        rsi = rsi.round(2)
-
-        return rsi.iloc[-2]
+        return self.indicators.get("rsi", self._rsi_length)
 
     def _macd(self) -> Tuple[float, float]:
 
@@ -286,19 +396,7 @@ class TechnicalStrategy(Strategy):
         :return: The MACD and the MACD Signal value of the previous candlestick
         """
 
-        close_list = []
-        for candle in self.candles:
-            close_list.append(candle.close)  # Use only the close price of each candlestick for the calculations
-
-        closes = pd.Series(close_list)  # Converts the close prices list to a pandas Series.
-
-        ema_fast = closes.ewm(span=self._ema_fast).mean()  # Exponential Moving Average method
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
-
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
-
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self.indicators.get("macd", self._ema_fast, self._ema_slow, self._ema_signal)
 
     def _check_signal(self):
 
@@ -331,10 +429,15 @@ class TechnicalStrategy(Strategy):
             signal_result = self._check_signal()
 
             if signal_result in [1, -1]:
-                self._open_position(signal_result)
+                self._submit_entry(signal_result)
 
 
+@register_strategy("Breakout")
 class BreakoutStrategy(Strategy):
+    PARAMETERS = [
+        {"code_name": "min_volume", "name": "Minimum Volume", "data_type": float},
+    ]
+
     def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
         super().__init__(client, contract, exchange, timeframe, balance_pct, take_profit, stop_loss, "Breakout")
@@ -348,9 +451,15 @@ class BreakoutStrategy(Strategy):
         :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
         """
 
-        if self.candles[-1].close > self.candles[-2].high and self.candles[-1].volume > self._min_volume:
+        if len(self.candles) < 2:
+            return 0
+
+        close = self.candles.last_close
+        volume = self.candles.volume[-1]
+
+        if close > self.candles.high[-2] and volume > self._min_volume:
             return 1
-        elif self.candles[-1].close < self.candles[-2].low and self.candles[-1].volume > self._min_volume:
+        elif close < self.candles.low[-2] and volume > self._min_volume:
             return -1
         else:
             return 0
@@ -359,15 +468,15 @@ class BreakoutStrategy(Strategy):
 
         """
         To be triggered from the websocket _on_message() methods
-        :param tick_type: same_candle or new_candle
+        :param tick_type: same_candle, new_candle or backfill
         :return:
         """
 
-        if not self.ongoing_position:
+        if not self.ongoing_position and tick_type != "backfill":  # No signal on candles that are behind
             signal_result = self._check_signal()
 
             if signal_result in [1, -1]:
-                self._open_position(signal_result)
+                self._submit_entry(signal_result)
 
 
 
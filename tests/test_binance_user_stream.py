@@ -0,0 +1,212 @@
+"""
+BinanceClient user data stream against a local stand-in of Binance Futures (REST API and websockets): recorded
+ORDER_TRADE_UPDATE, ACCOUNT_UPDATE and listenKeyExpired payloads are pushed through the user stream websocket, and the
+order table, the balances and the order tracker are checked.
+Run from the project root: python -m pytest tests
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from connectors.binance_futures import BinanceClient
+
+
+SYMBOL = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+
+ACCOUNT = {"assets": [{"asset": "USDT", "initialMargin": "0", "maintMargin": "0", "marginBalance": "1000",
+                       "walletBalance": "1000", "unrealizedProfit": "0"}]}
+
+
+# Recorded Binance Futures user data stream payloads (ids and amounts changed)
+
+def order_trade_update(order_id: int, status: str, executed_qty: str, avg_price: str) -> dict:
+    return {"e": "ORDER_TRADE_UPDATE", "E": 1637576130120, "T": 1637576130118,
+            "o": {"s": "BTCUSDT", "c": "web_kgcaNmGAcnUMntnDwrtG", "S": "BUY", "o": "MARKET", "f": "GTC",
+                  "q": "0.010", "p": "0", "ap": avg_price, "sp": "0", "x": "TRADE" if status == "FILLED" else "NEW",
+                  "X": status, "i": order_id, "l": executed_qty, "z": executed_qty, "L": avg_price, "n": "0.02289",
+                  "N": "USDT", "T": 1637576130118, "t": 1231250, "b": "0", "a": "0", "m": False, "R": False,
+                  "wt": "CONTRACT_PRICE", "ot": "MARKET", "ps": "BOTH", "cp": False, "rp": "0", "pP": False,
+                  "si": 0, "ss": 0}}
+
+
+ACCOUNT_UPDATE = {"e": "ACCOUNT_UPDATE", "E": 1637576130125, "T": 1637576130118,
+                  "a": {"m": "ORDER",
+                        "B": [{"a": "USDT", "wb": "977.10862500", "cw": "977.10862500", "bc": "0"},
+                              {"a": "BNB", "wb": "0.50000000", "cw": "0.50000000", "bc": "0"}],
+                        "P": [{"s": "BTCUSDT", "pa": "0.010", "ep": "57225.10", "cr": "0", "up": "0", "mt": "cross",
+                               "iw": "0", "ps": "BOTH"}]}}
+
+LISTEN_KEY_EXPIRED = {"e": "listenKeyExpired", "E": 1637576130130}
+
+
+class BinanceStandIn:
+    def __init__(self):
+
+        """
+        Binance Futures REST API and websockets on localhost, in the thread of its own event loop.
+        """
+
+        self.listen_keys = 0  # listenKeys created by the client
+        self._user_ws = None
+
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+
+        threading.Thread(target=self._run, daemon=True).start()
+        self._started.wait(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+
+        app = web.Application()
+        app.router.add_get("/fapi/v1/ping", self._reply({}))
+        app.router.add_get("/fapi/v1/exchangeInfo", self._reply({"symbols": [SYMBOL]}))
+        app.router.add_get("/fapi/v1/account", self._reply(ACCOUNT))
+        app.router.add_post("/fapi/v1/listenKey", self._new_listen_key)
+        app.router.add_put("/fapi/v1/listenKey", self._reply({}))
+        app.router.add_get("/ws", self._market_ws)
+        app.router.add_get("/ws/{listen_key}", self._user_stream)
+
+        self._runner = web.AppRunner(app)
+        self.loop.run_until_complete(self._runner.setup())
+
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        self._started.set()
+        self.loop.run_forever()
+
+    @staticmethod
+    def _reply(payload: dict):
+        async def handler(request):
+            return web.json_response(payload)
+        return handler
+
+    async def _new_listen_key(self, request):
+        self.listen_keys += 1
+        return web.json_response({"listenKey": f"listenkey{self.listen_keys}"})
+
+    async def _market_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:  # The subscriptions are ignored
+            pass
+        return ws
+
+    async def _user_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._user_ws = ws
+        async for msg in ws:
+            pass
+        return ws
+
+    def push(self, payload: dict):
+
+        """
+        Send a user data stream event to the client.
+        """
+
+        asyncio.run_coroutine_threadsafe(self._user_ws.send_str(json.dumps(payload)), self.loop).result(5)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def stand_in():
+    server = BinanceStandIn()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(stand_in, tmp_path):
+    url = f"http://127.0.0.1:{stand_in.port}"
+    binance = BinanceClient("public", "secret", True, True, timeout=2, warm_connections=1,
+                            candle_cache_dir=str(tmp_path), base_url=url,
+                            wss_url=f"ws://127.0.0.1:{stand_in.port}/ws")
+
+    wait_for(lambda: binance.user_stream_connected)
+
+    yield binance
+
+    binance.reconnect = False
+    binance.ws.close()
+    binance.user_ws.close()
+    binance.close()
+
+
+def test_construction_reads_the_stand_in(client):
+    assert "BTCUSDT" in client.contracts
+    assert client.balances["USDT"].wallet_balance == 1000
+    assert len(client.orders) == 0
+
+
+def test_order_updates_reach_the_order_table_and_the_tracker(client, stand_in):
+    contract = client.contracts["BTCUSDT"]
+    received = []
+
+    client.order_tracker.track(contract, 8886774, received.append)
+
+    stand_in.push(order_trade_update(8886774, "NEW", "0", "0"))
+    wait_for(lambda: 8886774 in client.orders)
+
+    assert client.orders[8886774].status == "new"
+    assert received == []  # Not a final status
+
+    stand_in.push(order_trade_update(8886774, "FILLED", "0.010", "57225.10"))
+    wait_for(lambda: len(received) > 0)
+
+    assert client.orders[8886774].status == "filled"
+    assert len(received) == 1
+    assert received[0].avg_price == 57225.10
+    assert received[0].executed_qty == 0.01
+
+
+def test_fill_received_before_the_order_is_tracked(client, stand_in):
+    contract = client.contracts["BTCUSDT"]
+    received = []
+
+    stand_in.push(order_trade_update(8886775, "FILLED", "0.010", "57230.00"))
+    wait_for(lambda: 8886775 in client.orders)
+
+    client.order_tracker.track(contract, 8886775, received.append)
+
+    assert len(received) == 1
+    assert received[0].status == "filled"
+
+
+def test_account_update_sets_the_balances(client, stand_in):
+    stand_in.push(ACCOUNT_UPDATE)
+    wait_for(lambda: "BNB" in client.balances)
+
+    assert client.balances["USDT"].wallet_balance == 977.108625
+    assert client.balances["USDT"].margin_balance == 1000  # Only the wallet balance is pushed
+    assert client.balances["BNB"].wallet_balance == 0.5
+    assert client.get_balances() is client.balances  # No request while the stream is connected
+
+
+def test_listen_key_expired_reconnects_with_a_new_listen_key(client, stand_in):
+    assert stand_in.listen_keys == 1
+
+    stand_in.push(LISTEN_KEY_EXPIRED)
+    wait_for(lambda: not client.user_stream_connected)
+
+    wait_for(lambda: client.user_stream_connected, timeout=10)  # The stream reconnects after 2 seconds
+
+    assert stand_in.listen_keys == 2
@@ -0,0 +1,165 @@
+"""
+The indicators package against the previous pandas code of TechnicalStrategy, and the streaming classes against the
+batch functions (one candle at a time).
+Run from the project root: python -m pytest tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+# Previous implementation (TechnicalStrategy._rsi() and _macd() before the streaming indicators), computed on all
+# the candles instead of only returning the value of the previous candle
+
+def legacy_rsi(closes: pd.Series, rsi_length: int) -> pd.Series:
+    delta = closes.diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.abs().ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rs = avg_gain / avg_loss
+
+    rsi = 100 - 100 / (1 + rs)
+    rsi = rsi.round(2)
+
+    return rsi
+
+
+def legacy_macd(closes: pd.Series, ema_fast: int, ema_slow: int, ema_signal: int):
+    ema_fast = closes.ewm(span=ema_fast).mean()
+    ema_slow = closes.ewm(span=ema_slow).mean()
+
+    macd_line = ema_fast - ema_slow
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line, macd_signal
+
+
+def random_candles(n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+
+    closes = 40000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    closes[n // 2:n // 2 + 30] = closes[n // 2]  # Flat candles: no gain nor loss during the RSI period
+    opens = np.r_[closes[0], closes[:-1]]
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.001, n))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.001, n))
+    volumes = rng.uniform(0, 100, n)
+
+    return highs, lows, closes, volumes
+
+
+def assert_rsi_close(actual, expected):
+
+    """
+    Both RSI are rounded to 2 decimals: a value very close to a rounding boundary can round differently after the
+    tiny floating point differences, which is at most 0.01.
+    """
+
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=0.01 + 1e-9, equal_nan=True)
+
+
+# The lengths shorter than the periods check the warm-up: NaN until there are enough candles, like pandas
+LENGTHS = [1, 2, 10, 14, 15, 26, 40, 5_000]
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_rsi_batch_matches_pandas(n):
+    highs, lows, closes, volumes = random_candles(n)
+
+    rsi = indicators.rsi(closes, 14)
+
+    assert np.isnan(rsi[0])
+    assert_rsi_close(rsi[1:], legacy_rsi(pd.Series(closes), 14).to_numpy())
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_macd_batch_matches_pandas(n):
+    highs, lows, closes, volumes = random_candles(n)
+
+    macd_line, macd_signal = indicators.macd(closes, 12, 26, 9)
+    legacy_line, legacy_signal = legacy_macd(pd.Series(closes), 12, 26, 9)
+
+    # The MACD is a difference of two close EMAs: compared relatively to the price scale
+    np.testing.assert_allclose(macd_line, legacy_line.to_numpy(), rtol=0, atol=1e-9 * closes.max())
+    np.testing.assert_allclose(macd_signal, legacy_signal.to_numpy(), rtol=0, atol=1e-9 * closes.max())
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_streaming_rsi_matches_batch_and_pandas(n):
+    highs, lows, closes, volumes = random_candles(n, seed=2)
+
+    stream = indicators.StreamingRSI(14)
+    values = np.array([stream.update(c) for c in closes], dtype=np.float64)
+
+    assert_rsi_close(values, indicators.rsi(closes, 14))
+    assert_rsi_close(values[1:], legacy_rsi(pd.Series(closes), 14).to_numpy())
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_streaming_macd_matches_batch_and_pandas(n):
+    highs, lows, closes, volumes = random_candles(n, seed=2)
+
+    stream = indicators.StreamingMACD(12, 26, 9)
+    values = np.array([stream.update(c) for c in closes], dtype=np.float64)
+
+    np.testing.assert_allclose(values, np.column_stack(indicators.macd(closes, 12, 26, 9)), rtol=1e-8)
+
+    legacy_line, legacy_signal = legacy_macd(pd.Series(closes), 12, 26, 9)
+    np.testing.assert_allclose(values[:, 0], legacy_line.to_numpy(), rtol=0, atol=1e-9 * closes.max())
+    np.testing.assert_allclose(values[:, 1], legacy_signal.to_numpy(), rtol=0, atol=1e-9 * closes.max())
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_other_batch_indicators_match_pandas(n):
+    highs, lows, closes, volumes = random_candles(n)
+    series = pd.Series(closes)
+
+    np.testing.assert_allclose(indicators.ema(closes, 50), series.ewm(span=50).mean().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(indicators.sma(closes, 20), series.rolling(20).mean().to_numpy(), rtol=1e-9)
+
+    # The pandas rolling std drifts on the flat candles (about 1e-3 instead of 0 at this price scale)
+    middle, upper, lower = indicators.bollinger(closes, 20, 2)
+    std = series.rolling(20).std().to_numpy()
+    np.testing.assert_allclose(upper, series.rolling(20).mean().to_numpy() + 2 * std, rtol=0, atol=1e-7 * closes.max())
+    np.testing.assert_allclose(lower, series.rolling(20).mean().to_numpy() - 2 * std, rtol=0, atol=1e-7 * closes.max())
+
+    prev_closes = series.shift(1)
+    true_range = pd.concat([pd.Series(highs - lows), (pd.Series(highs) - prev_closes).abs(),
+                            (pd.Series(lows) - prev_closes).abs()], axis=1).max(axis=1)
+    np.testing.assert_allclose(indicators.atr(highs, lows, closes, 14),
+                               true_range.ewm(com=13, min_periods=14).mean().to_numpy(), rtol=1e-9)
+
+    typical_price = pd.Series((highs + lows + closes) / 3)
+    np.testing.assert_allclose(indicators.vwap(highs, lows, closes, volumes),
+                               ((typical_price * volumes).cumsum() / pd.Series(volumes).cumsum()).to_numpy(),
+                               rtol=1e-9)
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+def test_other_streaming_indicators_match_batch(n):
+    highs, lows, closes, volumes = random_candles(n, seed=2)
+
+    streams = [
+        (indicators.StreamingEMA.from_span(50), indicators.ema(closes, 50)),
+        (indicators.StreamingSMA(20), indicators.sma(closes, 20)),
+        (indicators.StreamingBollinger(20, 2), np.column_stack(indicators.bollinger(closes, 20, 2))),
+    ]
+
+    for stream, expected in streams:
+        values = np.array([stream.update(c) for c in closes], dtype=np.float64)
+        np.testing.assert_allclose(values, expected, rtol=1e-8)
+
+    atr = indicators.StreamingATR(14)
+    np.testing.assert_allclose([atr.update(h, l, c) for h, l, c in zip(highs, lows, closes)],
+                               indicators.atr(highs, lows, closes, 14), rtol=1e-8)
+
+    vwap = indicators.StreamingVWAP()
+    np.testing.assert_allclose([vwap.update(h, l, c, v) for h, l, c, v in zip(highs, lows, closes, volumes)],
+                               indicators.vwap(highs, lows, closes, volumes), rtol=1e-8)
@@ -0,0 +1,35 @@
+"""
+aggregator.resample(): the candles of the timeframes the exchanges don't provide, built from lower timeframe candles.
+Run from the project root: python -m pytest tests
+"""
+
+from aggregator import resample
+from models import Candle
+
+
+MINUTE = 60_000
+
+
+def five_minute_candles(first: int, count: int):
+    return [Candle(i * 5 * MINUTE, 100 + i, 110 + i, 90 - i, 101 + i, 1) for i in range(first, first + count)]
+
+
+def test_buckets_are_aligned_on_the_timeframe():
+    candles = resample(five_minute_candles(0, 6), "15m")
+
+    assert [c.timestamp for c in candles] == [0, 15 * MINUTE]
+    assert (candles[0].open, candles[0].high, candles[0].low, candles[0].close, candles[0].volume) == \
+           (100, 112, 88, 103, 3)
+
+
+def test_partial_first_bucket_is_left_out():
+    candles = resample(five_minute_candles(1, 7), "15m")  # Starts at 00:05, the 00:00 bucket misses a candle
+
+    assert [c.timestamp for c in candles] == [15 * MINUTE, 30 * MINUTE]
+    assert candles[0].open == 103
+    assert candles[0].volume == 3
+
+
+def test_no_complete_bucket():
+    assert resample(five_minute_candles(1, 2), "15m") == []
+    assert resample([], "15m") == []
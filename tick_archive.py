@@ -0,0 +1,194 @@
+import collections
+import datetime
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import *
+
+import numpy as np
+
+
+logger = logging.getLogger()
+
+
+# Tick archive: the trades received by the websockets are recorded to append-only files, one per exchange, symbol
+# and day (UTC): <directory>/<exchange>/<symbol>/<YYYY-MM-DD>.ticks
+# The trades are written in compressed blocks:
+#   header (number of trades, compressed size, first timestamp, last timestamp), then the zlib compressed columns
+#   timestamps, prices, sizes (delta encoded) and sides (1 buy, -1 sell)
+# The prices and sizes are delta encoded on their IEEE 754 bits (int64 view of the float64): lossless, and the
+# deltas of close prices are small numbers that compress well.
+# Each .ticks file has an .idx file with (first timestamp, last timestamp, offset) for each block, so that a time
+# range is read without decompressing the blocks before it.
+
+BLOCK_HEADER = struct.Struct("<IIqq")
+INDEX_DTYPE = np.dtype([("first_ts", "<i8"), ("last_ts", "<i8"), ("offset", "<u8")])
+
+
+def _encode_block(timestamps: np.ndarray, prices: np.ndarray, sizes: np.ndarray, sides: np.ndarray) -> bytes:
+    columns = [np.diff(timestamps, prepend=0),
+               np.diff(prices.view(np.int64), prepend=0),  # Integer overflow wraps around, the cumsum reverses it
+               np.diff(sizes.view(np.int64), prepend=0)]
+
+    payload = b"".join(c.astype("<i8").tobytes() for c in columns) + sides.astype(np.int8).tobytes()
+    compressed = zlib.compress(payload, 6)
+
+    return BLOCK_HEADER.pack(len(timestamps), len(compressed), int(timestamps[0]), int(timestamps[-1])) + compressed
+
+
+def _decode_block(n: int, compressed: bytes) -> Dict[str, np.ndarray]:
+    payload = zlib.decompress(compressed)
+    columns = np.frombuffer(payload, dtype="<i8", count=3 * n).reshape(3, n)
+
+    return {"timestamp": np.cumsum(columns[0]),
+            "price": np.cumsum(columns[1]).view(np.float64),
+            "size": np.cumsum(columns[2]).view(np.float64),
+            "side": np.frombuffer(payload, dtype=np.int8, offset=24 * n)}
+
+
+class TickRecorder:
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+
+        """
+        Records the trades in the background: record() only appends the trade to a queue (thread-safe), a thread
+        encodes and writes the queued trades every flush_interval seconds.
+        :param directory: Root directory of the archive
+        :param flush_interval: Seconds between two writes, each write adds one block per symbol
+        """
+
+        self.directory = directory
+        self._flush_interval = flush_interval
+
+        self._queue = collections.deque()
+        self._stop = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, exchange: str, symbol: str, timestamp: int, price: float, size: float, side: int):
+
+        """
+        Called from the websocket threads.
+        :param exchange: binance_futures, binance_spot, bitmex
+        :param symbol:
+        :param timestamp: Unix timestamp in milliseconds
+        :param price:
+        :param size:
+        :param side: 1 if the buyer was the taker, -1 if the seller was
+        :return:
+        """
+
+        self._queue.append((exchange, symbol, timestamp, price, size, side))
+
+    def close(self):
+
+        """
+        Write the trades still in the queue and stop the thread.
+        """
+
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._flush_interval):
+            self._flush()
+
+        self._flush()
+
+    def _flush(self):
+        trades: Dict[Tuple[str, str, str], list] = dict()
+
+        for _ in range(len(self._queue)):
+            trade = self._queue.popleft()
+            day = datetime.datetime.utcfromtimestamp(trade[2] / 1000).strftime("%Y-%m-%d")
+            trades.setdefault((trade[0], trade[1], day), []).append(trade[2:])
+
+        for (exchange, symbol, day), rows in trades.items():
+            try:
+                self._write_block(exchange, symbol, day, rows)
+            except Exception as e:
+                logger.error("Error while recording the %s %s trades: %s", exchange, symbol, e)
+
+    def _write_block(self, exchange: str, symbol: str, day: str, rows: List[tuple]):
+        folder = os.path.join(self.directory, exchange, symbol)
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, day + ".ticks")
+
+        timestamps, prices, sizes, sides = (np.array(column) for column in zip(*rows))
+
+        block = _encode_block(timestamps.astype(np.int64), prices.astype(np.float64), sizes.astype(np.float64),
+                              sides)
+
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(block)
+
+        index_entry = np.array([(timestamps[0], timestamps[-1], offset)], dtype=INDEX_DTYPE)
+
+        with open(path[:-len(".ticks")] + ".idx", "ab") as f:
+            f.write(index_entry.tobytes())
+
+
+def read_blocks(directory: str, exchange: str, symbol: str, start_time: Optional[int] = None,
+                end_time: Optional[int] = None) -> Generator[Dict[str, np.ndarray], None, None]:
+
+    """
+    Read the recorded trades of a symbol, one block at a time, in chronological order.
+    :param directory: Root directory of the archive
+    :param exchange:
+    :param symbol:
+    :param start_time: Unix timestamp in milliseconds, from the start of the archive if None
+    :param end_time: Unix timestamp in milliseconds, until the end of the archive if None
+    :return: {"timestamp": ..., "price": ..., "size": ..., "side": ...} arrays
+    """
+
+    folder = os.path.join(directory, exchange, symbol)
+    if not os.path.isdir(folder):
+        return
+
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".ticks"):
+            continue
+
+        path = os.path.join(folder, name)
+        index = np.fromfile(path[:-len(".ticks")] + ".idx", dtype=INDEX_DTYPE)
+
+        # Blocks of the time range, located with the index. The blocks of a day are written in time order.
+        first = 0 if start_time is None else int(np.searchsorted(index["last_ts"], start_time, side="left"))
+        last = len(index) if end_time is None else int(np.searchsorted(index["first_ts"], end_time, side="right"))
+
+        if first >= last:
+            continue
+
+        with open(path, "rb") as f:
+            f.seek(int(index["offset"][first]))
+
+            for _ in range(first, last):
+                n, compressed_size, first_ts, last_ts = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                block = _decode_block(n, f.read(compressed_size))
+
+                if (start_time is not None and first_ts < start_time) or (end_time is not None and last_ts > end_time):
+                    ts = block["timestamp"]
+                    mask = np.ones(n, dtype=bool)
+                    if start_time is not None:
+                        mask &= ts >= start_time
+                    if end_time is not None:
+                        mask &= ts <= end_time
+                    block = {field: values[mask] for field, values in block.items()}
+
+                yield block
+
+
+def read_ticks(directory: str, exchange: str, symbol: str, start_time: Optional[int] = None,
+               end_time: Optional[int] = None) -> Generator[Tuple[float, float, int], None, None]:
+
+    """
+    Recorded trades in the format of the replay.py readers, e.g replay(strategy, read_ticks(...)).
+    :return: (price, size, timestamp) tuples
+    """
+
+    for block in read_blocks(directory, exchange, symbol, start_time, end_time):
+        yield from zip(block["price"].tolist(), block["size"].tolist(), block["timestamp"].tolist())
@@ -0,0 +1,136 @@
+import heapq
+import itertools
+import math
+import threading
+from typing import *
+
+from models import Trade
+
+
+class PriceTriggerIndex:
+    def __init__(self):
+
+        """
+        Absolute Take Profit / Stop Loss prices of the open trades of a strategy, kept in two heaps:
+        - 'above' levels trigger when the price goes up to them (long TP, short SL), min-heap
+        - 'below' levels trigger when the price goes down to them (long SL, short TP), max-heap (negated prices)
+        On each trade print, only the nearest level of each heap has to be compared to the price, through
+        next_above / next_below.
+        Each trade has a token, stored with its levels: when one of its levels triggers (or the trade is closed),
+        the token is dropped and the other level becomes stale. Stale levels are skipped when they reach the top of
+        a heap, and the heaps are rebuilt when they are mostly made of stale levels.
+        """
+
+        # (level, token, trade, kind), the token is also the tie breaker (Trade objects can't be compared): the two
+        # levels of a trade are never in the same heap
+        self._above: List[Tuple[float, int, Trade, str]] = []
+        self._below: List[Tuple[float, int, Trade, str]] = []
+        self._seq = itertools.count()
+
+        self._tokens: Dict[int, Tuple[int, int]] = dict()  # id(trade) -> (token, number of levels)
+        self._live = 0  # Levels of the heaps that aren't stale
+
+        self._lock = threading.Lock()  # Levels can be added from the order status thread
+
+        self.next_above = math.inf
+        self.next_below = -math.inf
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _is_live(self, token: int, trade: Trade) -> bool:
+        return trade.status == "open" and self._tokens.get(id(trade), (None, 0))[0] == token
+
+    def _drop(self, trade: Trade):
+        token, levels = self._tokens.pop(id(trade), (None, 0))
+        self._live -= levels
+
+    def _compact(self):
+
+        """
+        Remove the stale levels from the heaps, once they make more than half of them.
+        """
+
+        if len(self._above) + len(self._below) <= 2 * self._live + 16:
+            return
+
+        self._above = [entry for entry in self._above if self._is_live(entry[1], entry[2])]
+        self._below = [entry for entry in self._below if self._is_live(entry[1], entry[2])]
+        heapq.heapify(self._above)
+        heapq.heapify(self._below)
+
+    def _refresh(self):
+        for heap in (self._above, self._below):
+            while heap and not self._is_live(heap[0][1], heap[0][2]):
+                level, token, trade, kind = heapq.heappop(heap)
+                if self._tokens.get(id(trade), (None, 0))[0] == token:  # Closed by another path
+                    self._drop(trade)
+
+        self.next_above = self._above[0][0] if self._above else math.inf
+        self.next_below = -self._below[0][0] if self._below else -math.inf
+
+    def add(self, trade: Trade):
+
+        """
+        Register the TP/SL levels of an open trade (trade.tp_price / trade.sl_price, None if not used). Its previous
+        levels, if any, are replaced: e.g when an exit order failed and must be tried again.
+        :param trade:
+        :return:
+        """
+
+        with self._lock:
+            self._drop(trade)
+
+            token = next(self._seq)
+            levels = 0
+
+            for kind in ("tp", "sl"):
+                level = trade.tp_price if kind == "tp" else trade.sl_price
+                if level is None:
+                    continue
+
+                goes_up = (trade.side == "long") == (kind == "tp")
+
+                if goes_up:
+                    heapq.heappush(self._above, (level, token, trade, kind))
+                else:
+                    heapq.heappush(self._below, (-level, token, trade, kind))
+
+                levels += 1
+
+            self._tokens[id(trade)] = (token, levels)
+            self._live += levels
+
+            self._compact()
+            self._refresh()
+
+    def pop_triggered(self, price: float) -> List[Tuple[Trade, str]]:
+
+        """
+        Remove and return the levels reached by the price. The other level of a triggered trade is removed too,
+        until the trade is added again.
+        :param price: The last trade price
+        :return: (trade, "tp" or "sl") tuples, at most one per trade
+        """
+
+        triggered = []
+
+        with self._lock:
+            self._refresh()  # The nearest levels are live
+
+            while self._above and self._above[0][0] <= price:
+                level, token, trade, kind = heapq.heappop(self._above)
+                if self._is_live(token, trade):
+                    triggered.append((trade, kind))
+                    self._drop(trade)
+
+            while self._below and -self._below[0][0] >= price:
+                level, token, trade, kind = heapq.heappop(self._below)
+                if self._is_live(token, trade):
+                    triggered.append((trade, kind))
+                    self._drop(trade)
+
+            self._compact()
+            self._refresh()
+
+        return triggered